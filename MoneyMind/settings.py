@@ -158,3 +158,60 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# AI Classifier
+# รอให้ไม่มีการสอน AI ใหม่เข้ามากี่วินาทีก่อนค่อย Re-train (รวบการแก้ไขหลายครั้งเป็น train รอบเดียว)
+AI_RETRAIN_DEBOUNCE_SECONDS = 5
+# ถ้ามีตัวอย่างใหม่ค้างถึงจำนวนนี้ ให้ Re-train ทันทีโดยไม่ต้องรอ
+AI_RETRAIN_MAX_PENDING = 20
+# 'batch' = train LinearSVC ใหม่ทั้งหมดทุกครั้ง, 'online' = เรียนรู้เพิ่มทีละตัวอย่าง (partial_fit) แล้วค่อย Re-build เมื่อสั่ง
+# (online หลาย worker: ก่อนสอน/เซฟ แต่ละ worker โหลดรุ่นล่าสุดแล้วเติมตัวอย่างของตัวเองลงไป ไม่ทับของกันและกัน)
+AI_LEARNING_MODE = 'batch'
+# ขนาด hashing space ของโมเดล online (ยิ่งมากยิ่งชนกันน้อย แต่ไฟล์โมเดลใหญ่ขึ้น)
+AI_ONLINE_N_FEATURES = 2 ** 16
+# จำนวนรอบที่วนข้อมูลทั้งหมดตอน Re-build โมเดล online
+AI_ONLINE_REBUILD_EPOCHS = 5
+# โหลดโมเดลล่วงหน้าใน thread เบื้องหลังตอน wsgi/asgi เริ่มทำงาน (False = โหลดตอนทำนายครั้งแรก)
+AI_WARMUP_ON_STARTUP = True
+# จำนวนไฟล์โมเดลรุ่นเก่าที่เก็บไว้ใน ml_models (ไฟล์ชี้รุ่นปัจจุบันคือ category_classifier.current)
+AI_MODEL_KEEP_VERSIONS = 3
+# เก็บโมเดลแบบ compact (คำศัพท์ + น้ำหนัก float32 โหลดด้วย numpy memmap) หลาย worker ใช้ memory ร่วมกันได้
+AI_COMPACT_MODEL = True
+# ทำนายด้วย NumPy ล้วน (น้ำหนัก calibrated ที่คำนวณไว้ล่วงหน้า) แทนการเรียก Pipeline ของ sklearn
+AI_FAST_INFERENCE = True
+# วิธีแปลงข้อความเป็น feature: 'newmm' = ตัดคำไทยด้วยพจนานุกรม (pythainlp), 'char' = n-gram ตัวอักษร + hashing ไม่ต้องตัดคำ
+# (เทียบความเร็ว/ความแม่นยำด้วย manage.py benchmark_featurizer) เปลี่ยนแล้วกด Re-train
+AI_FEATURIZER = 'newmm'
+# ความยาว n-gram ตัวอักษร (ต่ำสุด, สูงสุด) และขนาด hashing space ของโหมด 'char'
+AI_CHAR_NGRAM_RANGE = (2, 4)
+AI_CHAR_N_FEATURES = 2 ** 18
+# จำนวน process ตอน Re-train: ตัดคำ corpus แบบขนาน + fit calibration fold พร้อมกัน (1 = process เดียว) โมเดลที่ได้เหมือนกัน
+AI_TRAIN_WORKERS = 1
+# โมเดลส่วนตัวต่อ user: โมเดลกลางเรียนเฉพาะข้อมูลกลางของ Admin ส่วนคำที่ user สอนเองเข้าโมเดลส่วนตัวของคนนั้น
+# (คำที่คนหนึ่งสอนไม่ไปเปลี่ยนผลของคนอื่น) False = โมเดลเดียวเรียนจากทุกคนแบบเดิม
+AI_USER_MODELS = True
+# จำนวนโมเดลส่วนตัวที่ถือไว้ใน memory ต่อ process (ที่เหลือโหลดจากไฟล์ใน ml_models/users ตอนใช้)
+AI_USER_MODEL_POOL_SIZE = 200
+# น้ำหนักของโมเดลส่วนตัวตอนผสมกับโมเดลกลาง (ใช้เฉพาะข้อความที่มีคำที่ user เคยสอน)
+AI_USER_MODEL_WEIGHT = 0.6
+# จำนวนข้อความที่เก็บผลตัดคำ (pythainlp newmm) ไว้ใน memory
+AI_TOKEN_CACHE_SIZE = 50000
+# จำนวนผลทำนายของโมเดลที่จำไว้ (ข้อความเดิม + โมเดลรุ่นเดิม ไม่ต้องคำนวณซ้ำ) ล้างทุกครั้งที่ Re-train / สอนเพิ่ม
+AI_PREDICTION_CACHE_SIZE = 20000
+# ไฟล์เก็บผลตัดคำข้าม restart เช่น BASE_DIR / 'ml_models' / 'token_cache.pkl' (None = ไม่เก็บลงไฟล์)
+AI_TOKEN_STORE_PATH = None
+
+
+# Import
+# จำนวนแถวที่อ่านต่อก้อนตอนนำเข้าไฟล์
+IMPORT_CHUNK_SIZE = 2000
+# รูปแบบวันที่ในไฟล์ เช่น '%d/%m/%Y' (None = ให้ pandas เดาจากค่าแรกของคอลัมน์)
+IMPORT_DATE_FORMAT = None
+# 'thread' = อ่านไฟล์ใน thread pool ของ process เว็บ, 'worker' = ให้ manage.py run_import_worker ทำแยกอีก process
+# 'thread' เหมาะกับตอนพัฒนา (runserver อย่างเดียวก็ใช้ได้) แต่ถ้า process เว็บตาย งานที่ค้างจะถูกปิดเป็น FAILED
+# หลังครบ 30 นาที ให้ user อัปโหลดใหม่ ตอน deploy จริงแนะนำ 'worker' ซึ่งส่งงานที่ค้างกลับเข้าคิวให้อัตโนมัติ
+IMPORT_JOB_RUNNER = 'thread'
+IMPORT_WORKERS = 2
+# โฟลเดอร์พักไฟล์ที่ upload ระหว่างรอทำงาน (None = โฟลเดอร์ temp ของระบบ)
+IMPORT_JOB_DIR = None
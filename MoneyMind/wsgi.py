@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "MoneyMind.settings")
 
 application = get_wsgi_application()
+
+# โหลดโมเดล AI ล่วงหน้าใน thread เบื้องหลัง worker พร้อมรับ request ทันทีโดยไม่ต้องรอ
+from django.conf import settings
+
+if getattr(settings, 'AI_WARMUP_ON_STARTUP', False):
+    from expenses.services import ai_classifier
+    ai_classifier.warmup()
@@ -1,8 +1,42 @@
 from django.contrib import admin
 from .models import Profile, Category, Budget, Transaction
+from .ledger import delete_category, forget_transactions, record_transactions
 
 # Register your models here.
 admin.site.register(Profile)
-admin.site.register(Category)   
 admin.site.register(Budget)
-admin.site.register(Transaction)
\ No newline at end of file
+
+
+@admin.register(Transaction)
+class TransactionAdmin(admin.ModelAdmin):
+    # Dashboard / งบประมาณอ่านยอดจาก rollup อย่างเดียว แก้ / ลบผ่าน admin ต้องอัปเดต rollup เหมือนหน้าเว็บ
+    def save_model(self, request, obj, form, change):
+        old = Transaction.objects.filter(pk=obj.pk).first() if change else None
+        super().save_model(request, obj, form, change)
+        if old and old.user_id != obj.user_id:
+            # ย้ายรายการไป user อื่น ยอดของเจ้าของเดิมต้องหักออกด้วย
+            forget_transactions([old])
+            record_transactions([obj])
+        else:
+            record_transactions([obj], old_dates=[old.date] if old else ())
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        forget_transactions([obj])
+
+    def delete_queryset(self, request, queryset):
+        # action "ลบที่เลือก" ลบด้วย queryset.delete() ไม่ผ่าน delete_model
+        deleted = list(queryset)
+        super().delete_queryset(request, queryset)
+        forget_transactions(deleted)
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    # ลบหมวดต้องย้ายยอดใน rollup ไปเป็นไม่ระบุหมวด (ledger.delete_category)
+    def delete_model(self, request, obj):
+        delete_category(obj)
+
+    def delete_queryset(self, request, queryset):
+        for category in queryset:
+            delete_category(category)
@@ -0,0 +1,301 @@
+import bisect
+import importlib
+import json
+import math
+import os
+import shutil
+
+import numpy as np
+
+from .utils import LRUCache
+
+# รูปแบบโมเดลแบบ compact (โฟลเดอร์เดียว):
+#   vocab_data.npy / vocab_offsets.npy  คำศัพท์ทั้งหมดเป็น UTF-8 ต่อกัน เรียงตาม byte (ค้นด้วย binary search)
+#                    (featurizer แบบ hashing เก็บ hash_columns.npy = เลขคอลัมน์ที่มีน้ำหนัก เรียงจากน้อยไปมากแทน)
+#   weights.npy      float32 (จำนวนคำ, fold x หมวด) แถวละคำ อ่านเฉพาะแถวของคำที่เจอ
+#   intercepts.npy / sigmoid_a.npy / sigmoid_b.npy / present.npy  ค่าต่อ (fold, หมวด)
+#   meta.json        ชื่อหมวด จำนวน fold ฟังก์ชันตัดคำ ฯลฯ
+# ทุกไฟล์โหลดด้วย np.load(mmap_mode='r') หลาย worker ใช้หน้า memory ชุดเดียวกันผ่าน page cache ของ OS
+FORMAT_VERSION = 1
+ARRAY_NAMES = ['vocab_data', 'vocab_offsets', 'weights', 'intercepts', 'sigmoid_a', 'sigmoid_b', 'present']
+HASHING_ARRAY_NAMES = ['hash_columns', 'weights', 'intercepts', 'sigmoid_a', 'sigmoid_b', 'present']
+# โฟลเดอร์ compact รุ่นแรกไม่ได้บันทึกชื่อฟังก์ชันตัดคำไว้
+DEFAULT_ANALYZER = 'expenses.services:thai_tokenizer'
+LOOKUP_CACHE_SIZE = 20000
+
+
+class StringTable:
+    # ตารางคำศัพท์เรียงแล้ว: ทำตัวเป็น sequence ของ bytes ให้ bisect ใช้ได้ตรงๆ
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def index(self, token):
+        key = token.encode('utf-8')
+        i = bisect.bisect_left(self, key)
+        if i < len(self) and self[i] == key:
+            return i
+        return None
+
+
+def callable_path(func):
+    # ชื่อเต็มของฟังก์ชันระดับ module ('module:name') ให้ worker ที่โหลด memmap import กลับมาใช้ได้
+    # None = อ้างถึงด้วยชื่อไม่ได้ (เช่น method ของโมเดลรุ่นเก่า) ใช้ได้เฉพาะคอมไพล์ใน memory
+    name = getattr(func, '__qualname__', '')
+    if not name or '.' in name or '<' in name:
+        return None
+    return f"{func.__module__}:{name}"
+
+
+def resolve_callable(path):
+    module_name, name = path.split(':')
+    return getattr(importlib.import_module(module_name), name)
+
+
+def _vocabulary_features(vectorizer):
+    # CountVectorizer(tokenizer=...): คำศัพท์เรียงตาม byte -> (คอลัมน์ใน coef_, arrays, meta)
+    if vectorizer.ngram_range != (1, 1) or vectorizer.binary or vectorizer.stop_words:
+        raise ValueError("compact format รองรับเฉพาะ CountVectorizer แบบ unigram นับคำปกติ")
+    tokens = sorted(vectorizer.vocabulary_, key=lambda token: token.encode('utf-8'))
+    columns = np.array([vectorizer.vocabulary_[token] for token in tokens], dtype=np.int64)
+    encoded = [token.encode('utf-8') for token in tokens]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    arrays = {'vocab_data': np.frombuffer(b''.join(encoded), dtype=np.uint8), 'vocab_offsets': offsets}
+    meta = {
+        'featurizer': 'vocabulary',
+        'analyzer': callable_path(vectorizer.tokenizer),
+        'lowercase': bool(vectorizer.lowercase),
+    }
+    return columns, arrays, meta
+
+
+def _hashing_features(vectorizer, folds):
+    # HashingVectorizer(analyzer=...): เก็บเฉพาะคอลัมน์ที่มีน้ำหนักไม่เป็นศูนย์ใน fold ใด fold หนึ่ง
+    # (คอลัมน์ที่ไม่เคยเจอตอน train น้ำหนักเป็น 0 อยู่แล้ว ไม่ต้องเก็บทั้ง n_features แถว)
+    if not callable(vectorizer.analyzer) or vectorizer.alternate_sign or vectorizer.binary:
+        raise ValueError("compact format รองรับเฉพาะ HashingVectorizer(analyzer=ฟังก์ชัน, alternate_sign=False)")
+    if vectorizer.norm not in (None, 'l2'):
+        raise ValueError(f"compact format ไม่รองรับ norm={vectorizer.norm!r}")
+    used = np.zeros(vectorizer.n_features, dtype=bool)
+    for fold in folds:
+        used |= np.any(np.asarray(fold.estimator.coef_) != 0, axis=0)
+    columns = np.flatnonzero(used).astype(np.int64)
+    meta = {
+        'featurizer': 'hashing',
+        'analyzer': callable_path(vectorizer.analyzer),
+        'n_features': int(vectorizer.n_features),
+        'norm': vectorizer.norm,
+        'lowercase': False,
+    }
+    return columns, {'hash_columns': columns}, meta
+
+
+def compile_pipeline(pipeline):
+    # ดึงน้ำหนักจาก Pipeline(CountVectorizer หรือ HashingVectorizer, CalibratedClassifierCV(LinearSVC)) ที่ train แล้ว
+    # ซ้อนน้ำหนักทุก fold ไว้ในเมทริกซ์เดียว ทำนายได้ด้วย dot product ครั้งเดียว คืน (arrays, meta)
+    vectorizer, calibrated = pipeline[0], pipeline[-1]
+    if getattr(calibrated, 'method', None) != 'sigmoid':
+        raise ValueError("compact format รองรับเฉพาะ CalibratedClassifierCV(method='sigmoid')")
+
+    classes = [str(c) for c in calibrated.classes_]
+    class_index = {label: i for i, label in enumerate(classes)}
+    binary = len(classes) == 2
+    width = 1 if binary else len(classes)
+
+    folds = calibrated.calibrated_classifiers_
+    if hasattr(vectorizer, 'vocabulary_'):
+        columns, arrays, feature_meta = _vocabulary_features(vectorizer)
+    else:
+        columns, arrays, feature_meta = _hashing_features(vectorizer, folds)
+
+    weights = np.zeros((len(columns), len(folds) * width), dtype=np.float32)
+    intercepts = np.zeros(len(folds) * width, dtype=np.float32)
+    sigmoid_a = np.zeros(len(folds) * width, dtype=np.float32)
+    sigmoid_b = np.zeros(len(folds) * width, dtype=np.float32)
+    present = np.zeros(len(folds) * width, dtype=bool)
+
+    for f, fold in enumerate(folds):
+        estimator = fold.estimator
+        coef = np.asarray(estimator.coef_)[:, columns]
+        intercept = np.atleast_1d(estimator.intercept_)
+        # หมวดที่ fold นี้ไม่เคยเห็น ไม่มีตัวชี้วัด (present = False) ความน่าจะเป็นเป็น 0 เหมือน sklearn
+        if binary:
+            targets = [0]
+        else:
+            targets = [class_index[str(c)] for c in estimator.classes_]
+        for row, (target, calibrator) in enumerate(zip(targets, fold.calibrators)):
+            k = f * width + target
+            weights[:, k] = coef[row]
+            intercepts[k] = intercept[row]
+            sigmoid_a[k] = calibrator.a_
+            sigmoid_b[k] = calibrator.b_
+            present[k] = True
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'classes': classes,
+        'n_folds': len(folds),
+        'binary': binary,
+        **feature_meta,
+    }
+    arrays.update({
+        'weights': weights, 'intercepts': intercepts,
+        'sigmoid_a': sigmoid_a, 'sigmoid_b': sigmoid_b, 'present': present,
+    })
+    return arrays, meta
+
+
+def export_compact(pipeline, path):
+    # เขียนรูปแบบ compact ลงโฟลเดอร์ชั่วคราวแล้วค่อย rename ทับ คนอ่านจะไม่เจอโฟลเดอร์ที่เขียนไม่ครบ
+    arrays, meta = compile_pipeline(pipeline)
+    if meta['analyzer'] is None:
+        raise ValueError("compact format ต้องใช้ฟังก์ชันตัดคำระดับ module")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+class CompactModel:
+    # โมเดลที่ทำนายด้วย NumPy ล้วน ผลเท่ากับ sklearn Pipeline เดิม (ต่างแค่ทศนิยมจาก float32)
+    # มี classes_ / predict / predict_proba หน้าตาเดียวกับ Pipeline เพื่อใช้แทนกันได้
+    def __init__(self, arrays, meta, tokenizer=None, path=None):
+        if meta['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"compact format version {meta['format_version']} ไม่รองรับ")
+        self.path = path
+        # ไม่ส่ง tokenizer มา = ใช้ฟังก์ชันตัดคำตามที่บันทึกไว้ใน meta
+        self.tokenizer = tokenizer or resolve_callable(meta.get('analyzer', DEFAULT_ANALYZER))
+        self.classes_ = np.array(meta['classes'], dtype=object)
+        self.n_folds = meta['n_folds']
+        self.binary = meta['binary']
+        self.lowercase = meta['lowercase']
+        self.hashing = meta.get('featurizer') == 'hashing'
+        if self.hashing:
+            from sklearn.utils import murmurhash3_32
+            self._murmurhash = murmurhash3_32
+            self.n_features = meta['n_features']
+            self.norm = meta['norm']
+            self.hash_columns = arrays['hash_columns']
+            self.vocabulary = self.hash_columns
+        else:
+            self.norm = None
+            self.vocabulary = StringTable(arrays['vocab_data'], arrays['vocab_offsets'])
+        self.weights = arrays['weights']
+        # ค่าต่อ (fold, หมวด) เล็กมาก โหลดเข้า memory เป็น float64 ให้คำนวณเหมือน sklearn
+        self.intercepts = np.array(arrays['intercepts'], dtype=np.float64)
+        self.sigmoid_a = np.array(arrays['sigmoid_a'], dtype=np.float64)
+        self.sigmoid_b = np.array(arrays['sigmoid_b'], dtype=np.float64)
+        self.present = np.array(arrays['present'])
+        self._lookups = LRUCache(LOOKUP_CACHE_SIZE)
+
+    @classmethod
+    def load(cls, path, tokenizer=None):
+        # memmap: หลาย worker ที่เปิดไฟล์เดียวกันใช้หน้า memory ร่วมกัน
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        names = HASHING_ARRAY_NAMES if meta.get('featurizer') == 'hashing' else ARRAY_NAMES
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            for name in names
+        }
+        return cls(arrays, meta, tokenizer, path=path)
+
+    @classmethod
+    def from_pipeline(cls, pipeline, tokenizer=None):
+        # คอมไพล์ Pipeline ที่อยู่ใน memory (เช่นไฟล์ .pkl รุ่นเก่า) ให้ใช้ทางทำนายแบบเร็วได้เลย
+        vectorizer = pipeline[0]
+        arrays, meta = compile_pipeline(pipeline)
+        tokenizer = tokenizer or getattr(vectorizer, 'tokenizer', None) or vectorizer.analyzer
+        return cls(arrays, meta, tokenizer)
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def _token_index(self, token):
+        # คำ -> แถวใน weights (None = ไม่อยู่ในคำศัพท์) / แบบ hashing: คำ -> เลขคอลัมน์ hash
+        index = self._lookups.get(token, -1)
+        if index == -1:
+            if self.hashing:
+                # สูตรเดียวกับ FeatureHasher ของ sklearn: |murmurhash3_32(utf-8)| mod n_features
+                index = abs(self._murmurhash(token, seed=0)) % self.n_features
+            else:
+                index = self.vocabulary.index(token)
+            self._lookups.set(token, index)
+        return index
+
+    def features(self, text):
+        # เหมือน CountVectorizer: ตัวพิมพ์เล็ก -> ตัดคำ -> นับคำที่อยู่ในคำศัพท์ คืน (index, จำนวน)
+        counts = {}
+        for token in self.tokenizer(text.lower() if self.lowercase else text):
+            index = self._token_index(token)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if self.norm == 'l2' and len(values):
+            # HashingVectorizer normalize ทั้งแถว (รวมคอลัมน์ที่ไม่มีน้ำหนัก) ก่อนเข้าโมเดล
+            values /= math.sqrt(float(values @ values))
+        if self.hashing:
+            # เลขคอลัมน์ hash -> แถวใน weights ตัดคอลัมน์ที่ไม่มีน้ำหนักทิ้ง
+            if not len(self.hash_columns):
+                return indices[:0], values[:0]
+            rows = np.searchsorted(self.hash_columns, indices)
+            rows = np.minimum(rows, len(self.hash_columns) - 1)
+            found = self.hash_columns[rows] == indices
+            return rows[found], values[found]
+        return indices, values
+
+    def decision_function(self, texts):
+        # คะแนน LinearSVC ของทุก fold ต่อหมวด shape (จำนวนข้อความ, fold x หมวด)
+        scores = np.tile(self.intercepts, (len(texts), 1))
+        for row, text in enumerate(texts):
+            indices, values = self.features(text)
+            if len(indices):
+                scores[row] += values @ self.weights[indices]
+        return scores
+
+    def _calibrate(self, scores):
+        # scores (จำนวนข้อความ, fold x หมวด) -> ความน่าจะเป็นเฉลี่ยทุก fold (จำนวนข้อความ, หมวด)
+        with np.errstate(over='ignore'):
+            proba = 1.0 / (1.0 + np.exp(self.sigmoid_a * scores + self.sigmoid_b))
+        proba = np.where(self.present, proba, 0.0).reshape(len(scores), self.n_folds, -1)
+
+        if self.binary:
+            proba = np.concatenate([1.0 - proba, proba], axis=2)
+        else:
+            total = proba.sum(axis=2, keepdims=True)
+            uniform = np.full_like(proba, 1.0 / proba.shape[2])
+            proba = np.divide(proba, total, out=uniform, where=total != 0)
+        proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+        return proba.mean(axis=1)
+
+    def predict_proba(self, texts):
+        texts = list(texts)
+        return self._calibrate(self.decision_function(texts))
+
+    def predict(self, texts):
+        return self.classes_[self.predict_proba(texts).argmax(axis=1)]
+
+    def predict_one(self, text):
+        # ทางลัดสำหรับข้อความเดียว: dot product ครั้งเดียวได้คะแนนทุก fold/หมวด แล้ว calibrate
+        # ไม่ผ่าน validation / dispatch ของ sklearn คืน (ชื่อหมวด, ความมั่นใจ)
+        indices, values = self.features(text)
+        scores = self.intercepts + values @ self.weights[indices] if len(indices) else self.intercepts
+        proba = self._calibrate(scores[np.newaxis, :])[0]
+        best = int(proba.argmax())
+        return self.classes_[best], float(proba[best])
@@ -1,5 +1,6 @@
 from django import forms
-from .models import Category , Budget , Transaction
+from django.db.models import Q
+from .models import Category , Budget , Transaction , StagedTransaction
 from datetime import datetime
 
 class SmartInputForm(forms.Form):
@@ -29,6 +30,37 @@ class TransactionForm(forms.ModelForm):
             'category': 'หมวดหมู่'
         }
 
+class StagedTransactionForm(forms.ModelForm):
+    # ใช้ตอนแก้ไขรายการทีละแถวในหน้าตรวจสอบ (ส่งมาจาก JS)
+    class Meta:
+        model = StagedTransaction
+        fields = ['date', 'description', 'amount', 'category']
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        if user:
+            self.fields['category'].queryset = Category.objects.filter(Q(is_global=True) | Q(user=user))
+
+class TransactionFilterForm(forms.Form):
+    KIND_CHOICES = [
+        ('', 'ทั้งหมด'),
+        ('income', 'รายรับ'),
+        ('expense', 'รายจ่าย'),
+    ]
+
+    q = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control form-control-sm', 'placeholder': 'ค้นหารายการ'}))
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'}))
+    category = forms.ModelChoiceField(queryset=Category.objects.none(), required=False, empty_label='ทุกหมวดหมู่', widget=forms.Select(attrs={'class': 'form-select form-select-sm'}))
+    kind = forms.ChoiceField(choices=KIND_CHOICES, required=False, widget=forms.Select(attrs={'class': 'form-select form-select-sm'}))
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        if user:
+            self.fields['category'].queryset = Category.objects.filter(Q(is_global=True) | Q(user=user)).order_by('type', 'name')
+
 # import 
 class UploadFileForm(forms.Form):
     file = forms.FileField(
@@ -67,6 +99,6 @@ class BudgetForm(forms.ModelForm):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         if user:
-            self.fields['category'].queryset = Category.objects.filter(type='EXPENSE')
+            self.fields['category'].queryset = Category.objects.filter(Q(is_global=True) | Q(user=user), type='EXPENSE')
 
 
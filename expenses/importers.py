@@ -0,0 +1,262 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+from .ledger import previous_categories
+from .models import Category
+from .parsers import parse_lines
+from .services import ai_classifier
+
+# pandas import ในฟังก์ชัน: module นี้ถูก import ตอนโหลด urls ไม่อยากให้ทุกคำสั่ง manage.py ต้องรอโหลด pandas
+# อ่านไฟล์ทีละก้อน หน่วยความจำคงที่ไม่ว่าไฟล์จะใหญ่แค่ไหน
+IMPORT_CHUNK_SIZE = getattr(settings, 'IMPORT_CHUNK_SIZE', 2000)
+# รูปแบบวันที่ในไฟล์ (None = ให้ pandas เดาจากค่าแรกของคอลัมน์)
+IMPORT_DATE_FORMAT = getattr(settings, 'IMPORT_DATE_FORMAT', None)
+AI_CONFIDENCE_THRESHOLD = 0.4
+
+COLUMN_MAPPING = {
+    'วันที่': 'date', 'Date': 'date', 'date': 'date',
+    'รายการ': 'description', 'Description': 'description', 'description': 'description',
+    'จำนวนเงิน': 'amount', 'Amount': 'amount', 'amount': 'amount', 'จำนวน': 'amount',
+    'หมวดหมู่': 'category', 'Category': 'category', 'category': 'category'
+}
+
+
+class ImportFileError(Exception):
+    pass
+
+
+@dataclass
+class ImportChunk:
+    number: int
+    rows: list
+    errors: list = field(default_factory=list)
+
+
+def apply_previous_categories(preview_list, user):
+    # รายการที่ user เคยบันทึกแล้ว ใช้หมวดล่าสุดที่เคยใช้ (ค้นทีเดียวทั้งก้อน)
+    pending = [row for row in preview_list if not row['category_id']]
+    if not pending:
+        return
+
+    memo = previous_categories(user, [row['description'] for row in pending])
+    for row in pending:
+        category = memo.get(row['description'])
+        if category:
+            row['category_id'] = category.id
+            row['category_name'] = category.name
+
+
+def apply_ai_categories(preview_list, user):
+    # ให้ AI เดาหมวดของรายการที่ยังไม่มีหมวด ทำทีเดียวทั้งก้อนแทนการเรียกทีละบรรทัด
+    pending = [row for row in preview_list if not row['category_id']]
+    if not pending:
+        return
+
+    try:
+        predictions = ai_classifier.predict_many([row['description'] for row in pending], user=user)
+    except Exception:
+        return
+
+    for row, (predicted_cat, prob) in zip(pending, predictions):
+        if predicted_cat and prob > AI_CONFIDENCE_THRESHOLD:
+            row['category_id'] = predicted_cat.id
+            row['category_name'] = f"{predicted_cat.name} (AI)"
+            row['ai_suggested'] = True
+
+
+def _prepare_columns(df):
+    df.columns = [str(col).strip() for col in df.columns]
+    df = df.rename(columns=COLUMN_MAPPING)
+
+    missing = []
+    if 'amount' not in df.columns: missing.append('จำนวนเงิน (Amount)')
+    if 'description' not in df.columns: missing.append('รายการ (Description)')
+    if missing:
+        raise ImportFileError(f"ไฟล์ไม่ถูกต้อง ขาดคอลัมน์: {', '.join(missing)}")
+    return df
+
+
+def _iter_csv_frames(path, chunk_size):
+    import pandas as pd
+
+    for chunk in pd.read_csv(path, encoding='utf-8-sig', chunksize=chunk_size):
+        yield _prepare_columns(chunk)
+
+
+def _iter_xlsx_frames(path, chunk_size):
+    # openpyxl แบบ read_only อ่านทีละแถวจากไฟล์ ไม่โหลดทั้ง workbook เข้า memory
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = ['' if col is None else str(col) for col in header]
+
+        # index เก็บตำแหน่งแถวจริงในชีต ใช้รายงานแถวที่ผิดพลาด
+        buffer, index = [], []
+        for row_no, row in enumerate(rows):
+            if all(value is None for value in row):
+                continue
+            buffer.append(row[:len(columns)])
+            index.append(row_no)
+            if len(buffer) >= chunk_size:
+                yield _prepare_columns(pd.DataFrame(buffer, columns=columns, index=index))
+                buffer, index = [], []
+        if buffer:
+            yield _prepare_columns(pd.DataFrame(buffer, columns=columns, index=index))
+    finally:
+        workbook.close()
+
+
+def _iter_xls_frames(path, chunk_size):
+    # xlrd อ่านแบบ stream ไม่ได้ (.xls เก็บได้ไม่เกิน 65,536 แถวอยู่แล้ว) อ่านทั้งไฟล์แล้วค่อยแบ่งก้อน
+    import pandas as pd
+
+    df = _prepare_columns(pd.read_excel(path, engine='xlrd'))
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def _report(errors, df, mask, reason):
+    # บันทึกแถวที่ใช้ไม่ได้ลงรายงาน (เลขแถวนับตามไฟล์ รวมหัวตาราง)
+    for index in df.index[mask]:
+        errors.append({'row': int(index) + 2, 'reason': reason})
+
+
+def _parse_dates(raw):
+    # แปลงวันที่ทั้งคอลัมน์ในครั้งเดียว ค่าที่ไม่ตรงรูปแบบหลักค่อยลองแบบ mixed เฉพาะส่วนที่เหลือ
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(raw):
+        return raw
+
+    # ช่องวันที่จริงใน Excel (datetime/Timestamp) ใช้ค่าตรงๆ ห้ามแปลงเป็นข้อความแล้ว parse ซ้ำแบบ dayfirst
+    # ไม่งั้น '2026-01-02 00:00:00' จะกลายเป็น 1 ก.พ.
+    is_date = raw.map(lambda value: isinstance(value, (datetime, date))).astype(bool)
+    dates = pd.to_datetime(raw.where(is_date), errors='coerce')
+
+    text = raw.where(raw.isna() | is_date, raw.astype(str).str.strip()).where(~is_date)
+    todo = text.notna()
+    if todo.any():
+        dates[todo] = pd.to_datetime(text[todo], format=IMPORT_DATE_FORMAT, dayfirst=True, errors='coerce')
+        retry = dates.isna() & todo
+        if retry.any():
+            dates[retry] = pd.to_datetime(text[retry], format='mixed', dayfirst=True, errors='coerce')
+    return dates
+
+
+def _frame_rows(df, categories):
+    # แปลงข้อมูลหนึ่งก้อนเป็นรายการ preview ทีละคอลัมน์ (ยังไม่มีหมวดจาก memo/AI)
+    import pandas as pd
+
+    errors = []
+
+    blank = df['amount'].isna() & df['description'].isna()
+    df = df[~blank]
+    _report(errors, df, df['amount'].isna().to_numpy(), "ไม่มีจำนวนเงิน")
+    _report(errors, df, df['description'].isna().to_numpy(), "ไม่มีรายการ")
+    df = df.dropna(subset=['amount', 'description'])
+
+    # จัดการลูกน้ำใน Excel ด้วย (เผื่อ Excel ส่งมาเป็น String ที่มี ,)
+    amount = df['amount']
+    if not pd.api.types.is_numeric_dtype(amount):
+        amount = pd.to_numeric(amount.astype(str).str.replace(',', '', regex=False).str.strip(), errors='coerce')
+
+    description = df['description'].astype(str).str.strip()
+
+    if 'date' in df.columns:
+        dates = _parse_dates(df['date'])
+        bad_date = (dates.isna() & df['date'].notna()).to_numpy()
+        dates = dates.fillna(pd.Timestamp(datetime.now().date()))
+    else:
+        dates = pd.Series(pd.Timestamp(datetime.now().date()), index=df.index)
+        bad_date = pd.Series(False, index=df.index).to_numpy()
+
+    bad_amount = amount.isna().to_numpy()
+    empty_description = (description == '').to_numpy()
+    _report(errors, df, bad_amount, "จำนวนเงินไม่ถูกต้อง")
+    _report(errors, df, bad_date & ~bad_amount, "วันที่ไม่ถูกต้อง")
+    _report(errors, df, empty_description & ~bad_amount & ~bad_date, "ไม่มีรายการ")
+    errors.sort(key=lambda e: e['row'])
+    valid = ~(bad_amount | bad_date | empty_description)
+
+    cat_ids = pd.Series("", index=df.index, dtype=object)
+    cat_names = pd.Series("-", index=df.index, dtype=object)
+    if 'category' in df.columns:
+        keys = df['category'].astype(str).str.strip().str.lower()
+        matched = keys.map({name: c.id for name, c in categories.items()}).astype('Int64')
+        found = matched.notna() & df['category'].notna()
+        cat_ids = matched.astype(object).where(found, "")
+        cat_names = keys.map({name: c.name for name, c in categories.items()}).where(found, "-")
+
+    rows = [
+        {
+            'date': date_str,
+            'description': desc,
+            'amount': float(amt),
+            'category_id': cat_id,
+            'category_name': cat_name
+        }
+        for date_str, desc, amt, cat_id, cat_name in zip(
+            dates[valid].dt.strftime('%Y-%m-%d'), description[valid], amount[valid],
+            cat_ids[valid], cat_names[valid]
+        )
+    ]
+    return rows, errors
+
+
+def _iter_text_rows(path, chunk_size):
+    # ไฟล์ .txt รูปแบบเดียวกับหน้าบันทึกด่วน อ่านทีละบรรทัด
+    rows = []
+    errors = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for parsed in parse_lines(f):
+            if parsed.error:
+                errors.append({'row': parsed.line_no, 'reason': parsed.error})
+                continue
+            rows.append(parsed.as_preview())
+            if len(rows) >= chunk_size:
+                yield rows, errors
+                rows, errors = [], []
+    if rows or errors:
+        yield rows, errors
+
+
+def _iter_raw_chunks(path, file_name, chunk_size, categories):
+    name = file_name.lower()
+    if name.endswith('.txt'):
+        yield from _iter_text_rows(path, chunk_size)
+        return
+
+    if name.endswith('.csv'): frames = _iter_csv_frames(path, chunk_size)
+    elif name.endswith('.xls'): frames = _iter_xls_frames(path, chunk_size)
+    else: frames = _iter_xlsx_frames(path, chunk_size)
+    for df in frames:
+        yield _frame_rows(df, categories)
+
+
+def iter_import_chunks(path, file_name, user, chunk_size=IMPORT_CHUNK_SIZE, on_progress=None):
+    # pipeline นำเข้าไฟล์: อ่านทีละก้อน -> แปลงเป็นรายการ -> เติมหมวด (memo + AI แบบ batch) -> ส่งต่อทีละก้อน
+    # on_progress(chunk_no, rows_in_chunk, total_rows) ถูกเรียกทุกครั้งที่ทำเสร็จหนึ่งก้อน
+    # แถวที่อ่านไม่ได้จะอยู่ใน chunk.errors เป็น {'row': เลขแถวในไฟล์, 'reason': สาเหตุ}
+    categories = {}
+    for cat in Category.objects.filter(Q(is_global=True) | Q(user=user)).order_by('id'):
+        categories.setdefault(cat.name.lower(), cat)
+
+    total = 0
+    chunks = _iter_raw_chunks(path, file_name, chunk_size, categories)
+    for chunk_no, (rows, errors) in enumerate(chunks, start=1):
+        apply_previous_categories(rows, user)
+        apply_ai_categories(rows, user)
+        total += len(rows)
+        print(f"📥 [Import] chunk {chunk_no}: {len(rows)} rows, {len(errors)} errors ({total} total)")
+        if on_progress:
+            on_progress(chunk_no, len(rows), total)
+        yield ImportChunk(chunk_no, rows, errors)
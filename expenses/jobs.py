@@ -0,0 +1,172 @@
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .importers import ImportFileError, iter_import_chunks
+from .models import ImportJob, ImportSession
+from .staging import create_session, stage_rows
+
+# 'thread' = อ่านไฟล์ใน thread pool ของ process เว็บเอง, 'worker' = รอให้ manage.py run_import_worker มาหยิบงานไป
+IMPORT_JOB_RUNNER = getattr(settings, 'IMPORT_JOB_RUNNER', 'thread')
+IMPORT_WORKERS = getattr(settings, 'IMPORT_WORKERS', 2)
+IMPORT_JOB_DIR = getattr(settings, 'IMPORT_JOB_DIR', None) or os.path.join(tempfile.gettempdir(), 'moneymind_imports')
+# เก็บรายละเอียดแถวที่อ่านไม่ได้ไว้ใน job แค่จำนวนนี้ (นับทั้งหมดไว้ใน error_count)
+MAX_JOB_ERRORS = 100
+# งานที่ RUNNING นานเกินนี้ถือว่า worker ตายไปแล้ว ให้ worker ตัวใหม่หยิบไปทำซ้ำ
+# (โหมด 'thread' ไม่มี worker มาหยิบต่อ งานที่ค้างเกินนี้จะถูกปิดเป็น FAILED แทน)
+STALE_JOB_TIMEOUT = timedelta(minutes=30)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import-job')
+    return _executor
+
+
+def submit_import(user, uploaded_file):
+    # เก็บไฟล์ที่ upload ลงดิสก์ แล้วสร้างงานให้ทำเบื้องหลัง request จบได้ทันที
+    os.makedirs(IMPORT_JOB_DIR, exist_ok=True)
+    _, ext = os.path.splitext(uploaded_file.name)
+    file_path = os.path.join(IMPORT_JOB_DIR, f"{uuid.uuid4().hex}{ext.lower()}")
+    with open(file_path, 'wb') as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+
+    expire_stale_jobs(ImportJob.objects.filter(user=user))
+    job = ImportJob.objects.create(user=user, file_name=uploaded_file.name[:255], file_path=file_path)
+    if IMPORT_JOB_RUNNER == 'thread':
+        # รอ commit ก่อน ไม่งั้น thread อาจยังมองไม่เห็นแถว job
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.id))
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_import_job(job_id)
+    finally:
+        # thread นี้เปิด connection ของตัวเอง ต้องปิดเองไม่งั้นค้าง
+        connection.close()
+
+
+def claim_job(job_id):
+    # เปลี่ยน PENDING -> RUNNING แบบ atomic กันไม่ให้ worker สองตัวทำงานเดียวกัน
+    return ImportJob.objects.filter(id=job_id, status='PENDING').update(
+        status='RUNNING', started_at=timezone.now()
+    ) == 1
+
+
+def run_import_job(job_id):
+    if not claim_job(job_id):
+        return None
+    job = ImportJob.objects.select_related('user').get(id=job_id)
+    session = create_session(job.user, 'FILE', job.file_name)
+    # ผูก session ไว้ตั้งแต่แรก ถ้า worker ตายกลางทาง requeue_stale_jobs จะลบรายการที่พักไว้บางส่วนทิ้งได้
+    ImportJob.objects.filter(id=job.id).update(session=session)
+    errors = []
+    error_count = 0
+    staged_count = 0
+
+    try:
+        for chunk in iter_import_chunks(job.file_path, job.file_name, job.user):
+            staged_count = stage_rows(session, chunk.rows, start=staged_count)
+            error_count += len(chunk.errors)
+            errors.extend(chunk.errors[:MAX_JOB_ERRORS - len(errors)])
+            ImportJob.objects.filter(id=job.id).update(
+                rows_processed=staged_count, error_count=error_count, errors=errors
+            )
+
+        job.session = session
+        if not staged_count:
+            session.delete()
+            job.session = None
+            job.message = "ไม่พบข้อมูลรายการในไฟล์"
+        job.status = 'DONE'
+    except Exception as e:
+        session.delete()
+        job.session = None
+        job.status = 'FAILED'
+        job.message = str(e) if isinstance(e, ImportFileError) else f"เกิดข้อผิดพลาดในการอ่านไฟล์: {e}"
+    finally:
+        if os.path.exists(job.file_path): os.remove(job.file_path)
+
+    job.rows_processed = staged_count
+    job.error_count = error_count
+    job.errors = errors
+    job.finished_at = timezone.now()
+    # บันทึกผลเฉพาะถ้างานยังเป็นของเราอยู่ (ไม่ถูก requeue / ปิดทิ้งเพราะค้างนานเกินไประหว่างทำ)
+    saved = ImportJob.objects.filter(id=job.id, status='RUNNING', started_at=job.started_at).update(
+        status=job.status, message=job.message, session=job.session, rows_processed=staged_count,
+        error_count=error_count, errors=errors, finished_at=job.finished_at,
+    )
+    if not saved:
+        if job.session: job.session.delete()
+        return None
+    print(f"📥 [Import] job {job.id} {job.status}: {staged_count} rows, {error_count} errors ({job.rows_per_second} rows/s)")
+    return job
+
+
+def requeue_stale_jobs():
+    # งานที่ค้าง RUNNING (worker ถูก kill กลางทาง) ทิ้งรายการที่พักไว้บางส่วน แล้วส่งกลับเข้าคิว
+    stale = ImportJob.objects.filter(status='RUNNING', started_at__lt=timezone.now() - STALE_JOB_TIMEOUT)
+    ImportSession.objects.filter(job__in=stale).delete()
+    return stale.update(status='PENDING', rows_processed=0, error_count=0, errors=[])
+
+
+def expire_stale_jobs(jobs=None):
+    # โหมด 'thread': ถ้า process เว็บตาย (restart / deploy) งานที่ค้างอยู่จะไม่มีใครทำต่อ
+    # ไฟล์อยู่บนดิสก์ของ process เดิม ส่งกลับเข้าคิวไม่ได้ จึงปิดเป็น FAILED ให้ user อัปโหลดใหม่
+    # เรียกตอนส่งงานใหม่และตอนหน้าเว็บ poll สถานะ (โหมด 'worker' ให้ run_import_worker requeue เอง)
+    if IMPORT_JOB_RUNNER != 'thread':
+        return 0
+    jobs = ImportJob.objects.all() if jobs is None else jobs
+    cutoff = timezone.now() - STALE_JOB_TIMEOUT
+    stale = jobs.filter(Q(status='RUNNING', started_at__lt=cutoff) | Q(status='PENDING', created_at__lt=cutoff))
+    stale_jobs = list(stale.values_list('id', 'file_path'))
+    if not stale_jobs:
+        return 0
+
+    stale_ids = [job_id for job_id, _ in stale_jobs]
+    ImportSession.objects.filter(job__in=stale_ids).delete()
+    expired = ImportJob.objects.filter(id__in=stale_ids, status__in=['PENDING', 'RUNNING']).update(
+        status='FAILED', session=None, finished_at=timezone.now(),
+        message="งานนำเข้าค้างนานเกินไป (ระบบอาจถูกรีสตาร์ทระหว่างทำงาน) กรุณาอัปโหลดไฟล์ใหม่",
+    )
+    for _, file_path in stale_jobs:
+        if os.path.exists(file_path): os.remove(file_path)
+    return expired
+
+
+def run_pending_jobs(limit=None):
+    # ใช้โดย manage.py run_import_worker: ทำงานที่รอคิวตามลำดับ คืนจำนวนงานที่ทำ
+    done = 0
+    for job_id in ImportJob.objects.filter(status='PENDING').order_by('created_at').values_list('id', flat=True):
+        if run_import_job(job_id):
+            done += 1
+        if limit and done >= limit:
+            break
+    return done
+
+
+def job_status(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'file_name': job.file_name,
+        'rows_processed': job.rows_processed,
+        'error_count': job.error_count,
+        'errors': job.errors[:5],
+        'rows_per_second': job.rows_per_second,
+        'message': job.message,
+        'session_id': job.session_id,
+    }
@@ -0,0 +1,260 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .models import DailyRollup, DescriptionMemo, MonthlyRollup, Transaction
+from .utils import normalize_text
+
+# SQLite จำกัดจำนวนตัวแปรต่อ query แบ่ง IN (...) เป็นก้อนๆ
+LOOKUP_CHUNK_SIZE = 500
+ROLLUP_BATCH_SIZE = 1000
+
+
+def description_key(description):
+    return normalize_text(description)[:255]
+
+
+def remember_categories(transactions):
+    # จำหมวดล่าสุดของแต่ละรายการ (แยกตาม user) ลง DescriptionMemo
+    # เรียกหลังสร้าง / แก้ไข / bulk_create รายการ
+    latest = {}
+    for txn in transactions:
+        if txn.user_id and txn.category_id:
+            latest[(txn.user_id, description_key(txn.description))] = txn.category_id
+
+    if not latest:
+        return
+
+    DescriptionMemo.objects.bulk_create(
+        [
+            DescriptionMemo(user_id=user_id, description_key=key, category_id=category_id)
+            for (user_id, key), category_id in latest.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'description_key'],
+        update_fields=['category', 'updated_at'],
+    )
+
+
+def previous_categories(user, descriptions):
+    # หมวดล่าสุดที่ user เคยใช้กับแต่ละรายการ คืนเป็น {description: Category}
+    # ค่าใช้จ่ายขึ้นกับจำนวนชื่อรายการที่ไม่ซ้ำกัน ไม่ใช่จำนวนประวัติทั้งหมด
+    descriptions_by_key = {}
+    for description in descriptions:
+        descriptions_by_key.setdefault(description_key(description), []).append(description)
+
+    keys = list(descriptions_by_key)
+    result = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        memos = DescriptionMemo.objects.filter(
+            user=user,
+            description_key__in=keys[start:start + LOOKUP_CHUNK_SIZE]
+        ).select_related('category')
+        for memo in memos:
+            for description in descriptions_by_key[memo.description_key]:
+                result[description] = memo.category
+    return result
+
+
+def record_transactions(transactions, old_dates=()):
+    # เรียกหลังสร้าง / แก้ไขรายการ (รวม bulk_create): อัปเดต memo หมวดหมู่ และยอดสรุป rollup
+    # old_dates = วันที่เดิมของรายการที่ถูกแก้ไข (ถ้าย้ายวัน ยอดของวันเก่าต้องคำนวณใหม่ด้วย)
+    remember_categories(transactions)
+
+    dates_by_user = defaultdict(set)
+    for txn in transactions:
+        if txn.user_id:
+            dates_by_user[txn.user_id].add(_as_date(txn.date))
+            dates_by_user[txn.user_id].update(_as_date(d) for d in old_dates)
+    for user_id, dates in dates_by_user.items():
+        refresh_rollups(user_id, dates)
+
+
+def forget_transactions(transactions):
+    # เรียกหลังลบรายการ (หรือย้ายรายการไป user อื่น) ด้วย instance ที่อ่านไว้ก่อนลบ: คำนวณยอดของวันเดิมใหม่
+    dates_by_user = defaultdict(set)
+    for txn in transactions:
+        if txn.user_id:
+            dates_by_user[txn.user_id].add(_as_date(txn.date))
+    for user_id, dates in dates_by_user.items():
+        refresh_rollups(user_id, dates)
+
+
+def delete_category(category):
+    # ลบหมวด: รายการของหมวดนี้กลายเป็นไม่ระบุหมวด (SET_NULL) ส่วน rollup ของหมวดนี้ถูกลบตาม (CASCADE)
+    # แล้วคำนวณยอดไม่ระบุหมวดของวันเดิมใหม่ ยอดรวมจะไม่หายไปกับหมวด
+    with transaction.atomic():
+        dates_by_user = defaultdict(set)
+        for user_id, day in DailyRollup.objects.filter(category=category).values_list('user_id', 'date'):
+            dates_by_user[user_id].add(day)
+        category.delete()
+        for user_id, dates in dates_by_user.items():
+            refresh_rollups(user_id, dates)
+
+
+def _as_date(value):
+    # Transaction.date มี default เป็น timezone.now (datetime) ก่อนถูกโหลดกลับจาก DB
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _rollup_sums():
+    return {
+        'income': Sum('amount', filter=Q(amount__gt=0)),
+        'expense': Sum('amount', filter=Q(amount__lt=0)),
+        'income_count': Count('id', filter=Q(amount__gt=0)),
+        'expense_count': Count('id', filter=Q(amount__lt=0)),
+    }
+
+
+def _daily_rollups(user_id, transactions):
+    rows = transactions.values('date', 'category_id').annotate(**_rollup_sums()).order_by()
+    return [
+        DailyRollup(
+            user_id=user_id,
+            date=row['date'],
+            category_id=row['category_id'],
+            income_total=row['income'] or 0,
+            expense_total=abs(row['expense'] or 0),
+            income_count=row['income_count'],
+            expense_count=row['expense_count'],
+        )
+        for row in rows
+    ]
+
+
+def _monthly_rollups(user_id, daily_rollups):
+    rows = daily_rollups.values(
+        'category_id', year=ExtractYear('date'), month=ExtractMonth('date')
+    ).annotate(
+        income=Sum('income_total'),
+        expense=Sum('expense_total'),
+        total_income_count=Sum('income_count'),
+        total_expense_count=Sum('expense_count'),
+    ).order_by()
+    return [
+        MonthlyRollup(
+            user_id=user_id,
+            year=row['year'],
+            month=row['month'],
+            category_id=row['category_id'],
+            income_total=row['income'] or 0,
+            expense_total=row['expense'] or 0,
+            income_count=row['total_income_count'] or 0,
+            expense_count=row['total_expense_count'] or 0,
+        )
+        for row in rows
+    ]
+
+
+def _month_range(year, month):
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end - timedelta(days=1)
+
+
+def _lock_user(user_id):
+    # ล็อกแถว user ไว้ทั้ง transaction กันสอง request คำนวณ rollup ของคนเดียวกันซ้อนกันจนยอดซ้ำ
+    User.objects.select_for_update().filter(id=user_id).exists()
+
+
+def refresh_rollups(user_id, dates):
+    # คำนวณยอดของวันที่ได้รับผลกระทบใหม่จากรายการของวันนั้นๆ แล้วต่อยอดรายเดือนจากยอดรายวัน
+    # ค่าใช้จ่ายขึ้นกับจำนวนรายการในวันที่แก้ ไม่ใช่ประวัติทั้งหมด
+    dates = sorted(set(dates))
+    if not user_id or not dates:
+        return
+
+    with transaction.atomic():
+        _lock_user(user_id)
+        for start in range(0, len(dates), LOOKUP_CHUNK_SIZE):
+            chunk = dates[start:start + LOOKUP_CHUNK_SIZE]
+            DailyRollup.objects.filter(user_id=user_id, date__in=chunk).delete()
+            DailyRollup.objects.bulk_create(
+                _daily_rollups(user_id, Transaction.objects.filter(user_id=user_id, date__in=chunk)),
+                batch_size=ROLLUP_BATCH_SIZE,
+            )
+
+        months = sorted({(d.year, d.month) for d in dates})
+        for start in range(0, len(months), LOOKUP_CHUNK_SIZE):
+            chunk = months[start:start + LOOKUP_CHUNK_SIZE]
+            month_filter = Q()
+            day_filter = Q()
+            for year, month in chunk:
+                month_filter |= Q(year=year, month=month)
+                day_filter |= Q(date__range=_month_range(year, month))
+            MonthlyRollup.objects.filter(month_filter, user_id=user_id).delete()
+            MonthlyRollup.objects.bulk_create(
+                _monthly_rollups(user_id, DailyRollup.objects.filter(day_filter, user_id=user_id)),
+                batch_size=ROLLUP_BATCH_SIZE,
+            )
+
+
+def rebuild_rollups(user_id):
+    # สร้าง rollup ของ user ใหม่ทั้งหมดจากรายการดิบ
+    with transaction.atomic():
+        _lock_user(user_id)
+        DailyRollup.objects.filter(user_id=user_id).delete()
+        MonthlyRollup.objects.filter(user_id=user_id).delete()
+        DailyRollup.objects.bulk_create(
+            _daily_rollups(user_id, Transaction.objects.filter(user_id=user_id)),
+            batch_size=ROLLUP_BATCH_SIZE,
+        )
+        MonthlyRollup.objects.bulk_create(
+            _monthly_rollups(user_id, DailyRollup.objects.filter(user_id=user_id)),
+            batch_size=ROLLUP_BATCH_SIZE,
+        )
+
+
+def _totals(rows, key_fields):
+    cent = Decimal('0.01')
+    totals = {}
+    for row in rows:
+        key = tuple(row[f] for f in key_fields)
+        totals[key] = (
+            Decimal(row['income'] or 0).quantize(cent),
+            abs(Decimal(row['expense'] or 0)).quantize(cent),
+            row['income_count'] or 0,
+            row['expense_count'] or 0,
+        )
+    return totals
+
+
+def verify_rollups(user_id):
+    # เทียบ rollup กับยอดจริงจาก Transaction คืน list ของจุดที่ไม่ตรงกัน (list ว่าง = ถูกต้อง)
+    transactions = Transaction.objects.filter(user_id=user_id)
+    rollup_sums = {
+        'income': Sum('income_total'),
+        'expense': Sum('expense_total'),
+        'income_count': Sum('income_count'),
+        'expense_count': Sum('expense_count'),
+    }
+
+    daily_keys = ('date', 'category_id')
+    expected_daily = _totals(transactions.values(*daily_keys).annotate(**_rollup_sums()).order_by(), daily_keys)
+    actual_daily = _totals(
+        DailyRollup.objects.filter(user_id=user_id).values(*daily_keys).annotate(**rollup_sums).order_by(),
+        daily_keys,
+    )
+
+    monthly_keys = ('year', 'month', 'category_id')
+    expected_monthly = _totals(
+        transactions.values('category_id', year=ExtractYear('date'), month=ExtractMonth('date'))
+        .annotate(**_rollup_sums()).order_by(),
+        monthly_keys,
+    )
+    actual_monthly = _totals(
+        MonthlyRollup.objects.filter(user_id=user_id).values(*monthly_keys).annotate(**rollup_sums).order_by(),
+        monthly_keys,
+    )
+
+    mismatches = []
+    for label, expected, actual in (('daily', expected_daily, actual_daily), ('monthly', expected_monthly, actual_monthly)):
+        for key in sorted(set(expected) | set(actual), key=str):
+            if expected.get(key) != actual.get(key):
+                mismatches.append(f"{label} {key}: expected {expected.get(key)}, got {actual.get(key)}")
+    return mismatches
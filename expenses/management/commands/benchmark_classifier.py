@@ -0,0 +1,79 @@
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.compact import CompactModel
+from expenses.models import TrainingData
+from expenses.services import ModelStore, MODEL_PATH
+
+CSV_PATH = os.path.join(settings.BASE_DIR, 'ml_models', 'ai_training_data.csv')
+
+
+class Command(BaseCommand):
+    help = "ตรวจว่าทางทำนายแบบ NumPy ให้ผลตรงกับ sklearn บนข้อมูล train และวัด latency ต่อข้อความ"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500, help='จำนวนครั้งที่ทำนายเพื่อวัดเวลา')
+        parser.add_argument('--tolerance', type=float, default=1e-4, help='ค่าความน่าจะเป็นต่างกันได้ไม่เกินเท่านี้')
+
+    def handle(self, *args, **options):
+        import joblib
+        import numpy as np
+        import pandas as pd
+
+        store = ModelStore(MODEL_PATH)
+        version = store.current_version()
+        path = store.path_for(version) if version else MODEL_PATH
+        if not os.path.exists(path):
+            raise CommandError("ยังไม่มีโมเดล (กด Re-train ก่อน)")
+        pipeline = joblib.load(path)
+        if not hasattr(pipeline, 'steps'):
+            raise CommandError("โมเดลปัจจุบันไม่ใช่ Pipeline ของ sklearn (โหมด online)")
+
+        texts = list(TrainingData.objects.values_list('text', flat=True))
+        if not texts and os.path.exists(CSV_PATH):
+            texts = pd.read_csv(CSV_PATH).iloc[:, 0].astype(str).tolist()
+        if not texts:
+            raise CommandError("ไม่มีข้อความสำหรับทดสอบ")
+
+        candidates = [('in-memory', CompactModel.from_pipeline(pipeline))]
+        compact_path = store.compact_path_for(version) if version else None
+        if compact_path and os.path.isdir(compact_path):
+            candidates.append(('memmap', CompactModel.load(compact_path)))
+
+        self.stdout.write(f"โมเดล {version or 'legacy'}: {len(texts):,} ข้อความ, {len(candidates[0][1]):,} คำ/คอลัมน์ที่มีน้ำหนัก")
+        expected = pipeline.predict_proba(texts)
+        for name, model in candidates:
+            proba = np.array([model.predict_one(text)[1] for text in texts])
+            labels = [model.predict_one(text)[0] for text in texts]
+            same = sum(a == b for a, b in zip(labels, pipeline.classes_[expected.argmax(axis=1)]))
+            diff = float(np.abs(proba - expected.max(axis=1)).max())
+            self.stdout.write(f"{name}: หมวดตรงกัน {same}/{len(texts)}, ความน่าจะเป็นต่างสูงสุด {diff:.2e}")
+            if same != len(texts) or diff > options['tolerance']:
+                raise CommandError(f"ผลทำนายแบบ {name} ไม่ตรงกับ sklearn")
+
+        def measure(predict):
+            timings = []
+            for i in range(options['repeat']):
+                text = texts[i % len(texts)]
+                start = time.perf_counter()
+                predict(text)
+                timings.append(time.perf_counter() - start)
+            return statistics.median(timings) * 1e6, statistics.mean(timings) * 1e6
+
+        # ตัดคำทุกข้อความไว้ก่อน (cache) เวลาที่วัดจะเหลือแต่ส่วนของโมเดล
+        pipeline[0].transform(texts)
+
+        def sklearn_predict(text):
+            pipeline.predict([text])
+            pipeline.predict_proba([text])
+
+        results = [('sklearn predict + predict_proba', measure(sklearn_predict))]
+        results += [(f"{name} predict_one", measure(model.predict_one)) for name, model in candidates]
+        baseline = results[0][1][0]
+        for name, (median, mean) in results:
+            self.stdout.write(f"{name:>32}: median {median:8.1f} µs, mean {mean:8.1f} µs (x{baseline / median:.1f})")
+        self.stdout.write(self.style.SUCCESS("✅ ทางทำนายแบบ NumPy ให้ผลตรงกับ sklearn"))
@@ -0,0 +1,73 @@
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.services import build_pipeline, build_vectorizer, token_cache
+from expenses.training import iter_training_rows
+
+CSV_PATH = os.path.join(settings.BASE_DIR, 'ml_models', 'ai_training_data.csv')
+FEATURIZERS = ['newmm', 'char']
+LATIN_RE = re.compile(r'[A-Za-z0-9]')
+
+
+class Command(BaseCommand):
+    help = "เทียบ featurizer 'newmm' (ตัดคำ) กับ 'char' (n-gram ตัวอักษร) ทั้งความเร็วและความแม่นยำ (cross-validation)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=CSV_PATH, help='ไฟล์ CSV (คำศัพท์, หมวดหมู่)')
+        parser.add_argument('--folds', type=int, default=5, help='จำนวน fold ของ cross-validation')
+        parser.add_argument('--repeat', type=int, default=20, help='จำนวนรอบที่วนข้อความทั้งหมดเพื่อวัดความเร็ว')
+
+    def handle(self, *args, **options):
+        import numpy as np
+        from sklearn.model_selection import KFold
+
+        if not os.path.exists(options['path']):
+            raise CommandError(f"ไม่พบไฟล์ {options['path']}")
+        with open(options['path'], encoding='utf-8-sig', newline='') as f:
+            rows = list(iter_training_rows(f))
+        if len(rows) < options['folds']:
+            raise CommandError("ข้อมูลน้อยเกินไปสำหรับ cross-validation")
+        texts = np.array([text for text, _ in rows], dtype=object)
+        labels = np.array([label for _, label in rows], dtype=object)
+        # ชื่อร้าน/รายการที่มีอักษรอังกฤษหรือตัวเลขปน เช่น "7-Eleven", "Grab"
+        mixed = np.array([bool(LATIN_RE.search(text)) for text in texts])
+        self.stdout.write(f"{len(texts):,} ข้อความ ({int(mixed.sum())} ข้อความมีอังกฤษ/ตัวเลขปน), {len(set(labels))} หมวด")
+
+        for featurizer in FEATURIZERS:
+            # ความเร็วแปลงข้อความเป็น feature แบบไม่มี cache (ล้าง cache ตัดคำทุกรอบ)
+            vectorizer = build_vectorizer(featurizer).fit(texts)
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                token_cache.clear()
+                vectorizer.transform(texts)
+            featurize_rate = len(texts) * options['repeat'] / (time.perf_counter() - start)
+
+            token_cache.clear()
+            start = time.perf_counter()
+            model = build_pipeline(featurizer).fit(texts, labels)
+            train_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                token_cache.clear()
+                model.predict_proba(texts)
+            predict_rate = len(texts) * options['repeat'] / (time.perf_counter() - start)
+
+            # ความแม่นยำกับข้อความที่โมเดลไม่เคยเห็น
+            correct = np.zeros(len(texts), dtype=bool)
+            kfold = KFold(n_splits=options['folds'], shuffle=True, random_state=42)
+            for train_index, test_index in kfold.split(texts):
+                fold_model = build_pipeline(featurizer).fit(texts[train_index], labels[train_index])
+                correct[test_index] = fold_model.predict(texts[test_index]) == labels[test_index]
+            mixed_accuracy = f"{correct[mixed].mean():.1%}" if mixed.any() else "-"
+
+            self.stdout.write(
+                f"{featurizer:>6}: featurize {featurize_rate:10,.0f} ข้อความ/วินาที, "
+                f"predict {predict_rate:10,.0f} ข้อความ/วินาที, train {train_seconds * 1000:7.1f} ms, "
+                f"accuracy {correct.mean():.1%} (อังกฤษปน {mixed_accuracy})"
+            )
+        self.stdout.write(self.style.SUCCESS("✅ เปลี่ยน featurizer ได้ที่ AI_FEATURIZER ใน settings"))
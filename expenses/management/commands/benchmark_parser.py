@@ -0,0 +1,44 @@
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from expenses.parsers import parse_lines
+
+SAMPLE_ITEMS = ['ข้าวผัด', 'ค่ารถ', 'กาแฟ', 'เงินเดือน', '7-Eleven', 'ค่าไฟ', 'ค่าเน็ต', 'ขายของ']
+
+
+class Command(BaseCommand):
+    help = "วัดความเร็ว parser บันทึกด่วน (บรรทัด/วินาที) บนไฟล์ทดสอบขนาดใหญ่"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=200000, help='จำนวนบรรทัดในไฟล์ทดสอบ')
+        parser.add_argument('--repeat', type=int, default=3, help='จำนวนรอบที่วัด (รายงานรอบที่เร็วที่สุด)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        fd, path = tempfile.mkstemp(suffix='.txt')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for i in range(options['lines']):
+                    if i % 20 == 0:
+                        f.write(f"{rng.randint(1, 28)}/{rng.randint(1, 12)}/25\n")
+                    else:
+                        f.write(f"{rng.choice(['-', '+', ''])}{rng.randint(1, 50000):,} {rng.choice(SAMPLE_ITEMS)}\n")
+
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                with open(path, 'r', encoding='utf-8') as f:
+                    parsed = sum(1 for _ in parse_lines(f))
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            self.stdout.write(f"ไฟล์ {options['lines']:,} บรรทัด -> {parsed:,} รายการ")
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {best:.3f}s ({options['lines'] / best:,.0f} บรรทัด/วินาที, ดีที่สุดจาก {options['repeat']} รอบ)"
+            ))
+        finally:
+            os.remove(path)
@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.ledger import rebuild_rollups, verify_rollups
+from expenses.models import Transaction
+
+
+class Command(BaseCommand):
+    help = "สร้างตารางสรุปยอด (DailyRollup / MonthlyRollup) ใหม่จาก Transaction หรือตรวจว่ายอดตรงกันไหม"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username ที่ต้องการ (ไม่ระบุ = ทุกคน)')
+        parser.add_argument('--verify', action='store_true', help='ตรวจอย่างเดียว ไม่แก้ไขข้อมูล')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if not user:
+                raise CommandError(f"ไม่พบผู้ใช้ {options['user']}")
+            user_ids = [user.id]
+        else:
+            user_ids = list(
+                Transaction.objects.filter(user__isnull=False).values_list('user_id', flat=True).distinct()
+            )
+
+        total_mismatches = 0
+        for user_id in user_ids:
+            if options['verify']:
+                mismatches = verify_rollups(user_id)
+                total_mismatches += len(mismatches)
+                for line in mismatches:
+                    self.stdout.write(self.style.WARNING(f"user {user_id}: {line}"))
+            else:
+                rebuild_rollups(user_id)
+                self.stdout.write(f"user {user_id}: rebuilt")
+
+        if options['verify']:
+            if total_mismatches:
+                raise CommandError(f"พบยอดไม่ตรง {total_mismatches} จุด (รัน rebuild_rollups เพื่อแก้)")
+            self.stdout.write(self.style.SUCCESS(f"✅ rollup ตรงกับรายการจริง ({len(user_ids)} users)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ สร้าง rollup ใหม่เรียบร้อย ({len(user_ids)} users)"))
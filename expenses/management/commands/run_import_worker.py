@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from expenses.jobs import requeue_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "ทำงานนำเข้าไฟล์ที่รอคิวอยู่ (ใช้คู่กับ IMPORT_JOB_RUNNER = 'worker')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='ทำงานที่ค้างอยู่ให้หมดแล้วจบ')
+        parser.add_argument('--interval', type=float, default=2.0, help='วินาทีที่รอก่อนเช็กคิวใหม่เมื่อไม่มีงาน')
+
+    def handle(self, *args, **options):
+        self.stdout.write("📥 Import worker started")
+        while True:
+            requeued = requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(self.style.WARNING(f"ส่งงานที่ค้างกลับเข้าคิว {requeued} งาน"))
+
+            done = run_pending_jobs()
+            if done:
+                self.stdout.write(f"ทำงานเสร็จ {done} งาน")
+
+            if options['once']:
+                break
+            if not done:
+                time.sleep(options['interval'])
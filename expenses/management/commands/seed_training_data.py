@@ -0,0 +1,47 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.services import USER_MODELS, ai_classifier
+from expenses.training import TRAINING_IMPORT_BATCH_SIZE, ingest_training_rows, iter_training_rows
+
+
+class Command(BaseCommand):
+    help = "นำเข้าคำศัพท์สอน AI จากไฟล์ CSV (คำศัพท์, หมวดหมู่) แบบ bulk แล้ว Re-train โมเดล"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'ml_models', 'ai_training_data.csv'),
+            help='ไฟล์ CSV (ค่าเริ่มต้น ml_models/ai_training_data.csv)',
+        )
+        parser.add_argument('--user', help='username เจ้าของคำศัพท์ (ไม่ระบุ = ข้อมูลกลาง)')
+        parser.add_argument('--batch-size', type=int, default=TRAINING_IMPORT_BATCH_SIZE)
+        parser.add_argument('--no-train', action='store_true', help='นำเข้าอย่างเดียว ไม่ Re-train')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if not user:
+                raise CommandError(f"ไม่พบผู้ใช้ {options['user']}")
+        if not os.path.exists(options['path']):
+            raise CommandError(f"ไม่พบไฟล์ {options['path']}")
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as f:
+            result = ingest_training_rows(iter_training_rows(f), user=user, batch_size=options['batch_size'])
+
+        self.stdout.write(
+            f"อ่าน {result.rows_read} แถว: เพิ่มใหม่ {len(result.created)} คำ, "
+            f"ซ้ำ {result.duplicates} คำ, สร้างหมวดหมู่ใหม่ {result.categories_created} หมวด"
+        )
+        if result.created and not options['no_train']:
+            # ข้อมูลก้อนใหญ่ train ใหม่ทั้งหมดทีเดียวเลย ไม่ต้องผ่านคิวเบื้องหลัง (คำสั่งจบแล้วคิวก็หายไปด้วย)
+            if user and USER_MODELS:
+                # คำของ user ไม่อยู่ในโมเดลกลาง train แค่โมเดลส่วนตัวของคนนั้น
+                ai_classifier.train_user_model(user.id)
+            else:
+                ai_classifier.train_model()
+        self.stdout.write(self.style.SUCCESS("✅ นำเข้าคำศัพท์เรียบร้อย"))
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from expenses.utils import normalize_text
+
+
+def backfill_description_memo(apps, schema_editor):
+    # เติม memo จากประวัติเดิม: รายการที่บันทึกล่าสุด (ที่มีหมวด) ของแต่ละชื่อเป็นตัวชนะ
+    Transaction = apps.get_model("expenses", "Transaction")
+    DescriptionMemo = apps.get_model("expenses", "DescriptionMemo")
+
+    latest = {}
+    rows = (
+        Transaction.objects.filter(user__isnull=False, category__isnull=False)
+        .order_by("created_at", "id")
+        .values_list("user_id", "description", "category_id")
+    )
+    for user_id, description, category_id in rows.iterator(chunk_size=5000):
+        latest[(user_id, normalize_text(description)[:255])] = category_id
+
+    DescriptionMemo.objects.bulk_create(
+        [
+            DescriptionMemo(
+                user_id=user_id, description_key=key, category_id=category_id
+            )
+            for (user_id, key), category_id in latest.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0004_trainingdata"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DescriptionMemo",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("description_key", models.CharField(max_length=255)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="expenses.category",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "description_key")},
+            },
+        ),
+        migrations.RunPython(backfill_description_memo, migrations.RunPython.noop),
+    ]
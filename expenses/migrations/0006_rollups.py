@@ -0,0 +1,183 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def populate_rollups(apps, schema_editor):
+    # สร้างยอดสรุปจากรายการเดิมทั้งหมด (ภายหลังใช้ manage.py rebuild_rollups ได้)
+    Transaction = apps.get_model("expenses", "Transaction")
+    DailyRollup = apps.get_model("expenses", "DailyRollup")
+    MonthlyRollup = apps.get_model("expenses", "MonthlyRollup")
+
+    daily = (
+        Transaction.objects.filter(user__isnull=False)
+        .values("user_id", "date", "category_id")
+        .annotate(
+            income=Sum("amount", filter=Q(amount__gt=0)),
+            expense=Sum("amount", filter=Q(amount__lt=0)),
+            income_count=Count("id", filter=Q(amount__gt=0)),
+            expense_count=Count("id", filter=Q(amount__lt=0)),
+        )
+        .order_by()
+    )
+    DailyRollup.objects.bulk_create(
+        [
+            DailyRollup(
+                user_id=row["user_id"],
+                date=row["date"],
+                category_id=row["category_id"],
+                income_total=row["income"] or 0,
+                expense_total=abs(row["expense"] or 0),
+                income_count=row["income_count"],
+                expense_count=row["expense_count"],
+            )
+            for row in daily
+        ],
+        batch_size=1000,
+    )
+
+    monthly = (
+        DailyRollup.objects.values(
+            "user_id",
+            "category_id",
+            year=ExtractYear("date"),
+            month=ExtractMonth("date"),
+        )
+        .annotate(
+            income=Sum("income_total"),
+            expense=Sum("expense_total"),
+            total_income_count=Sum("income_count"),
+            total_expense_count=Sum("expense_count"),
+        )
+        .order_by()
+    )
+    MonthlyRollup.objects.bulk_create(
+        [
+            MonthlyRollup(
+                user_id=row["user_id"],
+                year=row["year"],
+                month=row["month"],
+                category_id=row["category_id"],
+                income_total=row["income"] or 0,
+                expense_total=row["expense"] or 0,
+                income_count=row["total_income_count"] or 0,
+                expense_count=row["total_expense_count"] or 0,
+            )
+            for row in monthly
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0005_descriptionmemo"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "income_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "expense_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("income_count", models.IntegerField(default=0)),
+                ("expense_count", models.IntegerField(default=0)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="expenses.category",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "date"], name="expenses_da_user_id_9309d9_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="MonthlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.IntegerField()),
+                ("month", models.IntegerField()),
+                (
+                    "income_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "expense_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("income_count", models.IntegerField(default=0)),
+                ("expense_count", models.IntegerField(default=0)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="expenses.category",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "year", "month"],
+                        name="expenses_mo_user_id_76d846_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0006_rollups"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["user", "date", "created_at", "id"],
+                name="expenses_tr_user_id_fa0263_idx",
+            ),
+        ),
+    ]
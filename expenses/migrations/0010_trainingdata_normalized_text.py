@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+from expenses.utils import normalize_text
+
+
+def backfill_normalized_text(apps, schema_editor):
+    # เติม key ให้แถวเดิม และลบคำซ้ำ (user + คำ + หมวดเดียวกัน) ก่อนสร้าง unique constraint
+    # เก็บแถวล่าสุดไว้ ลำดับ "ตัวล่าสุดชนะ" ของโพยจะได้เหมือนเดิม
+    TrainingData = apps.get_model("expenses", "TrainingData")
+
+    seen = set()
+    duplicate_ids = []
+    rows = TrainingData.objects.order_by("-created_at", "-id").values_list(
+        "id", "user_id", "text", "category_id"
+    )
+    updates = []
+    for row_id, user_id, text, category_id in rows.iterator(chunk_size=5000):
+        key = normalize_text(text)[:255]
+        if (user_id, key, category_id) in seen:
+            duplicate_ids.append(row_id)
+            continue
+        seen.add((user_id, key, category_id))
+        updates.append(TrainingData(id=row_id, normalized_text=key))
+
+    for start in range(0, len(duplicate_ids), 1000):
+        TrainingData.objects.filter(id__in=duplicate_ids[start:start + 1000]).delete()
+    TrainingData.objects.bulk_update(updates, ["normalized_text"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0009_import_jobs"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trainingdata",
+            name="normalized_text",
+            field=models.CharField(default="", max_length=255),
+        ),
+        migrations.RunPython(backfill_normalized_text, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="trainingdata",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("user__isnull", True)),
+                fields=("normalized_text", "category"),
+                name="unique_global_training_text",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="trainingdata",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("user__isnull", False)),
+                fields=("user", "normalized_text", "category"),
+                name="unique_user_training_text",
+            ),
+        ),
+    ]
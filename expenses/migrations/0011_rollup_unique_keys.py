@@ -0,0 +1,144 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def rebuild_duplicated_rollups(apps, schema_editor):
+    # ก่อนสร้าง unique constraint: user ที่มีแถว rollup ซ้ำ (ยอดถูกนับซ้ำ) สร้าง rollup ของคนนั้นใหม่จาก Transaction
+    Transaction = apps.get_model("expenses", "Transaction")
+    DailyRollup = apps.get_model("expenses", "DailyRollup")
+    MonthlyRollup = apps.get_model("expenses", "MonthlyRollup")
+
+    user_ids = set(
+        DailyRollup.objects.values("user_id", "date", "category_id")
+        .annotate(rows=Count("id")).filter(rows__gt=1).values_list("user_id", flat=True)
+    )
+    user_ids |= set(
+        MonthlyRollup.objects.values("user_id", "year", "month", "category_id")
+        .annotate(rows=Count("id")).filter(rows__gt=1).values_list("user_id", flat=True)
+    )
+
+    for user_id in user_ids:
+        DailyRollup.objects.filter(user_id=user_id).delete()
+        MonthlyRollup.objects.filter(user_id=user_id).delete()
+        daily = (
+            Transaction.objects.filter(user_id=user_id)
+            .values("date", "category_id")
+            .annotate(
+                income=Sum("amount", filter=Q(amount__gt=0)),
+                expense=Sum("amount", filter=Q(amount__lt=0)),
+                income_count=Count("id", filter=Q(amount__gt=0)),
+                expense_count=Count("id", filter=Q(amount__lt=0)),
+            )
+            .order_by()
+        )
+        DailyRollup.objects.bulk_create(
+            [
+                DailyRollup(
+                    user_id=user_id,
+                    date=row["date"],
+                    category_id=row["category_id"],
+                    income_total=row["income"] or 0,
+                    expense_total=abs(row["expense"] or 0),
+                    income_count=row["income_count"],
+                    expense_count=row["expense_count"],
+                )
+                for row in daily
+            ],
+            batch_size=1000,
+        )
+        monthly = (
+            DailyRollup.objects.filter(user_id=user_id)
+            .values("category_id", year=ExtractYear("date"), month=ExtractMonth("date"))
+            .annotate(
+                income=Sum("income_total"),
+                expense=Sum("expense_total"),
+                total_income_count=Sum("income_count"),
+                total_expense_count=Sum("expense_count"),
+            )
+            .order_by()
+        )
+        MonthlyRollup.objects.bulk_create(
+            [
+                MonthlyRollup(
+                    user_id=user_id,
+                    year=row["year"],
+                    month=row["month"],
+                    category_id=row["category_id"],
+                    income_total=row["income"] or 0,
+                    expense_total=row["expense"] or 0,
+                    income_count=row["total_income_count"] or 0,
+                    expense_count=row["total_expense_count"] or 0,
+                )
+                for row in monthly
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0010_trainingdata_normalized_text"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dailyrollup",
+            name="category",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="expenses.category",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="monthlyrollup",
+            name="category",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="expenses.category",
+            ),
+        ),
+        migrations.RunPython(rebuild_duplicated_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="dailyrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("category__isnull", False)),
+                fields=("user", "date", "category"),
+                name="unique_daily_rollup",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailyrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("category__isnull", True)),
+                fields=("user", "date"),
+                name="unique_daily_rollup_uncategorized",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="monthlyrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("category__isnull", False)),
+                fields=("user", "year", "month", "category"),
+                name="unique_monthly_rollup",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="monthlyrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("category__isnull", True)),
+                fields=("user", "year", "month"),
+                name="unique_monthly_rollup_uncategorized",
+            ),
+        ),
+    ]
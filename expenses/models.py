@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .utils import normalize_text
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     profile_picture = models.ImageField(upload_to='profile_pics/', default='default.jpg')
@@ -47,15 +49,184 @@ class Transaction(models.Model):
     date = models.DateField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # รองรับการไล่หน้าแบบ keyset ตามลำดับ (date, created_at, id) ของแต่ละ user
+        indexes = [models.Index(fields=['user', 'date', 'created_at', 'id'])]
+
     def __str__(self):
         return f"{self.description} - {self.amount}"
     
 class TrainingData(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True) 
     text = models.CharField(max_length=255)       
+    # key สำหรับกันคำซ้ำ (ไม่สนตัวพิมพ์ / ช่องว่างซ้ำ) เติมให้อัตโนมัติตอน save
+    normalized_text = models.CharField(max_length=255, default='')
     category = models.ForeignKey(Category, on_delete=models.CASCADE)  
     is_verified = models.BooleanField(default=False) 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # คำเดียวกัน + หมวดเดียวกัน เก็บแถวเดียว (ข้อมูลกลางของ Admin กับของแต่ละ user แยกกัน)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['normalized_text', 'category'],
+                condition=models.Q(user__isnull=True),
+                name='unique_global_training_text',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'normalized_text', 'category'],
+                condition=models.Q(user__isnull=False),
+                name='unique_user_training_text',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.normalized_text = normalize_text(self.text)[:255]
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.text} -> {self.category.name}"
+
+
+class DescriptionMemo(models.Model):
+    # หมวดหมู่ล่าสุดที่ user ใช้กับรายการชื่อนี้ (key = รายการที่ normalize แล้ว) ใช้เติมหมวดให้ตอน preview
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    description_key = models.CharField(max_length=255)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'description_key')
+
+    def __str__(self):
+        return f"{self.description_key} -> {self.category.name}"
+
+
+class DailyRollup(models.Model):
+    # ยอดรวมรายวันแยกหมวด (สรุปจาก Transaction) ให้หน้า Dashboard/งบประมาณไม่ต้อง Sum จากรายการดิบ
+    # expense_total เก็บเป็นค่าบวก
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    # ลบหมวดแล้วยอดของหมวดนั้นต้องไปรวมกับยอดไม่ระบุหมวด (ledger.delete_category คำนวณใหม่ให้)
+    # SET_NULL ไม่ได้ เพราะจะชนกับแถวไม่ระบุหมวดของวันเดียวกัน
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    income_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    income_count = models.IntegerField(default=0)
+    expense_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'date'])]
+        # หนึ่งแถวต่อ (user, วัน, หมวด) กันยอดซ้ำ (NULL ไม่ชนกันเองใน unique ปกติ จึงแยกกรณีไม่ระบุหมวด)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date', 'category'],
+                condition=models.Q(category__isnull=False),
+                name='unique_daily_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'date'],
+                condition=models.Q(category__isnull=True),
+                name='unique_daily_rollup_uncategorized',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.date}: +{self.income_total} / -{self.expense_total}"
+
+
+class MonthlyRollup(models.Model):
+    # ยอดรวมรายเดือนแยกหมวด (สรุปต่อจาก DailyRollup)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    month = models.IntegerField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    income_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    income_count = models.IntegerField(default=0)
+    expense_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'year', 'month'])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'year', 'month', 'category'],
+                condition=models.Q(category__isnull=False),
+                name='unique_monthly_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'year', 'month'],
+                condition=models.Q(category__isnull=True),
+                name='unique_monthly_rollup_uncategorized',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.month}/{self.year}: +{self.income_total} / -{self.expense_total}"
+
+
+class ImportSession(models.Model):
+    # รายการที่อ่านได้จากหน้าบันทึกด่วน / นำเข้าไฟล์ พักไว้ฝั่ง server ระหว่างรอ user ตรวจสอบ
+    SOURCE_CHOICES = [
+        ('SMART', 'บันทึกด่วน'),
+        ('FILE', 'นำเข้าไฟล์'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    file_name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user} {self.get_source_display()} #{self.id}"
+
+
+class StagedTransaction(models.Model):
+    session = models.ForeignKey(ImportSession, on_delete=models.CASCADE, related_name='rows')
+    position = models.IntegerField()
+    date = models.DateField()
+    description = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    ai_suggested = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['position']
+        indexes = [models.Index(fields=['session', 'position'])]
+
+    def __str__(self):
+        return f"{self.description} - {self.amount}"
+
+
+class ImportJob(models.Model):
+    # งานอ่านไฟล์นำเข้าที่ทำเบื้องหลัง (ไม่ผูก web worker) ผลลัพธ์ถูกพักไว้ใน session เพื่อรอ user ตรวจสอบ
+    STATUS_CHOICES = [
+        ('PENDING', 'รอคิว'),
+        ('RUNNING', 'กำลังอ่านไฟล์'),
+        ('DONE', 'เสร็จแล้ว'),
+        ('FAILED', 'ผิดพลาด'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    session = models.OneToOneField(ImportSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='job')
+    file_name = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=500)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    rows_processed = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    @property
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else 0
+
     def __str__(self):
-        return f"{self.text} -> {self.category.name}"
\ No newline at end of file
+        return f"{self.file_name} ({self.status})"
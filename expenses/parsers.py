@@ -0,0 +1,78 @@
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+
+# compile ครั้งเดียวตอน import ใช้ร่วมกันระหว่างหน้าบันทึกด่วนและการนำเข้าไฟล์ .txt
+DATE_RE = re.compile(r'(\d{1,2})[-/](\d{1,2})[-/](\d{2,4})')
+# ✅ Regex รองรับลูกน้ำ [0-9,]+
+AMOUNT_RE = re.compile(r'([+-]?[0-9,]+(\.\d+)?)')
+DEFAULT_DESCRIPTION = "รายการทั่วไป"
+
+
+@dataclass(slots=True)
+class ParsedLine:
+    # หนึ่งบรรทัดที่เป็นรายการ (บรรทัดวันที่ไม่ถูกส่งออกมา แต่เปลี่ยน date ของบรรทัดถัดไป)
+    # error ไม่ว่าง = บรรทัดมีตัวเลขแต่อ่านจำนวนเงินไม่ได้
+    line_no: int
+    date: date
+    description: str
+    amount: float | None
+    error: str = ''
+
+    def as_preview(self):
+        return {
+            'date': self.date.strftime('%Y-%m-%d'),
+            'description': self.description,
+            'amount': self.amount,
+            'category_id': "",
+            'category_name': "-"
+        }
+
+
+def parse_date_header(line):
+    # บรรทัดที่มีแค่วันที่ เช่น 12/01/25 หรือ 12-01-2025 คืน date (None = ไม่ใช่บรรทัดวันที่ / วันที่ผิด)
+    match = DATE_RE.fullmatch(line)
+    if not match:
+        return None
+    day, month, year = map(int, match.groups())
+    if year < 100: year += 2000
+    try:
+        return datetime(year, month, day).date()
+    except ValueError:
+        return None
+
+
+def parse_lines(lines, current_date=None):
+    # generator: รับบรรทัดทีละบรรทัด (list, ไฟล์ที่เปิดอยู่ ฯลฯ) แล้วส่ง ParsedLine ออกมาทีละรายการ
+    if current_date is None:
+        current_date = datetime.now().date()
+
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line: continue
+
+        if DATE_RE.fullmatch(line):
+            current_date = parse_date_header(line) or current_date
+            continue
+
+        amount_match = AMOUNT_RE.search(line)
+        if not amount_match: continue
+
+        amount_str = amount_match.group(1)
+        try:
+            # ลบลูกน้ำออกก่อนแปลงเป็น float
+            amount_val = float(amount_str.replace(',', ''))
+        except ValueError:
+            yield ParsedLine(line_no, current_date, line, None, "จำนวนเงินไม่ถูกต้อง")
+            continue
+
+        description = line.replace(amount_str, '').strip()
+        date_match = DATE_RE.search(description)
+        if date_match: description = description.replace(date_match.group(0), '').strip()
+
+        yield ParsedLine(
+            line_no,
+            current_date,
+            description or DEFAULT_DESCRIPTION,
+            -abs(amount_val) if '-' in amount_str else abs(amount_val),
+        )
@@ -0,0 +1,222 @@
+import base64
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Budget, Category, DailyRollup, MonthlyRollup, Transaction
+
+UNCATEGORIZED_LABEL = 'ไม่ระบุหมวด'
+DASHBOARD_DAYS = 7
+TRANSACTION_PAGE_SIZE = 50
+
+
+@dataclass
+class BudgetStatus:
+    category: Category
+    limit: Decimal
+    used: Decimal
+    budget_id: int = None
+
+    @property
+    def remain(self):
+        return self.limit - self.used
+
+    @property
+    def used_percent(self):
+        return (self.used / self.limit * 100) if self.limit > 0 else 0
+
+    @property
+    def percent(self):
+        # ใช้เป็นความกว้างของ progress bar จึงไม่เกิน 100
+        return min(self.used_percent, 100)
+
+    @property
+    def status_color(self):
+        if self.used_percent >= 100:
+            return 'danger'
+        if self.used_percent >= 80:
+            return 'warning'
+        return 'success'
+
+
+@dataclass
+class DashboardSummary:
+    total_income: Decimal = Decimal('0')
+    total_expense: Decimal = Decimal('0')  # เก็บเป็นค่าบวก
+    category_labels: list = field(default_factory=list)
+    category_expenses: list = field(default_factory=list)
+    days: list = field(default_factory=list)
+    daily_income: list = field(default_factory=list)
+    daily_expense: list = field(default_factory=list)
+
+    @property
+    def balance(self):
+        return self.total_income - self.total_expense
+
+    @property
+    def day_labels(self):
+        return [day.strftime('%d/%m') for day in self.days]
+
+    def to_dict(self):
+        return {
+            'total_income': float(self.total_income),
+            'total_expense': float(self.total_expense),
+            'balance': float(self.balance),
+            'expense_by_category': {
+                'labels': self.category_labels,
+                'data': self.category_expenses,
+            },
+            'daily': {
+                'dates': [day.isoformat() for day in self.days],
+                'labels': self.day_labels,
+                'income': self.daily_income,
+                'expense': self.daily_expense,
+            },
+        }
+
+
+def _income_expense_sums():
+    return {
+        'income': Sum('income_total'),
+        'expense': Sum('expense_total'),
+    }
+
+
+def build_dashboard_summary(user, today=None, days=DASHBOARD_DAYS):
+    # สรุปหน้า Dashboard ด้วย 2 query จากตาราง rollup: (1) แยกตามหมวดหมู่ (ได้ยอดรวมไปด้วย) (2) รายวันย้อนหลัง
+    # ค่าใช้จ่ายขึ้นกับจำนวนเดือน/หมวด ไม่ใช่จำนวนรายการ
+    today = today or datetime.now().date()
+    summary = DashboardSummary()
+
+    by_category = MonthlyRollup.objects.filter(user=user).values('category__name').annotate(**_income_expense_sums()).order_by()
+    expenses = []
+    for row in by_category:
+        summary.total_income += row['income'] or 0
+        if row['expense']:
+            summary.total_expense += row['expense']
+            expenses.append((row['expense'], row['category__name'] or UNCATEGORIZED_LABEL))
+
+    # หมวดที่จ่ายเยอะสุดขึ้นก่อน
+    expenses.sort(key=lambda item: item[0], reverse=True)
+    summary.category_labels = [name for _, name in expenses]
+    summary.category_expenses = [float(amount) for amount, _ in expenses]
+
+    summary.days = [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+    by_day = {
+        row['date']: row
+        for row in DailyRollup.objects.filter(user=user, date__range=(summary.days[0], today))
+        .values('date')
+        .annotate(**_income_expense_sums())
+        .order_by()
+    }
+    for day in summary.days:
+        row = by_day.get(day, {})
+        summary.daily_income.append(float(row.get('income') or 0))
+        summary.daily_expense.append(float(row.get('expense') or 0))
+
+    return summary
+
+
+def build_budget_status(user, month, year):
+    # ตารางงบประมาณ vs ยอดใช้จริงของเดือนที่เลือกใน query เดียว:
+    # หมวดรายจ่ายที่ user เห็น + subquery งบของเดือนนั้น + subquery ยอดใช้จาก rollup รายเดือน
+    money = DecimalField(max_digits=14, decimal_places=2)
+    budgets = Budget.objects.filter(user=user, category=OuterRef('pk'), month=month, year=year)
+    spent = (
+        MonthlyRollup.objects.filter(user=user, category=OuterRef('pk'), year=year, month=month)
+        .values('category')
+        .annotate(total=Sum('expense_total'))
+        .values('total')
+    )
+
+    categories = (
+        Category.objects.filter(Q(is_global=True) | Q(user=user), type='EXPENSE')
+        .annotate(
+            budget_id=Subquery(budgets.values('id')[:1]),
+            budget_limit=Coalesce(Subquery(budgets.values('amount_limit')[:1]), Value(Decimal('0')), output_field=money),
+            used=Coalesce(Subquery(spent), Value(Decimal('0')), output_field=money),
+        )
+        .order_by('name')
+    )
+
+    return [
+        BudgetStatus(category=cat, limit=cat.budget_limit, used=cat.used, budget_id=cat.budget_id)
+        for cat in categories
+    ]
+
+
+@dataclass
+class TransactionPage:
+    transactions: list
+    next_cursor: str = None
+    prev_cursor: str = None
+
+
+def encode_cursor(txn):
+    raw = f"{txn.date.isoformat()}|{txn.created_at.isoformat()}|{txn.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    # คืน None ถ้า cursor เสีย (ผู้ใช้แก้ URL เอง) จะได้กลับไปหน้าแรก
+    try:
+        day, created_at, txn_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return date.fromisoformat(day), datetime.fromisoformat(created_at), int(txn_id)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def filter_transactions(user, q=None, date_from=None, date_to=None, category=None, kind=None):
+    transactions = Transaction.objects.filter(user=user).select_related('category')
+    if q:
+        transactions = transactions.filter(description__icontains=q)
+    if date_from:
+        transactions = transactions.filter(date__gte=date_from)
+    if date_to:
+        transactions = transactions.filter(date__lte=date_to)
+    if category:
+        transactions = transactions.filter(category=category)
+    if kind == 'income':
+        transactions = transactions.filter(amount__gt=0)
+    elif kind == 'expense':
+        transactions = transactions.filter(amount__lt=0)
+    return transactions
+
+
+def page_transactions(transactions, after=None, before=None, page_size=TRANSACTION_PAGE_SIZE):
+    # ไล่หน้าแบบ keyset ตามลำดับ (-date, -created_at, -id): ใช้ index ค้นต่อจากแถวสุดท้ายของหน้าก่อน
+    # ไม่ใช้ OFFSET หน้าลึกแค่ไหนก็เร็วเท่าหน้าแรก
+    newest_first = ('-date', '-created_at', '-id')
+    oldest_first = ('date', 'created_at', 'id')
+
+    key = decode_cursor(before) if before else None
+    if key:
+        day, created_at, txn_id = key
+        newer = (Q(date__gt=day)
+                 | Q(date=day, created_at__gt=created_at)
+                 | Q(date=day, created_at=created_at, id__gt=txn_id))
+        rows = list(transactions.filter(newer).order_by(*oldest_first)[:page_size + 1])
+        has_prev = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+    else:
+        key = decode_cursor(after) if after else None
+        if key:
+            day, created_at, txn_id = key
+            older = (Q(date__lt=day)
+                     | Q(date=day, created_at__lt=created_at)
+                     | Q(date=day, created_at=created_at, id__lt=txn_id))
+            transactions = transactions.filter(older)
+        rows = list(transactions.order_by(*newest_first)[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_prev = key is not None
+
+    return TransactionPage(
+        transactions=rows,
+        next_cursor=encode_cursor(rows[-1]) if rows and has_next else None,
+        prev_cursor=encode_cursor(rows[0]) if rows and has_prev else None,
+    )
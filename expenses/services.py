@@ -1,39 +1,730 @@
-import pandas as pd
-import joblib
 import os
-from sklearn.feature_extraction.text import CountVectorizer
-# เปลี่ยนจาก Naive Bayes เป็น LinearSVC (ฉลาดกว่าในเคสนี้)
-from sklearn.svm import LinearSVC
-from sklearn.calibration import CalibratedClassifierCV
-from sklearn.pipeline import make_pipeline
-from pythainlp.tokenize import word_tokenize
+import random
+import shutil
+import threading
+import time
+import uuid
+# pandas / joblib / scikit-learn / pythainlp import ในฟังก์ชันที่ใช้จริง
+# module นี้ถูก import ตอนโหลด urls ทุกคำสั่ง manage.py และการ boot worker จะได้ไม่ต้องรอ
 from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
 from .models import TrainingData, Category
+from .utils import LRUCache, normalize_text, tokenize_newmm
 
 MODEL_PATH = os.path.join(settings.BASE_DIR, 'ml_models', 'category_classifier.pkl')
+ONLINE_MODEL_PATH = os.path.join(settings.BASE_DIR, 'ml_models', 'category_classifier_online.pkl')
 
 if not os.path.exists(os.path.dirname(MODEL_PATH)):
     os.makedirs(os.path.dirname(MODEL_PATH))
 
-class CategoryClassifier:
+RETRAIN_DEBOUNCE_SECONDS = getattr(settings, 'AI_RETRAIN_DEBOUNCE_SECONDS', 5)
+RETRAIN_MAX_PENDING = getattr(settings, 'AI_RETRAIN_MAX_PENDING', 20)
+
+# 'batch' = LinearSVC train ใหม่ทั้งก้อน, 'online' = เรียนรู้ทีละตัวอย่างด้วย partial_fit
+LEARNING_MODE = getattr(settings, 'AI_LEARNING_MODE', 'batch')
+ONLINE_N_FEATURES = getattr(settings, 'AI_ONLINE_N_FEATURES', 2 ** 16)
+ONLINE_REBUILD_EPOCHS = getattr(settings, 'AI_ONLINE_REBUILD_EPOCHS', 5)
+ONLINE_REBUILD_CHUNK_SIZE = 5000
+
+
+# จำนวนไฟล์โมเดลรุ่นเก่าที่เก็บไว้ (เผื่อ worker อื่นกำลังโหลดรุ่นก่อนหน้าอยู่)
+MODEL_KEEP_VERSIONS = getattr(settings, 'AI_MODEL_KEEP_VERSIONS', 3)
+# เขียนโมเดล batch เป็นรูปแบบ compact (numpy memmap) คู่กับ .pkl และให้ worker โหลดตัว compact
+COMPACT_MODEL = getattr(settings, 'AI_COMPACT_MODEL', True)
+# คอมไพล์ Pipeline ที่โหลดจาก .pkl (เช่นรุ่น legacy) เป็นทางทำนายแบบ NumPy ล้วน
+FAST_INFERENCE = getattr(settings, 'AI_FAST_INFERENCE', True)
+
+# 'newmm' = ตัดคำไทยด้วยพจนานุกรม (pythainlp) + CountVectorizer
+# 'char'  = n-gram ตัวอักษร + HashingVectorizer ไม่ต้องตัดคำ (เร็วกว่า และทนชื่อร้านไทยปนอังกฤษ เช่น "7-Eleven")
+FEATURIZER = getattr(settings, 'AI_FEATURIZER', 'newmm')
+CHAR_NGRAM_RANGE = getattr(settings, 'AI_CHAR_NGRAM_RANGE', (2, 4))
+CHAR_N_FEATURES = getattr(settings, 'AI_CHAR_N_FEATURES', 2 ** 18)
+
+TOKEN_CACHE_SIZE = getattr(settings, 'AI_TOKEN_CACHE_SIZE', 50000)
+# จำนวน process ตอน Re-train (ตัดคำ corpus + fit calibration fold พร้อมกัน) 1 = ทำทุกขั้นใน process เดียว
+TRAIN_WORKERS = getattr(settings, 'AI_TRAIN_WORKERS', 1)
+# corpus ที่มีข้อความใหม่ไม่ถึงเท่านี้ ตัดคำใน process เดียวเร็วกว่าเปิด process pool (แต่ละ process ต้องโหลดพจนานุกรมเอง)
+PARALLEL_TOKENIZE_MIN_TEXTS = 2000
+
+# โมเดลส่วนตัวต่อ user (เรียนเฉพาะคำที่ user คนนั้นสอนเอง) ผสมกับโมเดลกลางที่เรียนจากข้อมูลกลางของ Admin
+USER_MODELS = getattr(settings, 'AI_USER_MODELS', True)
+USER_MODEL_DIR = getattr(settings, 'AI_USER_MODEL_DIR', os.path.join(settings.BASE_DIR, 'ml_models', 'users'))
+USER_MODEL_POOL_SIZE = getattr(settings, 'AI_USER_MODEL_POOL_SIZE', 200)
+USER_MODEL_WEIGHT = getattr(settings, 'AI_USER_MODEL_WEIGHT', 0.6)
+USER_MODEL_MIN_SAMPLES = 2
+
+# ผลทำนายของโมเดล (รุ่น, ข้อความที่ normalize แล้ว) -> (category_id, ความมั่นใจ)
+PREDICTION_CACHE_SIZE = getattr(settings, 'AI_PREDICTION_CACHE_SIZE', 20000)
+TOKEN_STORE_PATH = getattr(settings, 'AI_TOKEN_STORE_PATH', None)
+
+# ตัดคำ newmm แพงที่สุดต่อข้อความ และรายการจริงซ้ำกันบ่อยมาก ("ค่ากาแฟ", "7-Eleven")
+# cache นี้ใช้ร่วมกันทั้งตอน train และตอนทำนาย
+token_cache = LRUCache(TOKEN_CACHE_SIZE)
+
+
+def thai_tokenizer(text):
+    # ต้องเป็นฟังก์ชันระดับ module เพื่อให้ pickle โมเดลได้โดยไม่ลาก CategoryClassifier (ที่มี Lock/Thread) ไปด้วย
+    tokens = token_cache.get(text)
+    if tokens is None:
+        from pythainlp.tokenize import word_tokenize
+        tokens = tuple(word_tokenize(text, engine="newmm"))
+        token_cache.set(text, tokens)
+    return list(tokens)
+
+
+def char_ngrams(text, ngram_range=CHAR_NGRAM_RANGE):
+    # n-gram ตัวอักษรภายในแต่ละคำ (เติมช่องว่างหัวท้ายคำ ให้รู้ว่าอยู่ต้น/ท้ายคำ) ใช้เป็น analyzer ของ HashingVectorizer
+    # ต้องเป็นฟังก์ชันระดับ module เหมือน thai_tokenizer (pickle / compact format อ้างถึงด้วยชื่อ)
+    min_n, max_n = ngram_range
+    grams = []
+    for word in normalize_text(text).split(' '):
+        word = f" {word} "
+        for n in range(min_n, max_n + 1):
+            grams.extend(word[i:i + n] for i in range(max(len(word) - n + 1, 1)))
+    return grams
+
+
+def build_vectorizer(featurizer=FEATURIZER):
+    from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+    if featurizer == 'char':
+        return HashingVectorizer(analyzer=char_ngrams, n_features=CHAR_N_FEATURES, alternate_sign=False)
+    if featurizer != 'newmm':
+        raise ValueError(f"AI_FEATURIZER ไม่รู้จัก: {featurizer!r} (ใช้ 'newmm' หรือ 'char')")
+    return CountVectorizer(tokenizer=thai_tokenizer, token_pattern=None)
+
+
+def build_pipeline(featurizer=FEATURIZER, n_jobs=None):
+    # Pipeline ที่ยังไม่ได้ train (ใช้ทั้งตอน Re-train และใน benchmark_featurizer)
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.pipeline import make_pipeline
+    # เปลี่ยนจาก Naive Bayes เป็น LinearSVC (ฉลาดกว่าในเคสนี้)
+    from sklearn.svm import LinearSVC
+
+    # 🔥 เปลี่ยนโมเดล: ใช้ LinearSVC (ฉลาดและแม่นยำกว่าสำหรับ Text สั้นๆ)
+    # ใช้ CalibratedClassifierCV ครอบเพื่อให้มันบอก % ความมั่นใจได้ (ปกติ SVM บอกไม่ได้)
+    svm = LinearSVC(class_weight='balanced', random_state=42) # class_weight='balanced' ช่วยแก้เรื่องข้อมูลน้อย
+    # n_jobs > 1: fit แต่ละ fold พร้อมกันหลาย process (ผลเหมือนทีละ fold เพราะ LinearSVC ตั้ง random_state ไว้)
+    clf = CalibratedClassifierCV(svm, n_jobs=n_jobs) 
+    return make_pipeline(build_vectorizer(featurizer), clf)
+
+
+def pretokenize(texts, workers=TRAIN_WORKERS):
+    # ตัดคำทั้ง corpus ไว้ใน token_cache ก่อน fit (workers > 1 = แบ่งก้อนให้ process pool ตัดพร้อมกัน)
+    # CountVectorizer จะเจอผลใน cache ทุกข้อความ โทเคนชุดเดียวกับตัดทีละข้อความ โมเดลที่ได้จึงเหมือนเดิมทุกประการ
+    # (corpus ที่ใหญ่กว่า AI_TOKEN_CACHE_SIZE ข้อความที่ถูกไล่ออกจาก cache จะถูกตัดซ้ำตอน fit)
+    # CountVectorizer แปลงเป็นตัวพิมพ์เล็กก่อนส่งให้ tokenizer key ใน cache จึงเป็นตัวพิมพ์เล็ก
+    missing = [text for text in dict.fromkeys(str(text).lower() for text in texts) if text not in token_cache]
+    if workers <= 1 or len(missing) < PARALLEL_TOKENIZE_MIN_TEXTS:
+        for text in missing:
+            thai_tokenizer(text)
+        return len(missing)
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    chunk_size = -(-len(missing) // (workers * 4))
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+    # spawn ไม่ใช่ fork: process เว็บมี thread (คิว Re-train / warmup) ที่อาจถือ lock ค้างอยู่ตอน fork
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for chunk, tokens in zip(chunks, pool.map(tokenize_newmm, chunks)):
+            token_cache.update(zip(chunk, tokens))
+    return len(missing)
+
+
+def load_token_store(path=TOKEN_STORE_PATH):
+    # โหลดผลตัดคำที่เคยเก็บไว้ train หลัง restart จะได้ไม่ต้องตัดคำใหม่ทั้งหมด
+    if not path or not os.path.exists(path):
+        return
+    import joblib
+    try:
+        token_cache.update(joblib.load(path).items())
+    except Exception as e:
+        print(f"⚠️ [AI] Cannot load token store: {e}")
+
+
+def save_token_store(path=TOKEN_STORE_PATH):
+    if not path:
+        return
+    import joblib
+    # เขียนไฟล์ชั่วคราวแล้วค่อย rename ทับ คนอ่านจะไม่เจอไฟล์เขียนค้างครึ่งๆ
+    tmp_path = f"{path}.tmp"
+    joblib.dump(dict(token_cache.items()), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_atomic(path, write):
+    # เขียนไฟล์ชั่วคราว (ชื่อไม่ซ้ำกันข้าม process) แล้วค่อย rename ทับ คนอ่านจะไม่เจอไฟล์เขียนค้างครึ่งๆ
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ModelStore:
+    # เก็บโมเดลเป็นไฟล์แยกตามรุ่น (<name>-<version>.pkl) และไฟล์ชี้รุ่นปัจจุบัน (<name>.current)
+    # ทุก worker stat ไฟล์ชี้รุ่นก่อนทำนาย ถ้าเปลี่ยนก็โหลดรุ่นใหม่เอง ไม่ต้อง restart
+    def __init__(self, legacy_path, keep=MODEL_KEEP_VERSIONS):
+        self.legacy_path = legacy_path
+        self.directory, filename = os.path.split(legacy_path)
+        self.name = os.path.splitext(filename)[0]
+        self.pointer_path = os.path.join(self.directory, f"{self.name}.current")
+        self.keep = keep
+        self._pointer_mtime = None
+
+    def path_for(self, version):
+        return os.path.join(self.directory, f"{self.name}-{version}.pkl")
+
+    def compact_path_for(self, version):
+        return os.path.join(self.directory, f"{self.name}-{version}.compact")
+
+    def versions(self):
+        prefix = f"{self.name}-"
+        return sorted(
+            filename[len(prefix):-len('.pkl')]
+            for filename in os.listdir(self.directory)
+            if filename.startswith(prefix) and filename.endswith('.pkl')
+        )
+
+    def publish(self, model):
+        import joblib
+        # เรียงตามเวลาได้ (ละเอียดถึง µs) + suffix สุ่มกันชนกันข้าม process
+        version = f"{time.strftime('%Y%m%d%H%M%S')}{time.time_ns() // 1000 % 1000000:06d}-{uuid.uuid4().hex[:6]}"
+        write_atomic(self.path_for(version), lambda path: joblib.dump(model, path))
+        if COMPACT_MODEL and hasattr(model, 'steps'):
+            from .compact import export_compact
+            try:
+                export_compact(model, self.compact_path_for(version))
+            except ValueError as e:
+                print(f"⚠️ [AI] Skip compact export: {e}")
+
+        def write_pointer(path):
+            with open(path, 'w') as f:
+                f.write(version)
+        write_atomic(self.pointer_path, write_pointer)
+        self.changed()  # รุ่นที่ตัวเองเพิ่งเขียน ไม่ต้องโหลดซ้ำ
+        self.prune(version)
+        return version
+
+    def current_version(self):
+        try:
+            with open(self.pointer_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def changed(self):
+        # เช็คถูกมาก (stat ครั้งเดียว) ใช้ก่อนทำนายทุกครั้ง
+        try:
+            mtime = os.stat(self.pointer_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._pointer_mtime:
+            return False
+        self._pointer_mtime = mtime
+        return True
+
+    def forget(self):
+        # โหลดรุ่นล่าสุดไม่สำเร็จ ให้ลองใหม่ในการทำนายครั้งถัดไป
+        self._pointer_mtime = None
+
+    def load(self, version=None):
+        # คืน (version, model) ถ้ายังไม่เคยมีไฟล์รุ่นใหม่ ใช้ไฟล์ .pkl เดิม (version = 'legacy')
+        import joblib
+        version = version or self.current_version()
+        if version:
+            compact_path = self.compact_path_for(version)
+            if COMPACT_MODEL and os.path.isdir(compact_path):
+                from .compact import CompactModel
+                return version, CompactModel.load(compact_path)
+            return version, joblib.load(self.path_for(version))
+        if os.path.exists(self.legacy_path):
+            return 'legacy', joblib.load(self.legacy_path)
+        return None, None
+
+    def prune(self, current):
+        for version in self.versions()[:-self.keep]:
+            if version != current:
+                try:
+                    os.remove(self.path_for(version))
+                except FileNotFoundError:
+                    pass
+                shutil.rmtree(self.compact_path_for(version), ignore_errors=True)
+
+
+class RetrainScheduler:
+    # คิว Re-train เบื้องหลัง: รวบการสอนหลายๆ ครั้งให้เหลือการ train แค่รอบเดียว
+    # จะ train เมื่อไม่มีการสอนใหม่เข้ามาครบ debounce_seconds หรือมีตัวอย่างค้างถึง max_pending
+    def __init__(self, callback, debounce_seconds=RETRAIN_DEBOUNCE_SECONDS, max_pending=RETRAIN_MAX_PENDING):
+        self.callback = callback
+        self.debounce_seconds = debounce_seconds
+        self.max_pending = max_pending
+        self.runs = 0
+        self._pending = 0
+        self._last_change = 0.0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def mark_dirty(self, count=1):
+        with self._cond:
+            self._pending += count
+            self._last_change = time.monotonic()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='ai-retrain', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _wait_for_batch(self):
+        with self._cond:
+            while self._pending == 0:
+                self._cond.wait()
+            while self._pending < self.max_pending:
+                remaining = self._last_change + self.debounce_seconds - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            pending = self._pending
+            self._pending = 0
+            return pending
+
+    def _run(self):
+        while True:
+            pending = self._wait_for_batch()
+            try:
+                print(f"🔁 [AI] Background re-train ({pending} new samples)")
+                self.callback()
+                self.runs += 1
+            except Exception as e:
+                print(f"❌ [AI] Background re-train failed: {e}")
+            finally:
+                # thread นี้เปิด connection ของตัวเอง ต้องปิดเองไม่งั้นค้าง
+                connection.close()
+
+
+class OnlineCategoryModel:
+    # โมเดลแบบเรียนรู้ต่อเนื่อง: HashingVectorizer (ไม่มี vocabulary ให้ต้อง fit ใหม่) + SGDClassifier
+    # สอนเพิ่มทีละตัวอย่างด้วย partial_fit ได้เลย ค่าใช้จ่ายไม่โตตามจำนวน TrainingData
+    # มี predict / predict_proba / classes_ หน้าตาเดียวกับ sklearn Pipeline เพื่อใช้แทนกันได้
+    def __init__(self, classes, n_features=ONLINE_N_FEATURES, featurizer=FEATURIZER):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.linear_model import SGDClassifier
+
+        if featurizer == 'char':
+            self.vectorizer = HashingVectorizer(analyzer=char_ngrams, n_features=n_features, alternate_sign=False)
+        else:
+            self.vectorizer = HashingVectorizer(
+                tokenizer=thai_tokenizer,
+                token_pattern=None,
+                n_features=n_features,
+                alternate_sign=False
+            )
+        self.clf = SGDClassifier(loss='log_loss', random_state=42)
+        # SGD ต้องรู้จักทุกหมวดตั้งแต่ partial_fit ครั้งแรก
+        self.classes = sorted(set(classes))
+        self.samples_seen = 0
+
+    @property
+    def classes_(self):
+        return self.clf.classes_
+
+    def knows(self, label):
+        return label in self.classes
+
+    def partial_fit(self, texts, labels):
+        X = self.vectorizer.transform(texts)
+        self.clf.partial_fit(X, list(labels), classes=self.classes)
+        self.samples_seen += len(labels)
+
+    def predict(self, texts):
+        return self.clf.predict(self.vectorizer.transform(texts))
+
+    def predict_proba(self, texts):
+        return self.clf.predict_proba(self.vectorizer.transform(texts))
+
+
+class UserDeltaModel:
+    # โมเดลส่วนตัวของ user หนึ่งคน: Naive Bayes บนคำที่ user คนนั้นสอนเอง (ไม่กี่สิบ-ร้อยแถว train ไม่ถึงวินาที)
+    # ใช้คำศัพท์เฉพาะของ user (ไม่ใช้ hashing) ไฟล์ต่อคนจึงเล็ก
+    def __init__(self, featurizer=FEATURIZER):
+        from sklearn.feature_extraction.text import CountVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+
+        if featurizer == 'char':
+            self.vectorizer = CountVectorizer(analyzer=char_ngrams)
+        else:
+            self.vectorizer = CountVectorizer(tokenizer=thai_tokenizer, token_pattern=None)
+        self.clf = MultinomialNB(alpha=0.5)
+        self.samples = 0
+
+    @property
+    def classes_(self):
+        return self.clf.classes_
+
+    def fit(self, texts, labels):
+        self.clf.fit(self.vectorizer.fit_transform(texts), list(labels))
+        self.samples = len(labels)
+        return self
+
+    def predict_proba(self, texts):
+        # คืน (ความน่าจะเป็น, ข้อความไหนมีคำที่ user เคยสอนบ้าง)
+        # ข้อความที่ไม่มีคำของ user เลย Naive Bayes ตอบได้แค่ prior ของหมวด ไม่ควรเอาไปผสม
+        X = self.vectorizer.transform(texts)
+        return self.clf.predict_proba(X), X.getnnz(axis=1) > 0
+
+
+class UserModelPool:
+    # โมเดลส่วนตัวเก็บเป็นไฟล์ <USER_MODEL_DIR>/<user_id>.pkl ตัวที่ใช้บ่อยถือไว้ใน LRU (ไล่ตัวที่ไม่ได้ใช้นานที่สุดออก)
+    # โหลดจากไฟล์ตอนใช้ครั้งแรก และ stat ไฟล์ทุกครั้ง ถ้า worker อื่น train ใหม่ก็โหลดรุ่นใหม่เอง
+    # ค่าใช้จ่ายต่อการทำนาย = stat 1 ครั้ง + dict lookup ไม่โตตามจำนวน user
+    def __init__(self, directory=USER_MODEL_DIR, maxsize=USER_MODEL_POOL_SIZE):
+        self.directory = directory
+        self.loads = 0
+        self._models = LRUCache(maxsize)
+
+    def path_for(self, user_id):
+        return os.path.join(self.directory, f"{int(user_id)}.pkl")
+
+    def get(self, user_id):
+        # คืน (stamp, model) stamp = mtime ของไฟล์ ใช้เป็นส่วนหนึ่งของ key cache ผลทำนาย / ไม่มีไฟล์ = (None, None)
+        # user ที่คำยังน้อยเกินจะ train ได้ ไฟล์เก็บ None ไว้ (ได้ stamp แต่ไม่มีโมเดล)
+        path = self.path_for(user_id)
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None, None
+        entry = self._models.get(user_id)
+        if entry is not None and entry[0] == stamp:
+            return entry
+        import joblib
+        try:
+            entry = (stamp, joblib.load(path))
+        except Exception as e:
+            print(f"⚠️ [AI] Cannot load user model {user_id}: {e}")
+            return None, None
+        self._models.set(user_id, entry)
+        self.loads += 1
+        return entry
+
+    def save(self, user_id, model):
+        import joblib
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(user_id)
+        write_atomic(path, lambda tmp_path: joblib.dump(model, tmp_path))
+        self._models.set(user_id, (os.stat(path).st_mtime_ns, model))
+
+    def stats(self):
+        stats = self._models.stats()
+        stats['loads'] = self.loads
+        return stats
+
+
+class ExactMatchIndex:
+    # "โพย" ใน memory: ข้อความที่ normalize แล้ว -> category_id แยกเป็นข้อมูลกลาง (Admin นำเข้า) กับของแต่ละ user
+    # ถ้าสอนคำเดิมหลายครั้ง ตัวล่าสุดชนะ
     def __init__(self):
+        self.loaded = False
+        self._shared = {}
+        self._users = {}
+        # stamp ของไฟล์โมเดลส่วนตัวตอนที่โหลดคำของ user คนนั้นล่าสุด (ดู sync_user)
+        self._user_stamps = {}
+
+    def __len__(self):
+        return len(self._shared) + sum(len(entries) for entries in self._users.values())
+
+    def load(self):
+        shared, users = {}, {}
+        rows = TrainingData.objects.order_by('created_at', 'id').values_list('user_id', 'text', 'category_id')
+        for user_id, text, category_id in rows.iterator(chunk_size=5000):
+            entries = shared if user_id is None else users.setdefault(user_id, {})
+            entries[normalize_text(text)] = category_id
+        # สร้าง dict ใหม่เสร็จค่อยสลับเข้าไป คนที่กำลัง lookup อยู่ไม่เห็นของครึ่งๆ
+        self._shared, self._users, self._user_stamps = shared, users, {}
+        self.loaded = True
+
+    def load_user(self, user_id):
+        entries = {}
+        rows = TrainingData.objects.filter(user_id=user_id).order_by('created_at', 'id').values_list('text', 'category_id')
+        for text, category_id in rows:
+            entries[normalize_text(text)] = category_id
+        self._users[user_id] = entries
+
+    def sync_user(self, user_id, stamp):
+        # worker อื่นสอนคำให้ user นี้: โมเดลกลางไม่เปลี่ยนรุ่น แต่ไฟล์โมเดลส่วนตัวถูกเขียนใหม่ (stamp เปลี่ยน)
+        # โหลดเฉพาะคำของ user คนนี้ใหม่ 1 query ไม่ต้องโหลดโพยทั้งก้อน
+        if user_id in self._user_stamps and self._user_stamps[user_id] == stamp:
+            return False
+        self.load_user(user_id)
+        self._user_stamps[user_id] = stamp
+        return True
+
+    def add(self, text, category_id, user_id=None):
+        entries = self._shared if user_id is None else self._users.setdefault(user_id, {})
+        entries[normalize_text(text)] = category_id
+
+    def lookup(self, text, user_id=None):
+        # ดูคำที่ user คนนี้สอนเองก่อน แล้วค่อยดูข้อมูลกลาง
+        key = normalize_text(text)
+        if user_id is not None:
+            category_id = self._users.get(user_id, {}).get(key)
+            if category_id:
+                return category_id
+        return self._shared.get(key)
+
+
+class CategoryClassifier:
+    def __init__(self, mode=LEARNING_MODE):
         self.model = None
+        self.version = None
+        self.mode = mode
+        self.model_path = ONLINE_MODEL_PATH if mode == 'online' else MODEL_PATH
+        self.store = ModelStore(self.model_path)
+        self._needs_rebuild = False
+        # RLock: เซฟ / สอนเพิ่มในโหมด online ต้องโหลดรุ่นล่าสุดก่อน (reload_if_changed) ขณะถือ lock อยู่แล้ว
+        self._train_lock = threading.RLock()
+        # โหมด online: ตัวอย่างที่ partial_fit ไปแล้วแต่ยังไม่ได้เซฟ ถ้า worker อื่นเซฟรุ่นใหม่มาก่อน
+        # จะ partial_fit ซ้ำบนรุ่นนั้น ไม่ให้การสอนของ worker ไหนหายไปเพราะใครเซฟทีหลังชนะ
+        self._online_samples = []
+        self.scheduler = RetrainScheduler(self._refresh_model)
+        self.user_models = UserModelPool()
+        # user ที่สอนคำใหม่ รอ train โมเดลส่วนตัวใหม่ในคิวเบื้องหลัง (แยกจากคิวของโมเดลกลาง)
+        self._dirty_users = set()
+        self._dirty_users_lock = threading.Lock()
+        self.user_scheduler = RetrainScheduler(self._refresh_user_models)
+        self.exact_matches = ExactMatchIndex()
+        # รายการที่พิมพ์ซ้ำทุกวันไม่ต้องตัดคำ / คำนวณโมเดลใหม่ ล้างทิ้งเมื่อโมเดลเปลี่ยน
+        self.prediction_cache = LRUCache(PREDICTION_CACHE_SIZE)
+        # เวลาแต่ละขั้นของการ Re-train รอบล่าสุด (วินาที)
+        self.last_train = None
+        load_token_store()
         self.load_model()
 
     def load_model(self):
-        if os.path.exists(MODEL_PATH):
-            try:
-                self.model = joblib.load(MODEL_PATH)
-            except:
-                self.train_model()
-        else:
+        try:
+            self.exact_matches.load()
+        except DatabaseError:
+            # ตารางยังไม่ถูกสร้าง (เช่นตอน migrate ครั้งแรก) ไว้โหลดตอนทำนายครั้งแรกแทน
+            pass
+
+        self.store.changed()
+        try:
+            self.version, model = self.store.load()
+            self.model = self._compile(model)
+        except Exception as e:
+            # ไฟล์เสีย (ไม่ใช่เขียนค้าง เพราะเขียนแบบ rename ทับ) ค่อย train ใหม่
+            print(f"⚠️ [AI] Cannot load model: {e}")
+        if self.model is None:
             self.train_model()
 
+        # อัปเกรดมาจากรุ่นที่ยังไม่มีโมเดลส่วนตัว: คำที่ user สอนไว้ต้องมีโมเดลรองรับโดยไม่ต้องรอ Admin กด Re-train
+        try:
+            self.schedule_user_models(missing_only=True)
+        except DatabaseError:
+            pass
+
+    def reload_if_changed(self):
+        # worker อื่น train / เซฟโมเดลรุ่นใหม่ไว้ สลับมาใช้รุ่นนั้น (พร้อมโหลดโพยใหม่ด้วย)
+        if not self.store.changed():
+            return False
+        version = self.store.current_version()
+        if version is None or version == self.version:
+            return False
+        if self.mode == 'online':
+            with self._train_lock:
+                return self._swap_model(version)
+        return self._swap_model(version)
+
+    def _swap_model(self, version):
+        try:
+            version, model = self.store.load(version)
+        except Exception as e:
+            print(f"⚠️ [AI] Cannot load model {version}: {e}")
+            self.store.forget()
+            return False
+        if self.mode == 'online':
+            self._replay_online(model)
+        self.model = self._compile(model)
+        self.version = version
+        self.prediction_cache.clear()
+        self.exact_matches.load()
+        print(f"🔄 [AI] Reloaded model {version}")
+        return True
+
+    def _publish(self, model):
+        self.model = model
+        self.version = self.store.publish(model)
+        self.prediction_cache.clear()
+        if self.mode != 'online' and COMPACT_MODEL:
+            # สลับไปใช้ตัว compact (memmap) เหมือน worker อื่น ไม่ต้องถือ Pipeline ไว้ทั้งก้อน
+            self.model = self.store.load(self.version)[1]
+        elif self.mode != 'online':
+            self.model = self._compile(model)
+
+    def _compile(self, model):
+        # Pipeline ของ sklearn -> CompactModel ใน memory (น้ำหนักซ้อนกันทุก fold, ไม่ผ่าน dispatch ของ sklearn)
+        if not FAST_INFERENCE or not hasattr(model, 'steps'):
+            return model
+        from .compact import CompactModel
+        try:
+            return CompactModel.from_pipeline(model)
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️ [AI] Fast inference unavailable: {e}")
+            return model
+
     def thai_tokenizer(self, text):
-        return word_tokenize(text, engine="newmm")
+        # เก็บไว้ให้ไฟล์ .pkl รุ่นเก่าที่อ้างถึง method นี้ยังโหลดได้
+        return thai_tokenizer(text)
 
     def train_model(self):
-        data = TrainingData.objects.all().values('text', 'category__name')
+        # กันไม่ให้ train ซ้อนกัน (ปุ่ม Re-train กับคิวเบื้องหลังอาจมาพร้อมกัน)
+        with self._train_lock:
+            self._train_model()
+
+    def _refresh_model(self):
+        # เรียกจากคิวเบื้องหลัง: โหมด online แค่เซฟโมเดลที่เรียนรู้เพิ่มแล้วลงไฟล์
+        # ส่วนโหมด batch (หรือเจอหมวดใหม่ที่โมเดล online ไม่รู้จัก) ต้อง train ใหม่ทั้งหมด
+        if self.mode == 'online' and not self._needs_rebuild:
+            self.save_model()
+        else:
+            self.train_model()
+
+    def save_model(self):
+        with self._train_lock:
+            # worker อื่นเซฟรุ่นใหม่ไว้ระหว่างนี้ โหลดมาแล้วเติมตัวอย่างของเราก่อนเซฟทับ
+            self.reload_if_changed()
+            if self._needs_rebuild:
+                # รุ่นนั้นไม่รู้จักหมวดบางหมวดที่เราสอนไป เติมต่อไม่ได้ สร้างใหม่จาก DB ทั้งหมดแทน
+                self._train_model()
+                return
+            if self.model is not None:
+                self._publish(self.model)
+            self._online_samples = []
+
+    def _replay_online(self, model):
+        if not self._online_samples:
+            return
+        if not isinstance(model, OnlineCategoryModel):
+            self._needs_rebuild = True
+            return
+        known = [(text, label) for text, label in self._online_samples if model.knows(label)]
+        if len(known) < len(self._online_samples):
+            self._needs_rebuild = True
+        if known:
+            model.partial_fit([text for text, _ in known], [label for _, label in known])
+
+    def _train_model(self):
+        # train จาก DB ทั้งหมด ตัวอย่างที่ค้างไว้รวมอยู่ในนั้นแล้ว
+        self._online_samples = []
+        if self.mode == 'online':
+            self._rebuild_online()
+        else:
+            self._fit_batch()
+        self.exact_matches.load()
+        save_token_store()
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'featurizer': FEATURIZER,
+            'model_version': self.version,
+            'pending_samples': self.scheduler.pending,
+            'background_runs': self.scheduler.runs,
+            'token_cache': token_cache.stats(),
+            'prediction_cache': self.prediction_cache.stats(),
+            'user_models': self.user_models.stats() if USER_MODELS else None,
+            'exact_matches': len(self.exact_matches),
+            'last_train': self.last_train,
+        }
+
+    def _training_rows(self):
+        # โมเดลกลางเรียนจากข้อมูลกลาง (user = None) คำที่แต่ละ user สอนไปอยู่ในโมเดลส่วนตัวของคนนั้นแทน
+        # คำที่ user หนึ่งสอนจึงไม่ไปเปลี่ยนผลทำนายของคนอื่น
+        if USER_MODELS:
+            return TrainingData.objects.filter(user__isnull=True)
+        return TrainingData.objects.all()
+
+    def train_user_model(self, user_id):
+        # label เป็น category_id ไม่ใช่ชื่อ: หมวดส่วนตัวชื่อซ้ำกันได้ระหว่าง user ชื่ออย่างเดียวแยกไม่ออกว่าเป็นของใคร
+        rows = list(TrainingData.objects.filter(user_id=user_id).values_list('text', 'category_id'))
+        if len(rows) < USER_MODEL_MIN_SAMPLES:
+            # ยังเขียนไฟล์ (โมเดล = None) ไว้ให้ stamp เปลี่ยน worker อื่นจะได้รู้ว่าต้องโหลดโพยของ user นี้ใหม่
+            self.user_models.save(user_id, None)
+            return None
+        model = UserDeltaModel().fit([text for text, _ in rows], [label for _, label in rows])
+        self.user_models.save(user_id, model)
+        return model
+
+    def schedule_user_models(self, missing_only=False):
+        # ส่ง user ทุกคนที่มีคำของตัวเองเข้าคิว train โมเดลส่วนตัวเบื้องหลัง (ปุ่ม Re-train / หลังเปลี่ยน featurizer)
+        # missing_only = เฉพาะคนที่ยังไม่มีไฟล์โมเดล (ตอนโหลด: คำที่ user สอนไว้ก่อนเปิด AI_USER_MODELS ไม่อยู่ในโมเดลกลางแล้ว)
+        # คืนจำนวน user ไม่รอให้ train เสร็จ
+        if not USER_MODELS:
+            return 0
+        user_ids = set(TrainingData.objects.filter(user__isnull=False).values_list('user_id', flat=True).distinct())
+        if missing_only:
+            user_ids = {user_id for user_id in user_ids if not os.path.exists(self.user_models.path_for(user_id))}
+        if user_ids:
+            with self._dirty_users_lock:
+                self._dirty_users |= user_ids
+            self.user_scheduler.mark_dirty(len(user_ids))
+        return len(user_ids)
+
+    def _refresh_user_models(self):
+        with self._dirty_users_lock:
+            user_ids = self._dirty_users
+            self._dirty_users = set()
+        for user_id in user_ids:
+            self.train_user_model(user_id)
+
+    def _rebuild_online(self):
+        # สร้างโมเดล online ใหม่จาก TrainingData ทั้งหมด (ทำเฉพาะตอนสั่ง Re-train หรือเจอหมวดใหม่)
+        # อ่านทีละก้อนด้วย iterator หน่วยความจำไม่โตตามขนาด corpus
+        self._needs_rebuild = False
+        classes = self._training_rows().values_list('category__name', flat=True).distinct()
+        model = OnlineCategoryModel(classes)
+        if not model.classes:
+            self.model = None
+            return
+
+        rng = random.Random(42)
+        for _ in range(ONLINE_REBUILD_EPOCHS):
+            rows = self._training_rows().order_by('id').values_list('text', 'category__name')
+            chunk = []
+            for row in rows.iterator(chunk_size=ONLINE_REBUILD_CHUNK_SIZE):
+                chunk.append(row)
+                if len(chunk) >= ONLINE_REBUILD_CHUNK_SIZE:
+                    self._partial_fit_chunk(model, chunk, rng)
+                    chunk = []
+            if chunk:
+                self._partial_fit_chunk(model, chunk, rng)
+
+        self._publish(model)
+        print(f"✅ Model Re-built Successfully (Online SGD, {model.samples_seen} samples)!")
+
+    def _partial_fit_chunk(self, model, chunk, rng):
+        # สลับลำดับในก้อน SGD จะได้ไม่เห็นหมวดเดียวกันติดๆ กัน
+        rng.shuffle(chunk)
+        model.partial_fit([text for text, _ in chunk], [label for _, label in chunk])
+
+    def _fit_batch(self):
+        import pandas as pd
+
+        timings = {}
+        phase_start = time.perf_counter()
+
+        def phase(name):
+            nonlocal phase_start
+            now = time.perf_counter()
+            timings[name] = round(now - phase_start, 3)
+            phase_start = now
+
+        data = self._training_rows().values('text', 'category__name')
         df = pd.DataFrame(list(data))
 
         if df.empty:
@@ -42,53 +733,281 @@ class CategoryClassifier:
 
         X = df['text']
         y = df['category__name']
+        phase('load')
 
-        # 🔥 เปลี่ยนโมเดล: ใช้ LinearSVC (ฉลาดและแม่นยำกว่าสำหรับ Text สั้นๆ)
-        # ใช้ CalibratedClassifierCV ครอบเพื่อให้มันบอก % ความมั่นใจได้ (ปกติ SVM บอกไม่ได้)
-        svm = LinearSVC(class_weight='balanced', random_state=42) # class_weight='balanced' ช่วยแก้เรื่องข้อมูลน้อย
-        clf = CalibratedClassifierCV(svm) 
+        if FEATURIZER == 'newmm':
+            pretokenize(X, TRAIN_WORKERS)
+        phase('tokenize')
 
-        self.model = make_pipeline(
-            CountVectorizer(tokenizer=self.thai_tokenizer),
-            clf
-        )
-        self.model.fit(X, y)
-        
-        joblib.dump(self.model, MODEL_PATH)
-        print("✅ Model Re-trained Successfully (Linear SVM)!")
-
-    def predict(self, text):
-        # 🌟 LOGIC ใหม่: เช็ค "โพย" (Training Data) ก่อนเสมอ!
-        # ถ้า User เคยสอนคำนี้เป๊ะๆ ให้ตอบเลย ไม่ต้องให้ AI เดา
-        exact_match = TrainingData.objects.filter(text__iexact=text).first()
-        if exact_match:
-            print(f"🎯 [AI] Exact Match Found in Training Data: {text} -> {exact_match.category.name}")
-            return exact_match.category, 1.0 # มั่นใจ 100%
-
-        # ถ้าไม่มีในโพย ค่อยให้ AI เดา
-        if not self.model:
-            return None, 0.0
+        # ทำทีละขั้นเหมือน Pipeline.fit แต่แยกออกมาเพื่อจับเวลาแต่ละขั้น
+        model = build_pipeline(n_jobs=TRAIN_WORKERS if TRAIN_WORKERS > 1 else None)
+        features = model[0].fit_transform(X)
+        phase('vectorize')
+        model[-1].fit(features, y)
+        phase('calibrate')
 
-        try:
-            cat_name = self.model.predict([text])[0]
-            prob = self.model.predict_proba([text]).max()
-            
-            print(f"🤖 [AI] SVM Guess: '{text}' -> '{cat_name}' ({prob:.2f})")
-
-            category_obj = Category.objects.filter(name__iexact=cat_name).first()
-            return category_obj, prob
-            
-        except Exception as e:
-            print(f"❌ [AI] Error: {e}")
-            return None, 0.0
+        # สลับโมเดลใหม่เข้าไปทีเดียว request ที่กำลังทำนายอยู่ยังใช้ตัวเก่าจนจบ
+        self._publish(model)
+        phase('publish')
+        self.last_train = {'samples': len(df), 'workers': TRAIN_WORKERS, **timings}
+        print(f"✅ Model Re-trained Successfully (Linear SVM, {FEATURIZER})! {self.last_train}")
+
+    def predict(self, text, user=None):
+        return self.predict_many([text], user=user)[0]
+
+    def predict_many(self, texts, user=None):
+        # ทำนายทีละหลายรายการ: เช็ค "โพย" จาก dict ใน memory แล้วส่งที่เหลือเข้าโมเดลรอบเดียว
+        # คืนค่าเป็น list ของ (Category, ความมั่นใจ) เรียงตาม texts
+        texts = list(texts)
+        results = [(None, 0.0)] * len(texts)
+        if not texts:
+            return results
+
+        self.reload_if_changed()
+        if not self.exact_matches.loaded:
+            self.exact_matches.load()
+        user_id = user.id if user is not None and user.is_authenticated else None
+
+        # โหลดเฉพาะหมวดที่ user คนนี้เห็น (หมวดกลาง + หมวดของตัวเอง) ครั้งเดียว ใช้ map ทั้ง id (จากโพย) และชื่อ (จากโมเดล)
+        # จำนวนแถวไม่โตตามจำนวน user และไม่มีทางได้หมวดส่วนตัวของคนอื่น
+        categories_by_id = {}
+        categories_by_name = {}
+        visible = Q(is_global=True) | Q(user_id=user_id) if user_id is not None else Q(is_global=True)
+        for cat in Category.objects.filter(visible).order_by('id'):
+            categories_by_id[cat.id] = cat
+            categories_by_name.setdefault(cat.name.lower(), cat)
+
+        def resolve(label):
+            # label จากโมเดล: ชื่อหมวด (โมเดลกลาง) หรือ category_id
+            if label is None:
+                return None
+            if isinstance(label, str):
+                return categories_by_name.get(label.lower())
+            return categories_by_id.get(label)
+
+        pending = []
+        cached = 0
+        # จับรุ่นกับโมเดลคู่กันไว้ก่อน ถ้ามีการสลับโมเดลกลางทาง ผลจะไม่ถูก cache ผิดรุ่น
+        version, model = self.version, self.model
+        user_stamp, user_model = None, None
+        if USER_MODELS and user_id is not None:
+            user_stamp, user_model = self.user_models.get(user_id)
+            self.exact_matches.sync_user(user_id, user_stamp)
+        # user ที่ไม่มีโมเดลส่วนตัวใช้ผลใน cache ร่วมกัน / มีโมเดลส่วนตัว แยก cache ตามรุ่นของโมเดลส่วนตัวด้วย
+        scope = (version, user_id, user_stamp) if user_model is not None else (version, None, None)
+        for i, text in enumerate(texts):
+            # 🌟 เช็ค "โพย" (Training Data) ก่อนเสมอ! ถ้าเคยสอนคำนี้เป๊ะๆ ให้ตอบเลย มั่นใจ 100%
+            category_id = self.exact_matches.lookup(text, user_id)
+            if category_id in categories_by_id:
+                results[i] = (categories_by_id[category_id], 1.0)
+                continue
+            # เคยให้โมเดลรุ่นนี้ทำนายข้อความนี้แล้ว ใช้ผลเดิม
+            hit = self.prediction_cache.get((scope, normalize_text(text)))
+            if hit is not None:
+                results[i] = (resolve(hit[0]), hit[1])
+                cached += 1
+            else:
+                pending.append(i)
+
+        # ถ้าไม่มีในโพย ค่อยให้ AI เดา (predict_proba ครั้งเดียวทั้งก้อน แล้วเลือกหมวดที่ความน่าจะเป็นสูงสุด)
+        if user_model is None and len(pending) == 1 and hasattr(model, 'predict_one'):
+            # ข้อความเดียว (หน้าแก้ไข / บันทึกทีละรายการ) ใช้ทางลัด dot product ครั้งเดียว
+            try:
+                cat_name, prob = model.predict_one(texts[pending[0]])
+                results[pending[0]] = (resolve(str(cat_name)), prob)
+                self._cache_prediction(scope, texts[pending[0]], str(cat_name), prob)
+            except Exception as e:
+                print(f"❌ [AI] Error: {e}")
+        elif pending and user_model is not None:
+            try:
+                blended = self._blend(model, user_model, [texts[i] for i in pending], resolve)
+                for i, (category_id, prob) in zip(pending, blended):
+                    results[i] = (resolve(category_id), prob)
+                    self._cache_prediction(scope, texts[i], category_id, prob)
+            except Exception as e:
+                print(f"❌ [AI] Error: {e}")
+        elif pending and model:
+            try:
+                proba = model.predict_proba([texts[i] for i in pending])
+                best = proba.argmax(axis=1)
+                for i, j, prob in zip(pending, best, proba.max(axis=1)):
+                    cat_name = str(model.classes_[j])
+                    results[i] = (resolve(cat_name), float(prob))
+                    self._cache_prediction(scope, texts[i], cat_name, float(prob))
+            except Exception as e:
+                print(f"❌ [AI] Error: {e}")
+
+        print(f"🤖 [AI] Predicted {len(texts)} texts ({len(texts) - len(pending) - cached} exact match, {cached} cached, {len(pending)} by model)")
+        return results
+
+    def _blend(self, model, user_model, texts, resolve):
+        # ผสมความน่าจะเป็นของโมเดลกลางกับโมเดลส่วนตัว (ถ่วงด้วย USER_MODEL_WEIGHT) คืน [(category_id, ความมั่นใจ)]
+        # รวมคะแนนตาม id ของหมวดที่ user เห็น (ชื่อจากโมเดลกลางแปลงด้วย resolve) label ที่แปลงไม่ได้ถูกข้าม
+        # ข้อความที่ไม่มีคำที่ user เคยสอนเลย ใช้ผลโมเดลกลางอย่างเดียว
+        def category_ids(labels):
+            categories = [resolve(label if isinstance(label, str) else int(label)) for label in labels]
+            return [category.id if category else None for category in categories]
+
+        scores = [{} for _ in texts]
+        if model is not None:
+            global_ids = category_ids(model.classes_)
+            for row, proba in zip(scores, model.predict_proba(texts)):
+                for category_id, value in zip(global_ids, proba):
+                    if category_id is not None:
+                        row[category_id] = row.get(category_id, 0.0) + value
+        weight = USER_MODEL_WEIGHT if model is not None else 1.0
+        user_ids = category_ids(user_model.classes_)
+        user_proba, known = user_model.predict_proba(texts)
+        for row, proba, is_known in zip(scores, user_proba, known):
+            if not is_known:
+                continue
+            for category_id in row:
+                row[category_id] *= 1.0 - weight
+            for category_id, value in zip(user_ids, proba):
+                if category_id is not None:
+                    row[category_id] = row.get(category_id, 0.0) + weight * value
+
+        results = []
+        for row in scores:
+            if not row:
+                results.append((None, 0.0))
+                continue
+            category_id = max(row, key=row.get)
+            results.append((category_id, float(row[category_id])))
+        return results
+
+    def _cache_prediction(self, scope, text, label, prob):
+        # เก็บ label ของโมเดล (ไม่ใช่ Category) ผลใน cache ที่ใช้ร่วมกันหลาย user จะถูกแปลงเป็นหมวดที่แต่ละคนเห็นเอง
+        self.prediction_cache.set((scope, normalize_text(text)), (label, prob))
 
     def learn(self, text, category_obj, user=None):
-        TrainingData.objects.create(
-            text=text,
-            category=category_obj,
+        if category_obj is None:
+            return
+
+        row, created = TrainingData.objects.get_or_create(
             user=user,
-            is_verified=True
+            normalized_text=normalize_text(text)[:255],
+            category=category_obj,
+            defaults={'text': text, 'is_verified': True}
         )
-        self.train_model()
+        if not created:
+            # สอนคำเดิมซ้ำ (unique constraint) ขยับเวลาให้เป็นตัวล่าสุด โพยใช้ตัวล่าสุดเป็นตัวชนะ
+            TrainingData.objects.filter(pk=row.pk).update(created_at=timezone.now())
+        self.update_model([row])
+
+    def update_model(self, rows):
+        # rows = TrainingData ที่เพิ่งบันทึกลง DB แล้ว
+        if not rows:
+            return
+
+        for row in rows:
+            self.exact_matches.add(row.text, row.category_id, row.user_id)
+
+        # คำที่ user สอนเองไปที่โมเดลส่วนตัวของคนนั้น ที่เหลือ (ข้อมูลกลาง) ไปที่โมเดลกลาง
+        if USER_MODELS:
+            shared = [row for row in rows if row.user_id is None]
+            user_ids = {row.user_id for row in rows if row.user_id is not None}
+        else:
+            shared, user_ids = rows, set()
+
+        if shared and self.mode == 'online':
+            with self._train_lock:
+                # เรียนต่อจากรุ่นล่าสุดที่ worker อื่นอาจเซฟไว้แล้ว
+                self.reload_if_changed()
+                model = self.model
+                # ชื่อหมวดทั้งก้อนด้วย query เดียว (rows จากการนำเข้าไม่ได้ select_related หมวดมา)
+                names = dict(Category.objects.filter(id__in={row.category_id for row in shared}).values_list('id', 'name'))
+                labels = [names[row.category_id] for row in shared]
+                if isinstance(model, OnlineCategoryModel) and all(model.knows(label) for label in labels):
+                    texts = [row.text for row in shared]
+                    model.partial_fit(texts, labels)
+                    self._online_samples.extend(zip(texts, labels))
+                else:
+                    # มีหมวดที่โมเดลไม่รู้จัก partial_fit ไม่ได้ ต้องสร้างใหม่ทั้งหมด
+                    self._needs_rebuild = True
+
+        # ไม่ train ทันที แค่แจ้งคิวว่าโมเดลล้าสมัย (รอ commit ก่อน thread เบื้องหลังจะได้เห็นข้อมูลใหม่)
+        if shared:
+            # ตัวอย่างใหม่ (โดยเฉพาะโหมด online ที่โมเดลเปลี่ยนโดยรุ่นไม่เปลี่ยน) ทำให้ผลที่ cache ไว้ล้าสมัย
+            # (โมเดลส่วนตัวไม่ต้องล้าง: key ของ cache มีรุ่นของโมเดลส่วนตัวอยู่แล้ว)
+            self.prediction_cache.clear()
+            transaction.on_commit(lambda: self.scheduler.mark_dirty(len(shared)))
+        if user_ids:
+            with self._dirty_users_lock:
+                self._dirty_users |= user_ids
+            transaction.on_commit(lambda: self.user_scheduler.mark_dirty(len(user_ids)))
+
+class LazyClassifier:
+    # ตัวแทน CategoryClassifier ที่สร้างของจริงตอนใช้ครั้งแรก (หรือ warmup ใน thread เบื้องหลัง)
+    # การ import module นี้จึงไม่โหลด sklearn / โมเดล และไม่แตะ DB
+    def __init__(self, factory=CategoryClassifier):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+        self.load_seconds = None
+        self.first_prediction_seconds = None
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self._factory()
+                    self.load_seconds = time.perf_counter() - start
+                    print(f"🤖 [AI] Classifier loaded in {self.load_seconds:.2f}s")
+                instance = self._instance
+        return instance
+
+    def warmup(self):
+        # เรียกจาก wsgi/asgi หลัง startup: โหลดใน thread เบื้องหลัง request แรกจะได้ไม่ต้องรอ
+        if self.loaded or self._warmup_thread is not None:
+            return
+
+        def run():
+            try:
+                self.get()
+                # พจนานุกรม newmm โหลดตอนตัดคำครั้งแรก (ราว 1 วินาที) โหลดไว้ก่อนด้วย
+                if FEATURIZER == 'newmm':
+                    thai_tokenizer("อุ่นเครื่อง")
+            except Exception as e:
+                print(f"❌ [AI] Warmup failed: {e}")
+            finally:
+                connection.close()
+
+        self._warmup_thread = threading.Thread(target=run, name='ai-warmup', daemon=True)
+        self._warmup_thread.start()
+
+    def predict(self, text, user=None):
+        return self.predict_many([text], user=user)[0]
+
+    def predict_many(self, texts, user=None):
+        # ครั้งแรกนับรวมเวลาโหลด (ถ้ายังไม่ได้ warmup) = เวลาที่ user คนแรกต้องรอจริง
+        start = time.perf_counter()
+        results = self.get().predict_many(texts, user=user)
+        if self.first_prediction_seconds is None:
+            self.first_prediction_seconds = time.perf_counter() - start
+        return results
+
+    def timings(self):
+        return {
+            'loaded': self.loaded,
+            'load_seconds': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            'first_prediction_ms': round(self.first_prediction_seconds * 1000, 1) if self.first_prediction_seconds is not None else None,
+        }
+
+    def stats(self):
+        stats = self.get().stats()
+        stats.update(self.timings())
+        return stats
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
 
-ai_classifier = CategoryClassifier()
\ No newline at end of file
+ai_classifier = LazyClassifier()
\ No newline at end of file
@@ -0,0 +1,126 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .ledger import record_transactions
+from .models import Category, ImportSession, StagedTransaction, Transaction
+
+STAGE_BATCH_SIZE = 1000
+STAGED_PAGE_SIZE = 50
+# session ที่ไม่ได้ยืนยัน/ยกเลิก จะถูกลบทิ้งเมื่อ user เริ่ม session ใหม่
+IMPORT_SESSION_TTL = timedelta(days=1)
+
+
+def create_session(user, source, file_name=''):
+    ImportSession.objects.filter(user=user, created_at__lt=timezone.now() - IMPORT_SESSION_TTL).delete()
+    return ImportSession.objects.create(user=user, source=source, file_name=file_name[:255])
+
+
+def visible_category_ids(user, category_ids):
+    # ตรวจหมวดทั้งก้อนด้วย query เดียว คืนเฉพาะ id ที่เป็นหมวดกลางหรือหมวดของ user เอง
+    category_ids = {int(category_id) for category_id in category_ids if category_id}
+    if not category_ids:
+        return set()
+    return set(
+        Category.objects.filter(Q(is_global=True) | Q(user=user), id__in=category_ids).values_list('id', flat=True)
+    )
+
+
+def stage_rows(session, rows, start=0):
+    # บันทึกรายการ preview (dict จาก importers) ลงตารางพัก คืนตำแหน่งถัดไปสำหรับก้อนต่อไป
+    # หมวดที่ user มองไม่เห็น (เช่น AI เดาเป็นหมวดส่วนตัวของคนอื่น) จะถูกล้างเป็นไม่ระบุ
+    allowed = visible_category_ids(session.user_id, [row['category_id'] for row in rows])
+    for row in rows:
+        if row['category_id'] and int(row['category_id']) not in allowed:
+            row['category_id'] = ""
+            row['category_name'] = "-"
+            row['ai_suggested'] = False
+
+    staged = [
+        StagedTransaction(
+            session=session,
+            position=start + offset,
+            date=date.fromisoformat(row['date']),
+            description=row['description'][:255],
+            amount=Decimal(str(row['amount'])).quantize(Decimal('0.01')),
+            category_id=row['category_id'] or None,
+            ai_suggested=row.get('ai_suggested', False),
+        )
+        for offset, row in enumerate(rows)
+    ]
+    with transaction.atomic():
+        StagedTransaction.objects.bulk_create(staged, batch_size=STAGE_BATCH_SIZE)
+    return start + len(staged)
+
+
+def staged_row_dict(row):
+    category_name = "-"
+    if row.category:
+        category_name = f"{row.category.name} (AI)" if row.ai_suggested else row.category.name
+    return {
+        'id': row.id,
+        'date': row.date.strftime('%Y-%m-%d'),
+        'description': row.description,
+        'amount': float(row.amount),
+        'category_id': row.category_id or "",
+        'category_name': category_name,
+    }
+
+
+def session_page(session, page_number=1, page_size=STAGED_PAGE_SIZE):
+    paginator = Paginator(session.rows.select_related('category'), page_size)
+    page = paginator.get_page(page_number)
+    return {
+        'rows': [staged_row_dict(row) for row in page],
+        'page': page.number,
+        'num_pages': paginator.num_pages,
+        'total': paginator.count,
+    }
+
+
+def commit_session(session):
+    # ย้ายรายการที่พักไว้เข้า Transaction ด้วย INSERT ... SELECT ครั้งเดียว (ไม่ต้องส่งข้อมูลผ่าน Python ทีละแถว)
+    # แล้วอัปเดต memo / rollup และลบ session ทิ้ง คืนจำนวนรายการที่บันทึก
+    qn = connection.ops.quote_name
+    txn_columns = ', '.join(
+        qn(Transaction._meta.get_field(name).column)
+        for name in ['user', 'category', 'amount', 'description', 'date', 'created_at']
+    )
+    staged_columns = ', '.join(
+        qn(StagedTransaction._meta.get_field(name).column)
+        for name in ['category', 'amount', 'description', 'date']
+    )
+    sql = (
+        f"INSERT INTO {qn(Transaction._meta.db_table)} ({txn_columns}) "
+        f"SELECT %s, {staged_columns}, %s FROM {qn(StagedTransaction._meta.db_table)} "
+        f"WHERE {qn(StagedTransaction._meta.get_field('session').column)} = %s "
+        f"ORDER BY {qn(StagedTransaction._meta.get_field('position').column)}"
+    )
+    created_at = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    with transaction.atomic():
+        # ล็อกแถว session ไว้ กดยืนยันซ้ำพร้อมกันสองครั้ง ครั้งหลังจะรอจนครั้งแรกลบ session เสร็จแล้วไม่เจออะไร
+        # (ไม่งั้นทั้งสองครั้ง INSERT ... SELECT ได้ รายการและ rollup จะถูกนับซ้ำ)
+        if ImportSession.objects.select_for_update().filter(pk=session.pk).first() is None:
+            return 0
+
+        # กันไว้อีกชั้น: หมวดที่ไม่ใช่หมวดกลาง/ของ user ถูกล้างด้วย UPDATE เดียวก่อนย้ายข้อมูล
+        session.rows.filter(category__isnull=False).exclude(
+            Q(category__is_global=True) | Q(category__user_id=session.user_id)
+        ).update(category=None, ai_suggested=False)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [session.user_id, created_at, session.id])
+            count = cursor.rowcount
+
+        # memo / rollup ใช้แค่ user, หมวด, รายการ, วันที่ ไม่ต้องโหลดรายการที่เพิ่ง insert กลับมา
+        record_transactions([
+            Transaction(user_id=session.user_id, category_id=category_id, description=description, date=txn_date)
+            for category_id, description, txn_date in session.rows.values_list('category_id', 'description', 'date').iterator()
+        ])
+        session.delete()
+    return count
@@ -1,3 +1,879 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .compact import CompactModel, export_compact
+from .importers import apply_previous_categories, iter_import_chunks
+from .ledger import delete_category, record_transactions, verify_rollups
+from .jobs import STALE_JOB_TIMEOUT, run_import_job
+from .models import (Budget, Category, DailyRollup, ImportJob, ImportSession, MonthlyRollup, StagedTransaction,
+                     TrainingData, Transaction)
+from .parsers import DEFAULT_DESCRIPTION, parse_date_header, parse_lines
+from .reports import build_budget_status, build_dashboard_summary, encode_cursor, filter_transactions, page_transactions
+from .staging import commit_session, create_session, stage_rows
+from .training import ingest_training_rows
+from .services import (CategoryClassifier, LazyClassifier, ModelStore, OnlineCategoryModel, RetrainScheduler, UserModelPool,
+                       build_pipeline, char_ngrams, pretokenize, thai_tokenizer, token_cache)
+
+
+class StubModel:
+    # โมเดลปลอม: ตอบหมวดแรกใน classes_ เสมอ
+    def __init__(self, classes):
+        self.classes_ = np.array(classes, dtype=object)
+
+    def predict_proba(self, texts):
+        proba = np.zeros((len(texts), len(self.classes_)))
+        proba[:, 0] = 0.9
+        proba[:, 1:] = 0.1 / max(len(self.classes_) - 1, 1)
+        return proba
+
+
+
+# ข้อมูลสอนเล็กๆ หมวดละ 6 คำ (CalibratedClassifierCV แบ่ง 5 fold)
+CORPUS = [
+    ('ข้าวมันไก่', 'อาหาร'), ('ก๋วยเตี๋ยวเรือ', 'อาหาร'), ('ข้าวผัดกะเพรา', 'อาหาร'),
+    ('ส้มตำไก่ย่าง', 'อาหาร'), ('ข้าวขาหมู', 'อาหาร'), ('ชาเย็น', 'อาหาร'),
+    ('ค่ารถไฟฟ้า', 'เดินทาง'), ('แท็กซี่', 'เดินทาง'), ('ค่าน้ำมันรถ', 'เดินทาง'),
+    ('ค่าทางด่วน', 'เดินทาง'), ('รถเมล์', 'เดินทาง'), ('วินมอเตอร์ไซค์', 'เดินทาง'),
+    ('ค่าไฟฟ้า', 'บ้าน'), ('ค่าน้ำประปา', 'บ้าน'), ('ค่าเช่าห้อง', 'บ้าน'),
+    ('ค่าอินเทอร์เน็ต', 'บ้าน'), ('ค่าส่วนกลาง', 'บ้าน'), ('ผงซักฟอก', 'บ้าน'),
+]
+PROBE_TEXTS = ['ข้าวมันไก่ทอด', 'ค่ารถแท็กซี่', 'ค่าไฟฟ้าเดือนนี้', 'ไม่รู้จักเลย']
+
+
+def fit_pipeline(featurizer='newmm'):
+    return build_pipeline(featurizer).fit([text for text, _ in CORPUS], [label for _, label in CORPUS])
+
+
+def make_classifier(model=None):
+    # ไม่โหลด / train โมเดลจริง และเก็บโมเดลส่วนตัวในโฟลเดอร์ชั่วคราว
+    with mock.patch.object(CategoryClassifier, 'load_model'):
+        classifier = CategoryClassifier(mode='batch')
+    classifier.model = model
+    classifier.version = 'test'
+    classifier.user_models = UserModelPool(directory=tempfile.mkdtemp())
+    return classifier
+
+
+class PredictCategoryTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.alice_home = Category.objects.create(name='บ้าน', user=self.alice)
+        self.bob_home = Category.objects.create(name='บ้าน', user=self.bob)
+        self.food = Category.objects.create(name='อาหาร', is_global=True)
+
+    def test_model_label_resolves_to_requesting_users_category(self):
+        classifier = make_classifier(StubModel(['บ้าน', 'อาหาร']))
+        self.assertEqual(classifier.predict('ค่าหอ', user=self.alice)[0], self.alice_home)
+        # ผลเดิมมาจาก cache ที่ใช้ร่วมกัน ต้องยังได้หมวดของ bob เอง
+        self.assertEqual(classifier.predict('ค่าหอ', user=self.bob)[0], self.bob_home)
+        self.assertIsNone(classifier.predict('ค่าหอ')[0])
+
+    def test_only_visible_categories_are_loaded(self):
+        classifier = make_classifier(StubModel(['อาหาร', 'บ้าน']))
+        for i in range(5):
+            Category.objects.create(name=f'ส่วนตัว {i}', user=self.alice)
+        with mock.patch.object(Category.objects, 'filter', wraps=Category.objects.filter) as category_filter:
+            self.assertEqual(classifier.predict('ข้าว', user=self.bob)[0], self.food)
+        category_filter.assert_called_once()
+
+    def test_exact_match_prefers_the_users_own_teaching(self):
+        TrainingData.objects.create(text='ค่าหอ', category=self.food)
+        TrainingData.objects.create(user=self.alice, text='ค่าหอ', category=self.alice_home)
+        model = StubModel(['อาหาร'])
+        classifier = make_classifier(model)
+        with mock.patch.object(model, 'predict_proba') as predict_proba:
+            # โหลดคำของ alice ครั้งแรกแล้ว ครั้งต่อไปเหลือแค่ query หมวด ไม่ query TrainingData
+            classifier.predict('ค่าหอ', user=self.alice)
+            with self.assertNumQueries(1):
+                self.assertEqual(classifier.predict('  ค่าหอ ', user=self.alice), (self.alice_home, 1.0))
+            self.assertEqual(classifier.predict('ค่าหอ', user=self.bob), (self.food, 1.0))
+        predict_proba.assert_not_called()
+
+    def test_repeated_text_is_answered_from_the_prediction_cache(self):
+        model = StubModel(['อาหาร', 'บ้าน'])
+        classifier = make_classifier(model)
+        self.assertEqual(classifier.predict('ก๋วยเตี๋ยว')[0], self.food)
+        with mock.patch.object(model, 'predict_proba', wraps=model.predict_proba) as predict_proba:
+            # ช่องว่างหัวท้ายต่างกันนับเป็นข้อความเดียวกัน
+            self.assertEqual(classifier.predict('  ก๋วยเตี๋ยว ')[0], self.food)
+        predict_proba.assert_not_called()
+
+    def test_learning_invalidates_cached_predictions(self):
+        travel = Category.objects.create(name='เดินทาง', is_global=True)
+        classifier = make_classifier(StubModel(['อาหาร', 'เดินทาง']))
+        self.assertEqual(classifier.predict('ค่าตั๋ว')[0], self.food)
+        # โหมด online: โมเดลเรียนรู้เพิ่มโดยที่รุ่นยังเป็นรุ่นเดิม
+        classifier.model = StubModel(['เดินทาง', 'อาหาร'])
+        self.assertEqual(classifier.predict('ค่าตั๋ว')[0], self.food)
+        classifier.learn('ค่ารถตู้', travel)
+        self.assertEqual(classifier.predict('ค่าตั๋ว')[0], travel)
+
+
+class RetrainSchedulerTests(TestCase):
+    def test_changes_within_the_debounce_window_are_trained_once(self):
+        done = threading.Event()
+        callback = mock.Mock(side_effect=done.set)
+        scheduler = RetrainScheduler(callback, debounce_seconds=0.2, max_pending=100)
+        for _ in range(3):
+            scheduler.mark_dirty()
+        self.assertTrue(done.wait(5))
+        time.sleep(0.3)
+        callback.assert_called_once_with()
+        self.assertEqual(scheduler.runs, 1)
+        self.assertEqual(scheduler.pending, 0)
+
+    def test_enough_pending_samples_train_without_waiting(self):
+        done = threading.Event()
+        scheduler = RetrainScheduler(done.set, debounce_seconds=60, max_pending=5)
+        scheduler.mark_dirty(5)
+        self.assertTrue(done.wait(5))
+
+    def test_learn_queues_a_retrain_instead_of_training(self):
+        food = Category.objects.create(name='อาหาร', is_global=True)
+        classifier = make_classifier(StubModel(['อาหาร']))
+        with mock.patch.object(classifier, 'train_model') as train_model, \
+                mock.patch.object(classifier.scheduler, 'mark_dirty') as mark_dirty:
+            with self.captureOnCommitCallbacks(execute=True):
+                classifier.learn('ข้าวมันไก่', food)
+        train_model.assert_not_called()
+        mark_dirty.assert_called_once_with(1)
+
+
+class LazyClassifierTests(SimpleTestCase):
+    def test_classifier_is_built_on_first_use(self):
+        factory = mock.Mock()
+        factory.return_value.predict_many.return_value = [(None, 0.0)]
+        lazy = LazyClassifier(factory)
+        self.assertFalse(lazy.loaded)
+        factory.assert_not_called()
+
+        self.assertEqual(lazy.predict('ค่าข้าว'), (None, 0.0))
+        lazy.predict('ค่าน้ำ')
+        factory.assert_called_once_with()
+        timings = lazy.timings()
+        self.assertTrue(timings['loaded'])
+        self.assertIsNotNone(timings['load_seconds'])
+        self.assertIsNotNone(timings['first_prediction_ms'])
+
+    def test_warmup_builds_the_classifier_in_the_background(self):
+        factory = mock.Mock()
+        lazy = LazyClassifier(factory)
+        lazy.warmup()
+        lazy._warmup_thread.join(timeout=30)
+        self.assertTrue(lazy.loaded)
+        # warmup ซ้ำ (เช่น wsgi โหลดซ้ำ) ไม่สร้างใหม่
+        lazy.warmup()
+        factory.assert_called_once_with()
+
+
+class UserModelTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.food = Category.objects.create(name='อาหาร', is_global=True)
+        self.alice_food = Category.objects.create(name='อาหาร', user=self.alice)
+        self.bob_food = Category.objects.create(name='อาหาร', user=self.bob)
+
+    def teach(self, user, category, *texts):
+        for text in texts:
+            TrainingData.objects.create(user=user, text=text, category=category)
+
+    def test_user_model_predicts_the_users_own_category_not_one_with_the_same_name(self):
+        classifier = make_classifier(StubModel(['อาหาร']))
+        self.teach(self.alice, self.alice_food, 'ข้าวผัดกะเพรา', 'ข้าวผัดปู')
+        self.teach(self.bob, self.bob_food, 'ข้าวผัดกุ้ง', 'ข้าวผัดหมู')
+        for user in (self.alice, self.bob):
+            classifier.train_user_model(user.id)
+
+        self.assertEqual(classifier.predict('ข้าวผัดต้มยำ', user=self.alice)[0], self.alice_food)
+        self.assertEqual(classifier.predict('ข้าวผัดต้มยำ', user=self.bob)[0], self.bob_food)
+        self.assertEqual(classifier.predict('ข้าวผัดต้มยำ')[0], self.food)
+
+    def test_other_workers_see_words_a_user_taught_after_the_user_model_is_rewritten(self):
+        worker_a = make_classifier(StubModel(['อาหาร']))
+        worker_b = make_classifier(StubModel(['อาหาร']))
+        worker_b.user_models = UserModelPool(directory=worker_a.user_models.directory)
+        worker_b.predict('ค่าส่วนกลาง', user=self.alice)
+
+        worker_a.learn('ค่าส่วนกลาง', self.alice_food, user=self.alice)
+        # คิวเบื้องหลังของ worker A train โมเดลส่วนตัวใหม่ (คำยังน้อย เขียนไฟล์แค่ให้ stamp เปลี่ยน)
+        worker_a.train_user_model(self.alice.id)
+        self.assertEqual(worker_b.predict('ค่าส่วนกลาง', user=self.alice), (self.alice_food, 1.0))
+
+        worker_a.learn('ค่าน้ำ', self.alice_food, user=self.alice)
+        worker_a.train_user_model(self.alice.id)
+        self.assertEqual(worker_b.predict('ค่าน้ำ', user=self.alice), (self.alice_food, 1.0))
+        self.assertNotEqual(worker_b.predict('ค่าน้ำ', user=self.bob)[1], 1.0)
+
+    def test_rows_taught_before_user_models_existed_still_count_after_upgrade(self):
+        # ข้อมูลเก่า: คำที่ alice สอนไว้ตอนยังไม่มีโมเดลส่วนตัว (ยังไม่มีไฟล์ของใครเลย)
+        self.teach(self.alice, self.alice_food, 'ข้าวผัดกะเพรา', 'ข้าวผัดปู')
+        classifier = make_classifier()
+        with mock.patch.object(classifier.store, 'load', return_value=('v1', StubModel(['อาหาร']))), \
+                mock.patch.object(classifier.user_scheduler, 'mark_dirty') as mark_dirty:
+            classifier.load_model()
+        mark_dirty.assert_called_once_with(1)
+        # สิ่งที่คิวเบื้องหลังทำ
+        classifier._refresh_user_models()
+        self.assertEqual(classifier.predict('ข้าวผัดต้มยำ', user=self.alice)[0], self.alice_food)
+
+        with mock.patch.object(classifier.user_scheduler, 'mark_dirty') as mark_dirty:
+            self.assertEqual(classifier.schedule_user_models(missing_only=True), 0)
+        mark_dirty.assert_not_called()
+
+    def test_schedule_user_models_queues_training_instead_of_running_it(self):
+        classifier = make_classifier(StubModel(['อาหาร']))
+        self.teach(self.alice, self.alice_food, 'ข้าวผัดกะเพรา', 'ข้าวผัดปู')
+        self.teach(self.bob, self.bob_food, 'ข้าวผัดกุ้ง')
+        with mock.patch.object(classifier.user_scheduler, 'mark_dirty') as mark_dirty, \
+                mock.patch.object(classifier, 'train_user_model') as train_user_model:
+            self.assertEqual(classifier.schedule_user_models(), 2)
+        mark_dirty.assert_called_once_with(2)
+        train_user_model.assert_not_called()
+        self.assertEqual(classifier._dirty_users, {self.alice.id, self.bob.id})
+
+
+class OnlineLearningTests(TestCase):
+    def setUp(self):
+        self.food = Category.objects.create(name='อาหาร', is_global=True)
+        self.travel = Category.objects.create(name='เดินทาง', is_global=True)
+        self.model_path = os.path.join(tempfile.mkdtemp(), 'online.pkl')
+
+    def make_worker(self):
+        with mock.patch.object(CategoryClassifier, 'load_model'):
+            worker = CategoryClassifier(mode='online')
+        worker.store = ModelStore(self.model_path)
+        worker.user_models = UserModelPool(directory=tempfile.mkdtemp())
+        worker.reload_if_changed()
+        return worker
+
+    def publish_initial_model(self):
+        model = OnlineCategoryModel(['อาหาร', 'เดินทาง'], featurizer='char')
+        model.partial_fit(['ข้าวมันไก่', 'รถไฟฟ้า'], ['อาหาร', 'เดินทาง'])
+        ModelStore(self.model_path).publish(model)
+
+    def test_update_model_resolves_category_names_in_one_query(self):
+        self.publish_initial_model()
+        worker = self.make_worker()
+        for text in ('ก๋วยเตี๋ยว', 'ส้มตำ', 'ข้าวเหนียว', 'ไก่ย่าง'):
+            TrainingData.objects.create(text=text, category=self.food)
+        rows = list(TrainingData.objects.all())
+        with self.assertNumQueries(1):
+            worker.update_model(rows)
+        self.assertEqual(worker.model.samples_seen, 6)
+
+    def test_workers_saving_in_turn_keep_each_others_samples(self):
+        self.publish_initial_model()
+        worker_a, worker_b = self.make_worker(), self.make_worker()
+        worker_a.learn('ส้มตำ', self.food)
+        worker_b.learn('แท็กซี่', self.travel)
+
+        worker_a.save_model()
+        worker_b.save_model()
+        version, model = ModelStore(self.model_path).load()
+        self.assertEqual(version, worker_b.version)
+        self.assertEqual(model.samples_seen, 4)
+
+
+class CompactModelTests(SimpleTestCase):
+    def export(self, pipeline):
+        path = os.path.join(tempfile.mkdtemp(), 'model.compact')
+        export_compact(pipeline, path)
+        return CompactModel.load(path)
+
+    def test_memmap_export_scores_like_the_sklearn_pipeline(self):
+        pipeline = fit_pipeline('newmm')
+        compact = self.export(pipeline)
+        self.assertIsInstance(compact.weights, np.memmap)
+        self.assertEqual(list(compact.classes_), [str(c) for c in pipeline.classes_])
+        np.testing.assert_allclose(compact.predict_proba(PROBE_TEXTS), pipeline.predict_proba(PROBE_TEXTS), atol=1e-5)
+
+    def test_single_text_path_returns_the_pipelines_best_class(self):
+        pipeline = fit_pipeline('newmm')
+        compact = CompactModel.from_pipeline(pipeline)
+        for text, proba in zip(PROBE_TEXTS, pipeline.predict_proba(PROBE_TEXTS)):
+            label, prob = compact.predict_one(text)
+            self.assertEqual(label, pipeline.classes_[proba.argmax()])
+            self.assertAlmostEqual(prob, proba.max(), places=5)
+
+    def test_char_featurizer_exports_and_never_calls_the_tokenizer(self):
+        self.assertEqual(char_ngrams('ค่า  รถ', (2, 3)), [
+            ' ค', 'ค่', '่า', 'า ', ' ค่', 'ค่า', '่า ', ' ร', 'รถ', 'ถ ', ' รถ', 'รถ ',
+        ])
+        with mock.patch('pythainlp.tokenize.word_tokenize') as word_tokenize:
+            pipeline = fit_pipeline('char')
+            compact = self.export(pipeline)
+            np.testing.assert_allclose(compact.predict_proba(PROBE_TEXTS), pipeline.predict_proba(PROBE_TEXTS), atol=1e-5)
+        word_tokenize.assert_not_called()
+
+
+class ModelStoreTests(TestCase):
+    def setUp(self):
+        self.model_path = os.path.join(tempfile.mkdtemp(), 'category_classifier.pkl')
+
+    def publish(self, store, classes):
+        version = store.publish(StubModel(classes))
+        # ระบบไฟล์บางตัวเก็บ mtime ละเอียดแค่ระดับ ms ขยับให้ต่างจากรอบก่อนแน่นอน
+        stamp = os.stat(store.pointer_path).st_mtime_ns + len(store.versions()) * 10 ** 9
+        os.utime(store.pointer_path, ns=(stamp, stamp))
+        return version
+
+    def test_worker_reloads_the_version_another_worker_published(self):
+        other = ModelStore(self.model_path)
+        first = self.publish(other, ['อาหาร', 'เดินทาง'])
+        worker = make_classifier()
+        worker.store = ModelStore(self.model_path)
+        self.assertTrue(worker.reload_if_changed())
+        self.assertEqual(worker.version, first)
+
+        second = self.publish(other, ['เดินทาง', 'อาหาร'])
+        self.assertNotEqual(second, first)
+        self.assertTrue(worker.reload_if_changed())
+        self.assertEqual(worker.version, second)
+        self.assertEqual(list(worker.model.classes_), ['เดินทาง', 'อาหาร'])
+        # ไฟล์ชี้รุ่นไม่เปลี่ยน ไม่โหลดซ้ำ
+        self.assertFalse(worker.reload_if_changed())
+
+    def test_publish_keeps_only_the_latest_versions(self):
+        store = ModelStore(self.model_path, keep=2)
+        versions = [self.publish(store, ['อาหาร']) for _ in range(4)]
+        self.assertEqual(store.versions(), versions[-2:])
+        self.assertEqual(store.current_version(), versions[-1])
+        self.assertEqual(store.load()[0], versions[-1])
+
+
+class ThaiTokenizerTests(SimpleTestCase):
+    def test_repeated_text_is_tokenized_once(self):
+        from pythainlp import tokenize
+        text = 'ค่าขนมปังร้านหน้าซอย'
+        with mock.patch.object(tokenize, 'word_tokenize', wraps=tokenize.word_tokenize) as word_tokenize:
+            first = thai_tokenizer(text)
+            self.assertEqual(thai_tokenizer(text), first)
+        word_tokenize.assert_called_once_with(text, engine='newmm')
+        self.assertEqual(''.join(first), text)
+
+
+class BatchTrainingTests(TestCase):
+    def test_pretokenize_fills_the_token_cache_once(self):
+        texts = ['ค่าข้าวกล่องวันจันทร์', 'ค่าข้าวกล่องวันอังคาร', 'ค่าข้าวกล่องวันจันทร์']
+        self.assertEqual(pretokenize(texts, workers=1), 2)
+        self.assertEqual(pretokenize(texts, workers=1), 0)
+        self.assertIsNotNone(token_cache.get('ค่าข้าวกล่องวันจันทร์'))
+
+    def test_parallel_tokenizing_gives_the_same_tokens(self):
+        texts = ['ค่ากาแฟเย็นหน้าออฟฟิศ', 'ค่ารถไฟฟ้าใต้ดินไปทำงาน', 'ค่าอาหารแมวกระสอบใหญ่']
+        with mock.patch('expenses.services.PARALLEL_TOKENIZE_MIN_TEXTS', 1):
+            self.assertEqual(pretokenize(texts, workers=2), 3)
+        parallel = [token_cache.get(text) for text in texts]
+        token_cache.clear()
+        self.assertEqual([thai_tokenizer(text) for text in texts], [list(tokens) for tokens in parallel])
+
+    def test_parallel_calibration_folds_fit_the_same_model(self):
+        texts, labels = [text for text, _ in CORPUS], [label for _, label in CORPUS]
+        serial = build_pipeline('char').fit(texts, labels)
+        parallel = build_pipeline('char', n_jobs=2).fit(texts, labels)
+        np.testing.assert_allclose(parallel.predict_proba(PROBE_TEXTS), serial.predict_proba(PROBE_TEXTS))
+
+    def test_retrain_records_phase_timings(self):
+        for text, name in CORPUS:
+            category, _ = Category.objects.get_or_create(name=name, is_global=True)
+            TrainingData.objects.create(text=text, category=category)
+        classifier = make_classifier()
+        classifier.store = ModelStore(os.path.join(tempfile.mkdtemp(), 'category_classifier.pkl'))
+        classifier.train_model()
+        self.assertEqual(classifier.last_train['samples'], len(CORPUS))
+        for phase in ('load', 'tokenize', 'vectorize', 'calibrate', 'publish'):
+            self.assertGreaterEqual(classifier.last_train[phase], 0)
+        self.assertEqual(classifier.version, classifier.store.current_version())
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('root', password='x')
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.food = Category.objects.create(name='อาหาร', is_global=True)
+        self.travel = Category.objects.create(name='เดินทาง', is_global=True)
+        self.txns = [
+            Transaction.objects.create(user=self.alice, category=self.food, amount=Decimal('-50'),
+                                       description='ข้าว', date=date(2026, 1, 31)),
+            Transaction.objects.create(user=self.alice, category=self.travel, amount=Decimal('-20'),
+                                       description='รถเมล์', date=date(2026, 1, 31)),
+            Transaction.objects.create(user=self.alice, category=None, amount=Decimal('1000'),
+                                       description='เงินเดือน', date=date(2026, 2, 1)),
+        ]
+        record_transactions(self.txns)
+
+    def assertRollupsMatch(self, *users):
+        for user in users:
+            self.assertEqual(verify_rollups(user.id), [])
+
+    def test_record_transactions_builds_daily_and_monthly_rollups(self):
+        self.assertRollupsMatch(self.alice)
+        january = MonthlyRollup.objects.get(user=self.alice, year=2026, month=1, category=self.food)
+        self.assertEqual(january.expense_total, Decimal('50'))
+        self.assertEqual(DailyRollup.objects.filter(user=self.alice).count(), 3)
+
+    def test_dashboard_summary_is_read_from_rollups(self):
+        bob_txn = Transaction.objects.create(user=self.bob, category=self.food, amount=Decimal('-999'),
+                                             description='ข้าว', date=date(2026, 1, 31))
+        record_transactions([bob_txn])
+        with self.assertNumQueries(2):
+            summary = build_dashboard_summary(self.alice, today=date(2026, 2, 1), days=3)
+        self.assertEqual((summary.total_income, summary.total_expense), (Decimal('1000'), Decimal('70')))
+        self.assertEqual(summary.category_labels, ['อาหาร', 'เดินทาง'])
+        self.assertEqual(summary.category_expenses, [50.0, 20.0])
+        self.assertEqual(summary.days, [date(2026, 1, 30), date(2026, 1, 31), date(2026, 2, 1)])
+        self.assertEqual(summary.daily_expense, [0.0, 70.0, 0.0])
+        self.assertEqual(summary.daily_income, [0.0, 0.0, 1000.0])
+
+    def test_budget_status_compares_limits_with_monthly_spending(self):
+        Category.objects.create(name='ส่วนตัว', user=self.bob)
+        Budget.objects.create(user=self.alice, category=self.food, amount_limit=Decimal('40'), month=1, year=2026)
+        Budget.objects.create(user=self.alice, category=self.travel, amount_limit=Decimal('100'), month=1, year=2026)
+        Budget.objects.create(user=self.alice, category=self.travel, amount_limit=Decimal('5'), month=2, year=2026)
+        with self.assertNumQueries(1):
+            statuses = build_budget_status(self.alice, 1, 2026)
+        self.assertEqual([(s.category, s.limit, s.used, s.remain, s.status_color) for s in statuses], [
+            (self.food, Decimal('40'), Decimal('50'), Decimal('-10'), 'danger'),
+            (self.travel, Decimal('100'), Decimal('20'), Decimal('80'), 'success'),
+        ])
+
+    def test_rollup_keys_are_unique_including_uncategorized(self):
+        for category in (self.food, None):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                DailyRollup.objects.create(user=self.alice, date=date(2026, 1, 31) if category else date(2026, 2, 1),
+                                           category=category)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MonthlyRollup.objects.create(user=self.alice, year=2026, month=2, category=None)
+
+    def test_deleting_a_category_moves_its_totals_to_uncategorized(self):
+        Transaction.objects.create(user=self.alice, category=None, amount=Decimal('-5'),
+                                   description='ทิป', date=date(2026, 1, 31))
+        record_transactions(Transaction.objects.filter(description='ทิป'))
+        delete_category(self.food)
+        self.assertRollupsMatch(self.alice)
+        uncategorized = DailyRollup.objects.get(user=self.alice, date=date(2026, 1, 31), category=None)
+        self.assertEqual(uncategorized.expense_total, Decimal('55'))
+
+        self.client.login(username='root', password='x')
+        self.client.post(f'/admin/expenses/category/{self.travel.id}/delete/', {'post': 'yes'})
+        self.assertFalse(Category.objects.filter(id=self.travel.id).exists())
+        self.assertRollupsMatch(self.alice)
+
+    def test_views_edit_and_delete_keep_rollups_in_sync(self):
+        self.client.login(username='alice', password='x')
+        txn = self.txns[0]
+        self.client.post(f'/transaction/edit/{txn.id}/', {
+            'date': '2026-03-05', 'description': 'ข้าว', 'amount': '-75', 'category': self.travel.id,
+        })
+        txn.refresh_from_db()
+        self.assertEqual(txn.date, date(2026, 3, 5))
+        self.assertRollupsMatch(self.alice)
+
+        self.client.get(f'/transaction/delete/{self.txns[1].id}/')
+        self.client.post('/transactions/delete-multiple/', {'transaction_ids': [self.txns[2].id]})
+        self.assertEqual(Transaction.objects.filter(user=self.alice).count(), 1)
+        self.assertRollupsMatch(self.alice)
+
+    def test_admin_edit_and_delete_keep_rollups_in_sync(self):
+        self.client.login(username='root', password='x')
+        txn = self.txns[0]
+        response = self.client.post(f'/admin/expenses/transaction/{txn.id}/change/', {
+            'user': self.bob.id, 'category': self.food.id, 'amount': '-80',
+            'description': 'ข้าว', 'date': '2026-02-14',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertRollupsMatch(self.alice, self.bob)
+        self.assertFalse(DailyRollup.objects.filter(user=self.alice, date=date(2026, 1, 31), category=self.food).exists())
+
+        self.client.post(f'/admin/expenses/transaction/{self.txns[1].id}/delete/', {'post': 'yes'})
+        self.client.post('/admin/expenses/transaction/', {
+            'action': 'delete_selected', '_selected_action': [txn.id, self.txns[2].id], 'post': 'yes',
+        })
+        self.assertFalse(Transaction.objects.exists())
+        self.assertRollupsMatch(self.alice, self.bob)
+        self.assertFalse(DailyRollup.objects.exists())
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+
+class TransactionPagingTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.food = Category.objects.create(name='อาหาร', is_global=True)
+        self.travel = Category.objects.create(name='เดินทาง', is_global=True)
+        # 7 รายการวันเดียวกันและ created_at เท่ากันหมด ต้องตัดสินลำดับด้วย id
+        self.txns = [
+            Transaction.objects.create(user=self.alice, category=self.food if i % 2 else self.travel,
+                                       amount=Decimal(-10 - i), description=f'รายการ {i}', date=date(2026, 3, 1))
+            for i in range(7)
+        ]
+        Transaction.objects.filter(user=self.alice).update(created_at=datetime(2026, 3, 1, 12, tzinfo=timezone.utc))
+        for txn in self.txns:
+            txn.refresh_from_db()
+        Transaction.objects.create(user=self.bob, category=self.food, amount=Decimal('-5'),
+                                   description='ของ bob', date=date(2026, 3, 1))
+
+    def ids(self, page):
+        return [txn.id for txn in page.transactions]
+
+    def test_ties_are_broken_by_id_without_gaps_or_repeats(self):
+        transactions = filter_transactions(self.alice)
+        seen = []
+        page = page_transactions(transactions, page_size=3)
+        self.assertIsNone(page.prev_cursor)
+        while True:
+            seen.extend(self.ids(page))
+            if not page.next_cursor:
+                break
+            page = page_transactions(transactions, after=page.next_cursor, page_size=3)
+        self.assertEqual(seen, sorted((txn.id for txn in self.txns), reverse=True))
+
+    def test_before_returns_the_previous_page(self):
+        transactions = filter_transactions(self.alice)
+        first = page_transactions(transactions, page_size=3)
+        second = page_transactions(transactions, after=first.next_cursor, page_size=3)
+        back = page_transactions(transactions, before=second.prev_cursor, page_size=3)
+        self.assertEqual(self.ids(back), self.ids(first))
+        self.assertIsNone(back.prev_cursor)
+        self.assertEqual(back.next_cursor, first.next_cursor)
+
+    def test_malformed_or_tampered_cursor_falls_back_to_first_page(self):
+        transactions = filter_transactions(self.alice)
+        first = self.ids(page_transactions(transactions, page_size=3))
+        for cursor in ('not-a-cursor', '%%%', encode_cursor(self.txns[0])[:-4] + 'AAAA'):
+            page = page_transactions(transactions, after=cursor, page_size=3)
+            self.assertEqual(self.ids(page), first)
+            self.assertIsNone(page.prev_cursor)
+
+    def test_cursor_from_another_user_cannot_leak_rows(self):
+        bob_txn = Transaction.objects.get(user=self.bob)
+        page = page_transactions(filter_transactions(self.alice), after=encode_cursor(bob_txn), page_size=10)
+        self.assertTrue(all(txn.user_id == self.alice.id for txn in page.transactions))
+
+    def test_filters_apply_together_with_cursor(self):
+        transactions = filter_transactions(self.alice, category=self.food)
+        first = page_transactions(transactions, page_size=2)
+        second = page_transactions(transactions, after=first.next_cursor, page_size=2)
+        food_ids = sorted((txn.id for txn in self.txns if txn.category_id == self.food.id), reverse=True)
+        self.assertEqual(self.ids(first) + self.ids(second), food_ids)
+        self.assertIsNone(second.next_cursor)
+
+    def test_list_view_pages_with_cursor_and_keeps_filters(self):
+        self.client.login(username='alice', password='x')
+        newest = sorted(self.txns, key=lambda txn: txn.id, reverse=True)
+        response = self.client.get('/transactions/', {'kind': 'expense', 'after': encode_cursor(newest[2])})
+        self.assertEqual(self.ids(response.context['page']), [txn.id for txn in newest[3:]])
+        self.assertIsNotNone(response.context['page'].prev_cursor)
+        self.assertEqual(response.context['filter_query'], 'kind=expense')
+
+
+class QuickInputParserTests(SimpleTestCase):
+    def test_date_headers_apply_to_following_lines(self):
+        parsed = list(parse_lines([
+            '12/01/25',
+            'ข้าวมันไก่ 50',
+            '',
+            '13-1-2025',
+            'เงินเดือน +15,000.50',
+            'ค่ารถ -1,200',
+        ], current_date=date(2025, 1, 1)))
+        self.assertEqual(
+            [(p.line_no, p.date, p.description, p.amount) for p in parsed],
+            [
+                (2, date(2025, 1, 12), 'ข้าวมันไก่', 50.0),
+                (5, date(2025, 1, 13), 'เงินเดือน', 15000.5),
+                (6, date(2025, 1, 13), 'ค่ารถ', -1200.0),
+            ],
+        )
+
+    def test_invalid_date_header_keeps_current_date(self):
+        self.assertIsNone(parse_date_header('31/02/2025'))
+        self.assertIsNone(parse_date_header('ข้าว 12/01/25'))
+        parsed = list(parse_lines(['31/02/2025', 'กาแฟ 45'], current_date=date(2025, 3, 1)))
+        self.assertEqual([(p.date, p.amount) for p in parsed], [(date(2025, 3, 1), 45.0)])
+
+    def test_inline_date_is_removed_and_missing_description_defaults(self):
+        parsed = list(parse_lines(['ข้าว 80 12/01/25', '120', 'ไม่มีตัวเลข'], current_date=date(2025, 1, 1)))
+        self.assertEqual([p.description for p in parsed], ['ข้าว', DEFAULT_DESCRIPTION])
+        self.assertEqual(parsed[0].amount, 80.0)
+
+    def test_unreadable_amount_is_reported_not_dropped(self):
+        parsed = list(parse_lines(['ค่าน้ำ ,,,'], current_date=date(2025, 1, 1)))
+        self.assertEqual(len(parsed), 1)
+        self.assertIsNone(parsed[0].amount)
+        self.assertTrue(parsed[0].error)
+
+    def test_preview_dict_matches_import_format(self):
+        parsed = next(parse_lines(['ชานม 35'], current_date=date(2025, 2, 3)))
+        self.assertEqual(parsed.as_preview(), {
+            'date': '2025-02-03', 'description': 'ชานม', 'amount': 35.0,
+            'category_id': "", 'category_name': "-",
+        })
+
+
+class FileImportTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.food = Category.objects.create(name='อาหาร', is_global=True)
+        self.bob_home = Category.objects.create(name='บ้าน', user=self.bob)
+        patcher = mock.patch('expenses.importers.ai_classifier')
+        self.classifier = patcher.start()
+        self.classifier.predict_many.side_effect = lambda texts, user=None: [(None, 0.0)] * len(texts)
+        self.addCleanup(patcher.stop)
+
+    def write_csv(self, content):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8-sig') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def import_csv(self, content, chunk_size=100):
+        path = self.write_csv(content)
+        return list(iter_import_chunks(path, 'data.csv', self.alice, chunk_size=chunk_size))
+
+    def test_columns_are_parsed_and_mapped(self):
+        chunks = self.import_csv(
+            "วันที่,รายการ,จำนวนเงิน,หมวดหมู่\n"
+            "31/01/2026, ข้าวมันไก่ ,-50,อาหาร\n"
+            '01/02/2026,เงินเดือน,"15,000.50",\n'
+            "03/02/2026,ค่าเช่า,-3000,บ้าน\n"
+        )
+        self.assertEqual(chunks[0].errors, [])
+        self.assertEqual(chunks[0].rows, [
+            {'date': '2026-01-31', 'description': 'ข้าวมันไก่', 'amount': -50.0,
+             'category_id': self.food.id, 'category_name': 'อาหาร'},
+            {'date': '2026-02-01', 'description': 'เงินเดือน', 'amount': 15000.5,
+             'category_id': "", 'category_name': "-"},
+            # หมวดส่วนตัวของ bob ต้องไม่ถูกจับคู่ให้ alice
+            {'date': '2026-02-03', 'description': 'ค่าเช่า', 'amount': -3000.0,
+             'category_id': "", 'category_name': "-"},
+        ])
+
+    def test_bad_rows_are_reported_with_file_row_numbers(self):
+        chunks = self.import_csv(
+            "Date,Description,Amount\n"
+            "01/01/2026,กาแฟ,abc\n"
+            "99/99/2026,ขนม,-20\n"
+            "02/01/2026,,-10\n"
+            ",,\n"
+            "03/01/2026,ชานม,-35\n"
+        )
+        self.assertEqual([row['description'] for row in chunks[0].rows], ['ชานม'])
+        self.assertEqual(chunks[0].errors, [
+            {'row': 2, 'reason': "จำนวนเงินไม่ถูกต้อง"},
+            {'row': 3, 'reason': "วันที่ไม่ถูกต้อง"},
+            {'row': 4, 'reason': "ไม่มีรายการ"},
+        ])
+
+    def test_xlsx_date_cells_keep_day_and_month_when_column_mixes_text(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['วันที่', 'รายการ', 'จำนวนเงิน'])
+        sheet.append([datetime(2026, 1, 2), 'ข้าว', -50])
+        sheet.append(['05/01/2026', 'กาแฟ', -45])
+        sheet.append([datetime(2026, 1, 4), 'ชานม', -35])
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        workbook.save(path)
+        self.addCleanup(os.remove, path)
+
+        chunks = list(iter_import_chunks(path, 'data.xlsx', self.alice))
+        self.assertEqual([row['date'] for row in chunks[0].rows], ['2026-01-02', '2026-01-05', '2026-01-04'])
+
+    def test_large_files_are_split_into_chunks(self):
+        lines = ''.join(f"0{day % 9 + 1}/03/2026,รายการ {day},-{day + 1}\n" for day in range(25))
+        chunks = self.import_csv("date,description,amount\n" + lines, chunk_size=10)
+        self.assertEqual([len(chunk.rows) for chunk in chunks], [10, 10, 5])
+        self.assertEqual(chunks[2].rows[-1]['amount'], -25.0)
+        self.assertEqual(self.classifier.predict_many.call_count, 3)
+
+    def test_rows_reuse_the_category_last_used_for_the_same_description(self):
+        travel = Category.objects.create(name='เดินทาง', is_global=True)
+        history = [
+            Transaction(user=self.alice, category=self.food, amount=Decimal('-40'), description='ค่ารถ', date=date(2026, 1, 1)),
+            Transaction(user=self.alice, category=travel, amount=Decimal('-40'), description='ค่ารถ', date=date(2026, 1, 2)),
+            Transaction(user=self.bob, category=self.bob_home, amount=Decimal('-900'), description='ค่าน้ำ', date=date(2026, 1, 2)),
+        ]
+        Transaction.objects.bulk_create(history)
+        record_transactions(history)
+
+        rows = [{'description': description, 'category_id': '', 'category_name': '-'}
+                for description in ('ค่ารถ ', 'ค่ารถ', 'ค่าน้ำ')]
+        with self.assertNumQueries(1):
+            apply_previous_categories(rows, self.alice)
+        self.assertEqual([row['category_id'] for row in rows], [travel.id, travel.id, ''])
+
+
+class StagedImportTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.food = Category.objects.create(name='อาหาร', is_global=True)
+        self.alice_home = Category.objects.create(name='บ้าน', user=self.alice)
+        self.bob_home = Category.objects.create(name='บ้าน', user=self.bob)
+        self.session = create_session(self.alice, 'FILE', 'data.csv')
+
+    def row(self, description, amount, category=None, day='2026-01-31', ai=False):
+        return {'date': day, 'description': description, 'amount': amount,
+                'category_id': category.id if category else "", 'category_name': category.name if category else "-",
+                'ai_suggested': ai}
+
+    def test_stage_rows_clears_categories_the_user_cannot_see(self):
+        next_position = stage_rows(self.session, [
+            self.row('ข้าว', -50, self.food),
+            self.row('ค่าเช่า', -3000, self.alice_home),
+            self.row('ค่าไฟ', -800, self.bob_home, ai=True),
+        ])
+        self.assertEqual(next_position, 3)
+        staged = list(self.session.rows.values_list('description', 'category_id', 'ai_suggested'))
+        self.assertEqual(staged, [
+            ('ข้าว', self.food.id, False),
+            ('ค่าเช่า', self.alice_home.id, False),
+            ('ค่าไฟ', None, False),
+        ])
+
+    def test_commit_moves_rows_in_order_and_updates_rollups(self):
+        position = stage_rows(self.session, [self.row('ข้าว', -50.5, self.food), self.row('ค่าเช่า', -3000, self.alice_home)])
+        stage_rows(self.session, [self.row('เงินเดือน', 20000, day='2026-02-01')], start=position)
+
+        self.assertEqual(commit_session(self.session), 3)
+        self.assertEqual(
+            list(Transaction.objects.filter(user=self.alice).order_by('id').values_list('description', 'amount', 'category_id')),
+            [('ข้าว', Decimal('-50.50'), self.food.id), ('ค่าเช่า', Decimal('-3000.00'), self.alice_home.id),
+             ('เงินเดือน', Decimal('20000.00'), None)],
+        )
+        self.assertEqual(verify_rollups(self.alice.id), [])
+        self.assertFalse(ImportSession.objects.exists())
+        self.assertFalse(StagedTransaction.objects.exists())
+
+    def test_confirming_the_same_session_twice_does_not_duplicate_transactions(self):
+        stage_rows(self.session, [self.row('ข้าว', -50, self.food)])
+        stale_copy = ImportSession.objects.get(pk=self.session.pk)
+        self.assertEqual(commit_session(self.session), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(commit_session(stale_copy), 0)
+        # session ถูกยืนยันไปแล้ว ต้องหยุดตั้งแต่ล็อกแถว ไม่ลงไปถึง INSERT ... SELECT
+        self.assertFalse([q for q in queries.captured_queries if 'INSERT' in q['sql']])
+        self.assertEqual(Transaction.objects.filter(user=self.alice).count(), 1)
+        self.assertEqual(verify_rollups(self.alice.id), [])
+
+    def test_commit_drops_categories_changed_to_another_users_after_staging(self):
+        stage_rows(self.session, [self.row('ค่าไฟ', -800)])
+        # แก้หมวดในตารางพักตรง ๆ (เช่นผ่านฟอร์มที่ถูกปลอมค่า) ต้องไม่หลุดเข้า Transaction
+        self.session.rows.update(category=self.bob_home)
+        commit_session(self.session)
+        self.assertIsNone(Transaction.objects.get(user=self.alice).category_id)
+        self.assertEqual(verify_rollups(self.alice.id), [])
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write("date,description,amount\n01/03/2026,ข้าว,-50\n")
+        self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+        self.client.login(username='alice', password='x')
+
+    def stale_job(self):
+        long_ago = datetime.now(timezone.utc) - STALE_JOB_TIMEOUT - timedelta(minutes=1)
+        job = ImportJob.objects.create(user=self.alice, file_name='data.csv', file_path=self.path,
+                                       status='RUNNING', started_at=long_ago)
+        job.session = create_session(self.alice, 'FILE', 'data.csv')
+        job.save()
+        return job
+
+    def test_status_poll_fails_jobs_left_running_by_a_dead_web_process(self):
+        job = self.stale_job()
+        status = self.client.get(f'/import/jobs/{job.id}/').json()
+        self.assertEqual(status['status'], 'FAILED')
+        self.assertIsNone(status['session_id'])
+        self.assertFalse(ImportSession.objects.exists())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_recent_running_job_is_left_alone(self):
+        job = ImportJob.objects.create(user=self.alice, file_name='data.csv', file_path=self.path,
+                                       status='RUNNING', started_at=datetime.now(timezone.utc))
+        self.assertEqual(self.client.get(f'/import/jobs/{job.id}/').json()['status'], 'RUNNING')
+
+    def test_late_finishing_thread_does_not_overwrite_expired_job(self):
+        job = ImportJob.objects.create(user=self.alice, file_name='data.csv', file_path=self.path)
+
+        def stage_then_expire(session, rows, start=0):
+            # ระหว่างที่ thread ยังอ่านไฟล์อยู่ งานถูกปิดทิ้งเพราะค้างนานเกินไป
+            ImportJob.objects.filter(id=job.id).update(status='FAILED', message='หมดเวลา')
+            return stage_rows(session, rows, start)
+
+        with mock.patch('expenses.importers.ai_classifier') as classifier, \
+                mock.patch('expenses.jobs.stage_rows', side_effect=stage_then_expire):
+            classifier.predict_many.side_effect = lambda texts, user=None: [(None, 0.0)] * len(texts)
+            self.assertIsNone(run_import_job(job.id))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message, job.session_id), ('FAILED', 'หมดเวลา', None))
+        self.assertFalse(ImportSession.objects.exists())
+
+
+class TrainingImportTests(TestCase):
+    def setUp(self):
+        self.food = Category.objects.create(name='อาหาร', is_global=True)
+
+    def test_new_rows_and_duplicates_are_counted(self):
+        TrainingData.objects.create(text='ข้าวมันไก่', category=self.food)
+        result = ingest_training_rows([
+            ('ข้าวมันไก่', 'อาหาร'), ('ชานม', 'อาหาร'), ('ชานม ', 'อาหาร'), ('ค่าไฟ', 'บ้าน'),
+        ])
+        self.assertEqual((result.rows_read, result.duplicates, result.categories_created), (4, 2, 1))
+        self.assertEqual(sorted(row.text for row in result.created), ['ค่าไฟ', 'ชานม'])
+        self.assertTrue(all(row.pk for row in result.created))
+
+    def test_rows_skipped_by_insert_conflicts_are_reported_as_the_saved_rows(self):
+        concurrent = TrainingData.objects.create(text='กาแฟ', category=self.food)
+        real_filter = TrainingData.objects.filter
+        calls = []
+
+        def miss_existing_once(*args, **kwargs):
+            # อีก request เพิ่มคำเดียวกันเข้ามาหลังเช็คคำที่มีอยู่ แต่ก่อน bulk_create
+            calls.append(kwargs)
+            return TrainingData.objects.none() if len(calls) == 1 else real_filter(*args, **kwargs)
+
+        with mock.patch.object(TrainingData.objects, 'filter', side_effect=miss_existing_once):
+            result = ingest_training_rows([('กาแฟ', 'อาหาร'), ('ชาเย็น', 'อาหาร')])
+        # ได้แถวจริงใน DB (มี pk) แถวละครั้ง ไม่ใช่ object ที่ insert ไม่สำเร็จ
+        self.assertEqual(sorted(row.text for row in result.created), ['กาแฟ', 'ชาเย็น'])
+        self.assertIn(concurrent.pk, [row.pk for row in result.created])
+        self.assertTrue(all(row.pk for row in result.created))
+        self.assertEqual(TrainingData.objects.filter(normalized_text='กาแฟ').count(), 1)
+
+    def test_categories_are_matched_within_the_importers_scope(self):
+        alice = User.objects.create_user('alice', password='x')
+        bob = User.objects.create_user('bob', password='x')
+        bob_pets = Category.objects.create(name='สัตว์เลี้ยง', user=bob)
+        alice_food = Category.objects.create(name='อาหาร', user=alice)
+
+        shared = ingest_training_rows([('อาหารแมว', 'สัตว์เลี้ยง')])
+        pets = shared.created[0].category
+        self.assertNotEqual(pets, bob_pets)
+        self.assertTrue(pets.is_global)
+
+        own = ingest_training_rows([('ข้าวผัด', 'อาหาร'), ('ค่าจอดรถ', 'เดินทาง')], user=alice)
+        categories = {row.text: row.category for row in own.created}
+        self.assertEqual(categories['ข้าวผัด'], alice_food)
+        self.assertEqual((categories['ค่าจอดรถ'].user, categories['ค่าจอดรถ'].is_global), (alice, False))
\ No newline at end of file
@@ -0,0 +1,136 @@
+import csv
+import io
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Category, TrainingData
+from .utils import normalize_text
+
+# จำนวนคำที่ไม่ซ้ำต่อก้อน: 1 query เช็คคำที่มีอยู่แล้ว + 1 bulk_create ต่อก้อน
+TRAINING_IMPORT_BATCH_SIZE = getattr(settings, 'AI_TRAINING_IMPORT_BATCH_SIZE', 1000)
+HEADER_MARKER = "คำศัพท์"
+
+
+@dataclass
+class TrainingImportResult:
+    rows_read: int = 0
+    duplicates: int = 0
+    categories_created: int = 0
+    # TrainingData ที่เพิ่มใหม่ (ส่งต่อให้ ai_classifier.update_model)
+    created: list = field(default_factory=list)
+
+
+def open_training_csv(file):
+    # อ่านไฟล์ที่ upload (binary) ทีละบรรทัด ไม่ decode ทั้งไฟล์เข้า memory
+    # utf-8-sig เพื่อรองรับไฟล์จาก Excel/Notepad ที่มี BOM
+    return io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+
+
+def iter_training_rows(lines):
+    # แถว CSV (คำศัพท์, หมวดหมู่) -> (text, category_name) ข้ามหัวตารางและแถวที่ไม่ครบ
+    for row in csv.reader(lines):
+        if len(row) >= 1 and HEADER_MARKER in row[0]:
+            continue
+        if len(row) < 2:
+            continue
+        text = row[0].strip()
+        category_name = row[1].strip()
+        if text and category_name:
+            yield text, category_name
+
+
+class CategoryResolver:
+    # ชื่อหมวด (ไม่สนตัวพิมพ์) -> Category โหลดครั้งเดียว หมวดที่ยังไม่มีสร้างทีเดียวทั้งก้อน
+    # เห็นเฉพาะหมวดกลาง (+ หมวดของ user เจ้าของคำ) ไม่มีทางผูกคำเข้ากับหมวดส่วนตัวของคนอื่น
+    def __init__(self, user=None):
+        self.user = user
+        self.created = 0
+        self._by_name = {}
+        if user is None:
+            categories = Category.objects.filter(is_global=True).order_by('id')
+        else:
+            # ชื่อซ้ำกัน ใช้หมวดของ user เองก่อนหมวดกลาง
+            categories = Category.objects.filter(Q(is_global=True) | Q(user=user)).order_by('is_global', 'id')
+        for category in categories:
+            self._by_name.setdefault(category.name.lower(), category)
+
+    def resolve(self, names):
+        missing = {}
+        for name in names:
+            if name.lower() not in self._by_name:
+                missing.setdefault(name.lower(), name)
+        if missing:
+            # สร้างหมวดหมู่ใหม่ (Default ให้เป็นรายจ่ายไว้ก่อน) Admin นำเข้า = หมวดกลาง, นำเข้าให้ user = หมวดของคนนั้น
+            new_categories = Category.objects.bulk_create([
+                Category(name=name, type='EXPENSE', is_global=self.user is None, user=self.user)
+                for name in missing.values()
+            ])
+            for category in new_categories:
+                self._by_name[category.name.lower()] = category
+            self.created += len(new_categories)
+        return {name: self._by_name[name.lower()] for name in names}
+
+
+def _flush(batch, categories, user, result):
+    # batch = {(normalized_text, ชื่อหมวดตัวเล็ก): (text, ชื่อหมวด)}
+    by_name = categories.resolve({category_name for _, category_name in batch.values()})
+    existing = set(
+        TrainingData.objects.filter(
+            user=user, normalized_text__in={key for key, _ in batch}
+        ).values_list('normalized_text', 'category_id')
+    )
+    new_rows = []
+    for (key, _), (text, category_name) in batch.items():
+        category = by_name[category_name]
+        if (key, category.id) in existing:
+            result.duplicates += 1
+            continue
+        new_rows.append(TrainingData(
+            user=user,
+            text=text[:255],
+            normalized_text=key,
+            category=category,
+            is_verified=True,
+        ))
+    if not new_rows:
+        return
+    # ignore_conflicts กันกรณีมีคนเพิ่มคำเดียวกันเข้ามาระหว่างเช็คกับ insert
+    # แถวที่ชนถูกข้ามเงียบ ๆ (ไม่ได้ pk กลับมา) จึงดึงแถวกลับมาตาม unique key (user, normalized_text, หมวด)
+    # อีก 1 query ได้แถวจริงใน DB แถวละครั้ง ไม่ว่าใครเป็นคน insert
+    TrainingData.objects.bulk_create(new_rows, ignore_conflicts=True)
+    new_keys = {(row.normalized_text, row.category_id) for row in new_rows}
+    inserted = [
+        row for row in TrainingData.objects.filter(
+            user=user, normalized_text__in={key for key, _ in new_keys}
+        )
+        if (row.normalized_text, row.category_id) in new_keys
+    ]
+    result.created.extend(inserted)
+
+
+def ingest_training_rows(rows, user=None, batch_size=TRAINING_IMPORT_BATCH_SIZE):
+    # นำเข้าคำศัพท์ทีละก้อน: ตัดคำซ้ำใน memory -> หา/สร้างหมวดทั้งก้อน -> bulk_create
+    # ไม่ train โมเดลเอง ผู้เรียกส่ง result.created ต่อให้ update_model / train_model
+    result = TrainingImportResult()
+    categories = CategoryResolver(user)
+    seen = set()
+    batch = {}
+    with transaction.atomic():
+        for text, category_name in rows:
+            result.rows_read += 1
+            key = (normalize_text(text)[:255], category_name.lower())
+            if key in seen:
+                result.duplicates += 1
+                continue
+            seen.add(key)
+            batch[key] = (text, category_name)
+            if len(batch) >= batch_size:
+                _flush(batch, categories, user, result)
+                batch = {}
+        if batch:
+            _flush(batch, categories, user, result)
+    result.categories_created = categories.created
+    return result
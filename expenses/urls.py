@@ -4,11 +4,16 @@ from expenses import views
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'), # ตั้งเป็นหน้าแรก (Home)
+    path('dashboard/summary/', views.dashboard_summary, name='dashboard_summary'),
     path('add/', views.add_smart_transaction, name='add_smart_transaction'),
     path('import/', views.import_data, name='import_data'),
     path('import/template/', views.download_template, name='download_template'),
+    path('import/jobs/<int:job_id>/', views.import_job_status, name='import_job_status'),
+    path('import/session/<int:session_id>/rows/', views.import_session_rows, name='import_session_rows'),
+    path('import/session/<int:session_id>/rows/<int:row_id>/', views.edit_staged_row, name='edit_staged_row'),
     path('ai-manager/', views.ai_manager, name='ai_manager'),
     path('ai-manager/template/', views.download_ai_template, name='download_ai_template'),
+    path('ai-manager/status/', views.ai_status, name='ai_status'),
 
     path('transactions/', views.transaction_list, name='transaction_list'),
     path('transaction/edit/<int:transaction_id>/', views.edit_transaction, name='edit_transaction'),
@@ -0,0 +1,73 @@
+import re
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    # key สำหรับเทียบข้อความ: ไม่สนตัวพิมพ์เล็ก-ใหญ่ และยุบช่องว่างที่ซ้ำกันเหลือช่องเดียว
+    return _WHITESPACE_RE.sub(' ', str(text)).strip().casefold()
+
+
+class LRUCache:
+    # cache จำกัดขนาด ไล่ตัวที่ไม่ได้ใช้นานที่สุดออกก่อน ใช้ข้าม thread ได้ และนับ hit/miss ไว้ดูประสิทธิภาพ
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        # เช็คว่ามีไหมโดยไม่นับเป็น hit/miss และไม่ขยับลำดับ
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def update(self, items):
+        for key, value in items:
+            self.set(key, value)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def tokenize_newmm(texts):
+    # ตัดคำทีละก้อนใน process pool ตอน Re-train (อยู่ใน module ที่ไม่แตะ Django process ลูกแบบ spawn จึง import ได้)
+    from pythainlp.tokenize import word_tokenize
+    return [tuple(word_tokenize(text, engine="newmm")) for text in texts]
@@ -1,27 +1,29 @@
-import re
 import json 
-from datetime import datetime, timedelta
-import pandas as pd
-import io
-import os
-import tempfile
+from datetime import datetime
 import csv
 
 
-from django.db.models import Sum , Q
+from django.db.models import Q
 from django.shortcuts import render, redirect, get_object_or_404  
-from django.http import HttpResponse
+from django.urls import reverse
+from django.http import HttpResponse, JsonResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import user_passes_test
-from django.core.files.storage import FileSystemStorage
 
-from .models import Transaction, Category, Budget , TrainingData
-from .forms import SmartInputForm, CategoryForm, BudgetForm , UploadFileForm , TransactionForm  
+from .models import Transaction, Category, Budget , TrainingData , ImportSession , StagedTransaction , ImportJob
+from .forms import SmartInputForm, CategoryForm, BudgetForm , UploadFileForm , TransactionForm , TransactionFilterForm , StagedTransactionForm
 
 
 
 from .services import ai_classifier
+from .ledger import delete_category, record_transactions, refresh_rollups
+from .parsers import parse_lines
+from .importers import apply_ai_categories, apply_previous_categories
+from .jobs import expire_stale_jobs, job_status, submit_import
+from .training import ingest_training_rows, iter_training_rows, open_training_csv
+from .staging import commit_session, create_session, session_page, stage_rows, staged_row_dict
+from .reports import build_budget_status, build_dashboard_summary, filter_transactions, page_transactions
 
 def is_admin(user):
     return user.is_superuser
@@ -32,54 +34,26 @@ def ai_manager(request):
     # 1. จัดการ Re-train
     if request.method == 'POST' and 'retrain' in request.POST:
         ai_classifier.train_model()
-        messages.success(request, "Re-train Model เรียบร้อยแล้ว!")
+        # โมเดลส่วนตัวมีคนละไฟล์ ปล่อยให้คิวเบื้องหลัง train ไม่ต้องรอทุกคนเสร็จใน request นี้
+        user_count = ai_classifier.schedule_user_models()
+        msg = "Re-train Model เรียบร้อยแล้ว!"
+        if user_count:
+            msg += f" (โมเดลส่วนตัว {user_count} คน กำลัง train อยู่เบื้องหลัง)"
+        messages.success(request, msg)
         return redirect('ai_manager')
 
     # 2. จัดการ Import CSV Training Data
     if request.method == 'POST' and 'import_csv' in request.POST and request.FILES['csv_file']:
         try:
             csv_file = request.FILES['csv_file']
-            
-            # ใช้ utf-8-sig เพื่อรองรับไฟล์จาก Excel/Notepad ที่มี BOM
-            decoded_file = csv_file.read().decode('utf-8-sig').splitlines()
-            reader = csv.reader(decoded_file)
-            
-            count = 0
-            created_cats = 0
-            
-            for row in reader:
-                # ข้ามบรรทัดหัวตาราง (ถ้าบรรทัดแรกคือคำว่า "คำศัพท์")
-                if len(row) >= 1 and "คำศัพท์" in row[0]:
-                    continue
-
-                if len(row) >= 2:
-                    text = row[0].strip()
-                    cat_name = row[1].strip()
-                    
-                    if not text or not cat_name: continue
-
-                    # 1. หาหมวดหมู่ (ถ้าไม่มี ให้สร้างใหม่เลย!)
-                    cat = Category.objects.filter(name__iexact=cat_name).first()
-                    if not cat:
-                        # สร้างหมวดหมู่ใหม่ (Default ให้เป็นรายจ่ายไว้ก่อน)
-                        cat = Category.objects.create(
-                            name=cat_name, 
-                            type='EXPENSE', 
-                            is_global=True # ให้เป็น Global ไปเลยเพราะ Admin นำเข้า
-                        )
-                        created_cats += 1
-
-                    # 2. บันทึกลง Training Data (ถ้ายังไม่มีคำนี้)
-                    obj, created = TrainingData.objects.get_or_create(
-                        text=text,
-                        category=cat,
-                        defaults={'is_verified': True}
-                    )
-                    if created:
-                        count += 1
-            
-            # Import เสร็จแล้ว Re-train ทันที
-            ai_classifier.train_model()
+
+            # อ่านทีละบรรทัด ตัดคำซ้ำ / หาหมวดทั้งก้อน แล้ว bulk_create (ไม่ query ทีละแถว)
+            result = ingest_training_rows(iter_training_rows(open_training_csv(csv_file.file)))
+            count = len(result.created)
+            created_cats = result.categories_created
+
+            # Import เสร็จแล้วส่งให้ AI เรียนรู้ (online สอนต่อได้ทันที / batch เข้าคิว Re-train เบื้องหลัง)
+            ai_classifier.update_model(result.created)
             
             msg = f"นำเข้าศัพท์ใหม่ {count} คำ"
             if created_cats > 0:
@@ -95,309 +69,147 @@ def ai_manager(request):
     # แสดงข้อมูล Training Data ล่าสุด 20 รายการ
     training_data = TrainingData.objects.all().order_by('-created_at')[:20]
     
-    return render(request, 'expenses/ai_manager.html', {'training_data': training_data})
+    return render(request, 'expenses/ai_manager.html', {
+        'training_data': training_data,
+        'ai_stats': ai_classifier.stats(),
+    })
+
+
+def get_import_session(request, session_id):
+    if not str(session_id or '').isdigit(): return None
+    return ImportSession.objects.filter(id=session_id, user=request.user).first()
+
+
+def confirm_import_session(request, success_text):
+    # ยืนยันรายการที่พักไว้ใน session คืน redirect เมื่อบันทึกสำเร็จ
+    import_session = get_import_session(request, request.POST.get('session_id'))
+    if not import_session:
+        messages.warning(request, "ไม่มีข้อมูลให้บันทึก")
+        return None
+    try:
+        count = commit_session(import_session)
+        if count:
+            messages.success(request, f"{success_text} {count} รายการ!")
+            return redirect('dashboard')
+        messages.warning(request, "ไม่มีข้อมูลให้บันทึก")
+    except Exception as e:
+        messages.error(request, f"เกิดข้อผิดพลาดในการบันทึก: {e}")
+    return None
+
+
+@login_required
+def import_session_rows(request, session_id):
+    # ส่งรายการที่พักไว้ทีละหน้า ให้หน้าตรวจสอบโหลดเอง
+    import_session = get_object_or_404(ImportSession, id=session_id, user=request.user)
+    return JsonResponse(session_page(import_session, request.GET.get('page', 1)))
+
+
+@login_required
+def edit_staged_row(request, session_id, row_id):
+    # แก้ไข / ลบรายการทีละแถวในหน้าตรวจสอบ
+    row = get_object_or_404(StagedTransaction, id=row_id, session_id=session_id, session__user=request.user)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST only'}, status=405)
+
+    if 'delete' in request.POST:
+        row.delete()
+        return JsonResponse({'deleted': True})
+
+    form = StagedTransactionForm(request.POST, instance=row, user=request.user)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    row = form.save(commit=False)
+    row.ai_suggested = False
+    row.save()
+    return JsonResponse(staged_row_dict(row))
+
+
+@login_required
+def import_job_status(request, job_id):
+    # ความคืบหน้างานนำเข้าไฟล์ (หน้าเว็บ poll ทุกวินาที)
+    job = get_object_or_404(ImportJob, id=job_id, user=request.user)
+    if expire_stale_jobs(ImportJob.objects.filter(id=job.id)):
+        job.refresh_from_db()
+    return JsonResponse(job_status(job))
+
+
+@user_passes_test(is_admin)
+def ai_status(request):
+    # เวลาโหลดโมเดล / ทำนายครั้งแรก (ไม่บังคับโหลดโมเดลถ้ายังไม่ได้โหลด)
+    status = ai_classifier.timings()
+    if ai_classifier.loaded:
+        status.update(ai_classifier.stats())
+    return JsonResponse(status)
 
 
 @login_required
 def add_smart_transaction(request):
-    preview_data = None
+    import_session = get_import_session(request, request.GET.get('session'))
     form = SmartInputForm()
     
     if request.method == 'POST':
         if 'confirm_save' in request.POST:
-            try:
-                json_data = request.POST.get('final_data')
-                try:
-                    data_list = json.loads(json_data)
-                    if isinstance(data_list, str): data_list = json.loads(data_list)
-                except (ValueError, TypeError): data_list = []
-
-                txns = []
-                for item in data_list:
-                    if isinstance(item, str):
-                        try: item = json.loads(item)
-                        except: continue
-                    
-                    try: date_obj = datetime.strptime(item.get('date', ''), '%Y-%m-%d').date()
-                    except: date_obj = datetime.now().date()
-                    
-                    cat_obj = None
-                    if item.get('category_id'):
-                        cat_obj = Category.objects.filter(id=item['category_id']).first()
-                    
-                    txns.append(Transaction(
-                        user=request.user,
-                        description=item.get('description', ''),
-                        amount=float(item.get('amount', 0)),
-                        date=date_obj,
-                        category=cat_obj
-                    ))
-                
-                if txns:
-                    Transaction.objects.bulk_create(txns)
-                    messages.success(request, f"บันทึกสำเร็จ {len(txns)} รายการ!")
-                    return redirect('dashboard')
-            except Exception as e:
-                messages.error(request, f"เกิดข้อผิดพลาดในการบันทึก: {e}")
+            response = confirm_import_session(request, "บันทึกสำเร็จ")
+            if response: return response
 
         else:
             form = SmartInputForm(request.POST)
             if form.is_valid():
                 raw_data = form.cleaned_data['raw_data']
-                lines = raw_data.strip().split('\n')
-                preview_list = []
-                current_date = datetime.now().date()
-
-                for line in lines:
-                    line = line.strip()
-                    if not line: continue
-
-                    date_match = re.search(r'(\d{1,2})[-/](\d{1,2})[-/](\d{2,4})', line)
-                    if date_match and len(line) <= 10:
-                        day, month, year = map(int, date_match.groups())
-                        if year < 100: year += 2000
-                        try: current_date = datetime(year, month, day).date()
-                        except ValueError: pass
-                        continue
-
-                    # ✅ แก้ไข 1: Regex รองรับลูกน้ำ [0-9,]+
-                    amount_match = re.search(r'([+-]?[0-9,]+(\.\d+)?)', line)
-                    if amount_match:
-                        amount_str = amount_match.group(1)
-                        try:
-                            # ✅ แก้ไข 2: ลบลูกน้ำออกก่อนแปลงเป็น float
-                            amount_val = float(amount_str.replace(',', ''))
-                        except ValueError: continue
-                        
-                        if '-' in amount_str: final_amount = -abs(amount_val)
-                        else: final_amount = abs(amount_val)
-
-                        description = line.replace(amount_str, '').strip()
-                        if date_match: description = description.replace(date_match.group(0), '').strip()
-                        if not description: description = "รายการทั่วไป"
-
-                        category_id = ""
-                        category_name = "-"
-                        
-                        prev = Transaction.objects.filter(user=request.user, description__iexact=description).order_by('-created_at').first()
-                        if prev and prev.category:
-                            category_id = prev.category.id
-                            category_name = prev.category.name
-                        
-                        if not category_id:
-                            try:
-                                predicted_cat, prob = ai_classifier.predict(description)
-                                if predicted_cat and prob > 0.4:
-                                    category_id = predicted_cat.id
-                                    category_name = f"{predicted_cat.name} (AI)"
-                            except: pass
-
-                        preview_list.append({
-                            'date': current_date.strftime('%Y-%m-%d'),
-                            'description': description,
-                            'amount': final_amount,
-                            'category_id': category_id,
-                            'category_name': category_name
-                        })
-                
-                preview_data = preview_list 
+                preview_list = [
+                    parsed.as_preview()
+                    for parsed in parse_lines(raw_data.strip().split('\n'))
+                    if not parsed.error
+                ]
+
+                apply_previous_categories(preview_list, request.user)
+                apply_ai_categories(preview_list, request.user)
+                if preview_list:
+                    import_session = create_session(request.user, 'SMART')
+                    stage_rows(import_session, preview_list)
+                    return redirect(f"{reverse('add_smart_transaction')}?session={import_session.id}")
 
     income_cats = Category.objects.filter(Q(is_global=True) | Q(user=request.user), type='INCOME').order_by('name')
     expense_cats = Category.objects.filter(Q(is_global=True) | Q(user=request.user), type='EXPENSE').order_by('name')
 
     return render(request, 'expenses/add_smart.html', {
         'form': form, 
-        'preview_data': preview_data,
+        'import_session': import_session,
         'income_cats': income_cats,
         'expense_cats': expense_cats
     })
 
 @login_required
 def import_data(request):
-    preview_data = None
+    import_session = get_import_session(request, request.GET.get('session'))
+    import_job = None
     form = UploadFileForm()
 
+    job_id = request.GET.get('job', '')
+    if job_id.isdigit():
+        import_job = ImportJob.objects.filter(id=job_id, user=request.user).first()
+        if import_job and import_job.status in ('DONE', 'FAILED'):
+            if import_job.error_count:
+                sample = ", ".join(f"แถว {e['row']}: {e['reason']}" for e in import_job.errors[:5])
+                more = f" และอีก {import_job.error_count - 5} แถว" if import_job.error_count > 5 else ""
+                messages.warning(request, f"ข้ามข้อมูลที่อ่านไม่ได้ {import_job.error_count} แถว ({sample}{more})")
+            if import_job.session_id:
+                return redirect(f"{reverse('import_data')}?session={import_job.session_id}")
+            if import_job.status == 'FAILED': messages.error(request, import_job.message)
+            elif import_job.message: messages.warning(request, import_job.message)
+            import_job = None
+
     if request.method == 'POST':
         if 'confirm_save' in request.POST:
-            try:
-                json_data = request.POST.get('final_data')
-                try:
-                    data_list = json.loads(json_data)
-                    if isinstance(data_list, str): data_list = json.loads(data_list)
-                except ValueError: data_list = []
-                
-                txns = []
-                for item in data_list:
-                    if isinstance(item, str):
-                        try: item = json.loads(item)
-                        except: continue
-
-                    try: date_obj = datetime.strptime(item.get('date', ''), '%Y-%m-%d').date()
-                    except: date_obj = datetime.now().date()
-
-                    cat_obj = None
-                    if item.get('category_id'):
-                        cat_obj = Category.objects.filter(id=item['category_id']).first()
-                    
-                    txns.append(Transaction(
-                        user=request.user,
-                        description=item.get('description', ''),
-                        amount=float(item.get('amount', 0)),
-                        date=date_obj,
-                        category=cat_obj
-                    ))
-                
-                if txns:
-                    Transaction.objects.bulk_create(txns)
-                    messages.success(request, f"นำเข้าสำเร็จ {len(txns)} รายการ!")
-                    return redirect('dashboard')
-                else:
-                    messages.warning(request, "ไม่มีข้อมูลให้บันทึก")
-
-            except Exception as e:
-                messages.error(request, f"เกิดข้อผิดพลาด: {e}")
+            response = confirm_import_session(request, "นำเข้าสำเร็จ")
+            if response: return response
 
         else:
             form = UploadFileForm(request.POST, request.FILES)
             if form.is_valid():
-                file = request.FILES['file']
-                tmp_file_path = None
-                
-                try:
-                    suffix = '.xlsx'
-                    if file.name.endswith('.csv'): suffix = '.csv'
-                    elif file.name.endswith('.xls'): suffix = '.xls'
-                    elif file.name.endswith('.txt'): suffix = '.txt'
-                    
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                        for chunk in file.chunks():
-                            tmp.write(chunk)
-                        tmp_file_path = tmp.name
-
-                    df = pd.DataFrame()
-                    data_list = []
-
-                    if file.name.endswith('.txt'):
-                        current_date = datetime.now().date()
-                        with open(tmp_file_path, 'r', encoding='utf-8') as f:
-                            for line in f:
-                                line = line.strip()
-                                if not line: continue
-                                
-                                date_match = re.match(r'^(\d{1,2})[-/](\d{1,2})[-/](\d{2,4})$', line)
-                                if date_match:
-                                    d, m, y = map(int, date_match.groups())
-                                    if y < 100: y += 2000
-                                    try: current_date = datetime(y, m, d).date()
-                                    except ValueError: pass
-                                    continue 
-                                
-                                # ✅ แก้ไข 1: Regex รองรับลูกน้ำ
-                                amount_match = re.search(r'([+-]?[0-9,]+(\.\d+)?)', line)
-                                if amount_match:
-                                    amt_str = amount_match.group(1)
-                                    try:
-                                        # ✅ แก้ไข 2: ลบลูกน้ำก่อนแปลงค่า
-                                        amount_val = float(amt_str.replace(',', ''))
-                                    except ValueError: continue
-                                    
-                                    if '-' in amt_str: final_amount = -abs(amount_val)
-                                    else: final_amount = abs(amount_val)
-
-                                    description = line.replace(amt_str, '').strip() or "รายการทั่วไป"
-                                    data_list.append({'date': current_date, 'amount': final_amount, 'description': description, 'category': None})
-                        
-                        df = pd.DataFrame(data_list)
-                    
-                    else:
-                        if file.name.endswith('.csv'): df = pd.read_csv(tmp_file_path, encoding='utf-8-sig')
-                        elif file.name.endswith('.xls'): df = pd.read_excel(tmp_file_path, engine='xlrd')
-                        else: df = pd.read_excel(tmp_file_path, engine='openpyxl')
-                        
-                        df.columns = df.columns.str.strip()
-                        column_mapping = {
-                            'วันที่': 'date', 'Date': 'date', 'date': 'date',
-                            'รายการ': 'description', 'Description': 'description', 'description': 'description',
-                            'จำนวนเงิน': 'amount', 'Amount': 'amount', 'amount': 'amount', 'จำนวน': 'amount',
-                            'หมวดหมู่': 'category', 'Category': 'category', 'category': 'category'
-                        }
-                        df.rename(columns=column_mapping, inplace=True)
-
-                    preview_list = []
-                    
-                    if 'amount' in df.columns and 'description' in df.columns:
-                        df.dropna(subset=['amount', 'description'], inplace=True)
-                        
-                        for _, row in df.iterrows():
-                            try:
-                                # จัดการลูกน้ำใน Excel ด้วย (เผื่อ Excel ส่งมาเป็น String ที่มี ,)
-                                amt_raw = row['amount']
-                                if isinstance(amt_raw, str):
-                                    amt_raw = amt_raw.replace(',', '')
-                                
-                                amt = float(amt_raw)
-                                if pd.isna(amt): continue
-
-                                if 'date' in df.columns:
-                                    raw_date = row['date']
-                                    if isinstance(raw_date, str):
-                                        txn_date = pd.to_datetime(raw_date, dayfirst=True).date()
-                                    elif isinstance(raw_date, (datetime, pd.Timestamp)):
-                                        txn_date = raw_date.date()
-                                    else:
-                                        txn_date = datetime.now().date()
-                                else:
-                                    txn_date = datetime.now().date()
-
-                                description = str(row['description']).strip()
-                                cat_id = ""
-                                cat_name = "-"
-
-                                if 'category' in df.columns and pd.notna(row['category']):
-                                    cat_name_str = str(row['category']).strip()
-                                    c = Category.objects.filter(name__iexact=cat_name_str).first()
-                                    if c: 
-                                        cat_id = c.id
-                                        cat_name = c.name
-                                
-                                if not cat_id:
-                                    prev = Transaction.objects.filter(user=request.user, description__iexact=description).order_by('-created_at').first()
-                                    if prev and prev.category:
-                                        cat_id = prev.category.id
-                                        cat_name = prev.category.name
-
-                                if not cat_id:
-                                    try:
-                                        predicted_cat, prob = ai_classifier.predict(description)
-                                        if predicted_cat and prob > 0.4:
-                                            cat_id = predicted_cat.id
-                                            cat_name = f"{predicted_cat.name} (AI)"
-                                    except: pass
-
-                                preview_list.append({
-                                    'date': txn_date.strftime('%Y-%m-%d'),
-                                    'description': description,
-                                    'amount': amt,
-                                    'category_id': cat_id,
-                                    'category_name': cat_name
-                                })
-                            except: continue
-                    else:
-                        missing = []
-                        if 'amount' not in df.columns: missing.append('จำนวนเงิน (Amount)')
-                        if 'description' not in df.columns: missing.append('รายการ (Description)')
-                        messages.error(request, f"ไฟล์ไม่ถูกต้อง ขาดคอลัมน์: {', '.join(missing)}")
-
-                    if preview_list:
-                        preview_data = preview_list
-                    else:
-                        if not messages.get_messages(request):
-                            messages.warning(request, "ไม่พบข้อมูลรายการในไฟล์")
-
-                except Exception as e:
-                    messages.error(request, f"เกิดข้อผิดพลาดในการอ่านไฟล์: {e}")
-                finally:
-                    if tmp_file_path and os.path.exists(tmp_file_path): os.remove(tmp_file_path)
+                # อ่านไฟล์เบื้องหลัง หน้าเว็บรอดูความคืบหน้าผ่าน import_job_status
+                job = submit_import(request.user, request.FILES['file'])
+                return redirect(f"{reverse('import_data')}?job={job.id}")
             
             else:
                 messages.error(request, f"ข้อมูลไฟล์ไม่ถูกต้อง: {form.errors}")
@@ -407,7 +219,8 @@ def import_data(request):
 
     return render(request, 'expenses/import_data.html', {
         'form': form, 
-        'preview_data': preview_data,
+        'import_session': import_session,
+        'import_job': import_job,
         'income_cats': income_cats,
         'expense_cats': expense_cats
     })
@@ -417,6 +230,8 @@ def import_data(request):
 # ฟังก์ชัน download_template 
 @login_required
 def download_template(request):
+    import pandas as pd
+
     file_format = request.GET.get('format', 'xlsx')
     
     data = {
@@ -482,60 +297,48 @@ def download_ai_template(request):
 
 @login_required
 def dashboard(request):
-    transactions = Transaction.objects.filter(user=request.user).order_by('-date', '-created_at')
-
-    total_income = transactions.filter(amount__gt=0).aggregate(Sum('amount'))['amount__sum'] or 0
-    total_expense = transactions.filter(amount__lt=0).aggregate(Sum('amount'))['amount__sum'] or 0
-    balance = total_income + total_expense
-
-    expense_by_cat = transactions.filter(amount__lt=0).values('category__name').annotate(total=Sum('amount')).order_by('total')
-    
-    donut_labels = []
-    donut_data = []
-    for item in expense_by_cat:
-        cat_name = item['category__name'] if item['category__name'] else 'ไม่ระบุหมวด'
-        donut_labels.append(cat_name)
-        donut_data.append(abs(float(item['total'])))
-
-    today = datetime.now().date()
-    last_7_days = [today - timedelta(days=i) for i in range(6, -1, -1)]
-    
-    bar_labels = []
-    bar_income = []
-    bar_expense = []
-
-    for day in last_7_days:
-        bar_labels.append(day.strftime('%d/%m'))
-        day_txns = transactions.filter(date=day)
-        inc = day_txns.filter(amount__gt=0).aggregate(Sum('amount'))['amount__sum'] or 0
-        exp = day_txns.filter(amount__lt=0).aggregate(Sum('amount'))['amount__sum'] or 0
-        bar_income.append(float(inc))
-        bar_expense.append(abs(float(exp)))
+    summary = build_dashboard_summary(request.user)
+    transactions = Transaction.objects.filter(user=request.user).select_related('category').order_by('-date', '-created_at')
 
     context = {
         'transactions': transactions[:5],
-        'total_income': total_income,
-        'total_expense': abs(total_expense),
-        'balance': balance,
-        'donut_labels': json.dumps(donut_labels),
-        'donut_data': json.dumps(donut_data),
-        'bar_labels': json.dumps(bar_labels),
-        'bar_income': json.dumps(bar_income),
-        'bar_expense': json.dumps(bar_expense),
+        'total_income': summary.total_income,
+        'total_expense': summary.total_expense,
+        'balance': summary.balance,
+        'donut_labels': json.dumps(summary.category_labels),
+        'donut_data': json.dumps(summary.category_expenses),
+        'bar_labels': json.dumps(summary.day_labels),
+        'bar_income': json.dumps(summary.daily_income),
+        'bar_expense': json.dumps(summary.daily_expense),
     }
 
     return render(request, 'expenses/dashboard.html', context)
 
+@login_required
+def dashboard_summary(request):
+    return JsonResponse(build_dashboard_summary(request.user).to_dict())
+
 @login_required
 def transaction_list(request):
-    transactions = Transaction.objects.filter(user=request.user).order_by('-date', '-created_at')
+    filter_form = TransactionFilterForm(request.GET or None, user=request.user)
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {}
+    transactions = filter_transactions(request.user, **filters)
+    page = page_transactions(transactions, after=request.GET.get('after'), before=request.GET.get('before'))
+
+    # เก็บตัวกรองไว้ในลิงก์เปลี่ยนหน้า
+    filter_query = request.GET.copy()
+    filter_query.pop('after', None)
+    filter_query.pop('before', None)
     
     # ดึงหมวดหมู่แยกประเภท ส่งไปให้ Dropdown ใน Modal
     income_cats = Category.objects.filter(Q(is_global=True) | Q(user=request.user), type='INCOME').order_by('name')
     expense_cats = Category.objects.filter(Q(is_global=True) | Q(user=request.user), type='EXPENSE').order_by('name')
 
     context = {
-        'transactions': transactions,
+        'transactions': page.transactions,
+        'page': page,
+        'filter_form': filter_form,
+        'filter_query': filter_query.urlencode(),
         'income_cats': income_cats,
         'expense_cats': expense_cats
     }
@@ -546,11 +349,13 @@ def edit_transaction(request, transaction_id):
     transaction = get_object_or_404(Transaction, id=transaction_id, user=request.user)
     
     if request.method == 'POST':
+        # เก็บค่าก่อน is_valid() เพราะ ModelForm เขียนค่าใหม่ทับ instance ตั้งแต่ตอน validate
+        old_category = transaction.category 
+        old_date = transaction.date
         form = TransactionForm(request.POST, instance=transaction)
         if form.is_valid():
-            # เก็บค่าก่อน save เพื่อดูว่ามีการเปลี่ยนหมวดหมู่ไหม
-            old_category = transaction.category 
             updated_txn = form.save()
+            record_transactions([updated_txn], old_dates=[old_date])
             
             # --- AI Learning Trigger 🧠 ---
             # ถ้ามีการเปลี่ยนหมวดหมู่ หรือ รายการเดิมไม่มีหมวดหมู่
@@ -575,6 +380,7 @@ def edit_transaction(request, transaction_id):
 def delete_transaction(request, transaction_id):
     transaction = get_object_or_404(Transaction, id=transaction_id, user=request.user)
     transaction.delete()
+    refresh_rollups(request.user.id, [transaction.date])
     messages.success(request, "ลบรายการเรียบร้อย!")
     return redirect('transaction_list')
 
@@ -583,7 +389,10 @@ def delete_multiple_transactions(request):
     if request.method == 'POST':
         transaction_ids = request.POST.getlist('transaction_ids')
         if transaction_ids:
-            Transaction.objects.filter(id__in=transaction_ids, user=request.user).delete()
+            selected = Transaction.objects.filter(id__in=transaction_ids, user=request.user)
+            dates = set(selected.values_list('date', flat=True))
+            selected.delete()
+            refresh_rollups(request.user.id, dates)
             messages.success(request, f"ลบข้อมูลที่เลือกเรียบร้อยแล้ว!")
         else:
             messages.warning(request, "ไม่ได้เลือกรายการใดๆ")
@@ -623,47 +432,22 @@ def edit_category(request, category_id):
 @login_required
 def delete_category(request, category_id):
     category = get_object_or_404(Category, id=category_id)
-    category.delete()
+    delete_category(category)
     messages.success(request, "ลบหมวดหมู่เรียบร้อย!")
     return redirect('manage_categories')
 
 @login_required
 def manage_budget(request):
-    current_month = datetime.now().month
-    current_year = datetime.now().year
+    # ดูงบเดือนไหนก็ได้ด้วย ?month=&year= (ไม่ระบุ = เดือนปัจจุบัน)
+    today = datetime.now().date()
+    try:
+        current_month = int(request.GET.get('month', today.month))
+        current_year = int(request.GET.get('year', today.year))
+        if not 1 <= current_month <= 12: raise ValueError
+    except ValueError:
+        current_month, current_year = today.month, today.year
 
-    categories = Category.objects.filter(type='EXPENSE')
-    budgets = Budget.objects.filter(month=current_month, year=current_year)
-    
-    budget_data = []
-    for cat in categories:
-        budget = budgets.filter(category=cat).first()
-        limit = budget.amount_limit if budget else 0
-        
-        used = Transaction.objects.filter(
-            category=cat, 
-            date__month=current_month, 
-            date__year=current_year,
-            amount__lt=0
-        ).aggregate(Sum('amount'))['amount__sum'] or 0
-        
-        used = abs(used)
-        percent = (used / limit * 100) if limit > 0 else 0
-        remain = limit - used
-        
-        status_color = 'success'
-        if percent >= 100: status_color = 'danger'
-        elif percent >= 80: status_color = 'warning'
-
-        budget_data.append({
-            'category': cat,
-            'limit': limit,
-            'used': used,
-            'remain': remain,
-            'percent': min(percent, 100),
-            'status_color': status_color,
-            'budget_id': budget.id if budget else None
-        })
+    budget_data = build_budget_status(request.user, current_month, current_year)
 
     if request.method == 'POST':
         form = BudgetForm(request.POST, user=request.user)
@@ -674,6 +458,7 @@ def manage_budget(request):
             budget_item.year = current_year
             
             existing_budget = Budget.objects.filter(
+                user=request.user,
                 category=budget_item.category,
                 month=current_month,
                 year=current_year
@@ -686,15 +471,24 @@ def manage_budget(request):
                 budget_item.save()
                 
             messages.success(request, f"ตั้งงบหมวด {budget_item.category.name} เรียบร้อย!")
-            return redirect('manage_budget')
+            return redirect(f"{reverse('manage_budget')}?month={current_month}&year={current_year}")
     else:
         form = BudgetForm(user=request.user)
 
+    prev_month = (current_month - 2) % 12 + 1
+    prev_year = current_year - 1 if current_month == 1 else current_year
+    next_month = current_month % 12 + 1
+    next_year = current_year + 1 if current_month == 12 else current_year
+
     return render(request, 'expenses/budget_list.html', {
         'budget_data': budget_data,
         'form': form,
         'current_month': current_month,
-        'current_year': current_year
+        'current_year': current_year,
+        'prev_month': prev_month,
+        'prev_year': prev_year,
+        'next_month': next_month,
+        'next_year': next_year,
     })
 
 @login_required